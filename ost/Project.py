@@ -14,11 +14,12 @@ from datetime import datetime
 from shapely.wkt import loads
 from joblib import Parallel, delayed
 from ost.helpers import vector as vec, raster as ras
-from ost.s1 import search, refine, download, burst, grd_batch
-from ost.helpers import scihub, helpers as h
+from ost.s1 import search, refine, download, burst, grd_batch, pipeline
+from ost.s1 import download_scheduler
+from ost.helpers import scihub, telemetry, helpers as h
 from ost.multitemporal import ard_to_ts, common_extent, common_ls_mask, \
     timescan as tscan
-from ost.mosaic import mosaic as mos
+from ost.mosaic import mosaic as mos, planner
 import sys
 
 # set logging
@@ -309,8 +310,17 @@ class Sentinel1(Generic):
             print(' {} mosaics for mosaic key {}'.format(self.coverages[key],
                                                          key))
 
+    def _download_scheduler(self, budget=None, evict=False):
+
+        # budgets are given in GB, like the download size
+        if budget is not None:
+            budget = int(budget * 1024 ** 3)
+
+        return download_scheduler.DownloadScheduler(
+            self.download_dir, budget, evict=evict)
+
     def download(self, inventory_df, mirror=None, concurrent=2,
-                 uname=None, pword=None):
+                 uname=None, pword=None, budget=None):
 
         # if an old inventory exists dorp download_path
         if 'download_path' in inventory_df:
@@ -328,12 +338,31 @@ class Sentinel1(Generic):
             print(' INFO: All scenes are ready for being processed.')
         else:
             print(' INFO: One or more of your scenes need to be downloaded.')
-            download.download_sentinel1(download_df,
-                                        self.download_dir,
-                                        mirror=mirror,
-                                        concurrent=concurrent,
-                                        uname=uname,
-                                        pword=pword)
+
+            def _download(download_df):
+                download.download_sentinel1(download_df,
+                                            self.download_dir,
+                                            mirror=mirror,
+                                            concurrent=concurrent,
+                                            uname=uname,
+                                            pword=pword)
+
+            # per product and mirror metrics of the downloads
+            with telemetry.DownloadTelemetry(
+                    opj(self.project_dir, 'download.telemetry.jsonl'),
+                    opj(self.project_dir, 'download.prom')) as metrics:
+
+                # the oldest products first, as far as the budget allows
+                if budget is not None:
+                    mirror, uname, pword = \
+                        download.ask_mirror_and_credentials(
+                            mirror, uname, pword)
+                    self._download_scheduler(budget).run(
+                        download_df, _download)
+                else:
+                    _download(download_df)
+
+            metrics.summary()
 
     def plot_inventory(self, inventory_df=None, transparency=0.05,
                        annotate=False):
@@ -377,7 +406,8 @@ class Sentinel1_SLCBatch(Sentinel1):
         self.burst_inventory_file = None
 
     def create_burst_inventory(self, key=None, refine=True,
-                               uname=None, pword=None):
+                               uname=None, pword=None,
+                               ncores=os.cpu_count()):
 
         if key:
             coverages = self.coverages[key]
@@ -388,7 +418,8 @@ class Sentinel1_SLCBatch(Sentinel1):
                 outfile,
                 download_dir=self.download_dir,
                 data_mount=self.data_mount,
-                uname=uname, pword=pword)
+                uname=uname, pword=pword, ncores=ncores,
+                cache_file=opj(self.inventory_dir, 'burst_cache.sqlite'))
         else:
             coverages = None
             outfile = opj(self.inventory_dir,
@@ -399,7 +430,8 @@ class Sentinel1_SLCBatch(Sentinel1):
                 outfile,
                 download_dir=self.download_dir,
                 data_mount=self.data_mount,
-                uname=uname, pword=pword)
+                uname=uname, pword=pword, ncores=ncores,
+                cache_file=opj(self.inventory_dir, 'burst_cache.sqlite'))
 
         if refine:
             # print('{}.refined.shp'.format(outfile[:-4]))
@@ -499,7 +531,7 @@ class Sentinel1_SLCBatch(Sentinel1):
 
     def bursts_to_ard(self, timeseries=False, timescan=False, mosaic=False,
                       overwrite=False, exec_file=None, cut_to_aoi=False,
-                      ncores=os.cpu_count()):
+                      ncores=os.cpu_count(), memory=None):
         # check for previous exec files and remove them
         if exec_file:
             [os.remove(n) for n in glob.glob(exec_file + '*') if
@@ -588,7 +620,8 @@ class Sentinel1_SLCBatch(Sentinel1):
                                     self.temp_dir,
                                     cut_to_aoi,
                                     exec_file,
-                                    ncores
+                                    ncores,
+                                    memory
                                     )
 
         if mosaic and timescan:
@@ -601,6 +634,60 @@ class Sentinel1_SLCBatch(Sentinel1):
                                   ncores
                                   )
 
+    def download_to_ard(self, inventory_df, mirror=None, concurrent=2,
+                        uname=None, pword=None, timeseries=False,
+                        timescan=False, mosaic=False, cut_to_aoi=False,
+                        workers=1, ncores=os.cpu_count(), budget=None,
+                        evict=False, memory=None):
+        '''Downloads and processes the burst inventory at the same time
+
+        Each burst is processed as soon as the products of its master and
+        slave date are downloaded. Once the downloads and the single
+        burst processing are finished, the time-series, timescan and
+        mosaic steps of bursts_to_ard follow.
+
+        Args:
+            inventory_df (GeoDataFrame): the inventory of the products
+                                         to download
+            mirror (int): the download mirror (see Sentinel1.download)
+            concurrent (int): number of parallel downloads
+            uname (str): username for the mirror
+            pword (str): password for the mirror
+            workers (int): number of bursts processed in parallel
+            ncores (int): number of cores used by each SNAP process
+            budget (float): maximum size (in GB) of the downloaded
+                            products kept on disk (None for no limit
+                            except the free disk space)
+            evict (bool): delete downloaded products once all bursts
+                          that need them are processed
+            memory (int): memory budget (in bytes) of the mosaics
+
+        '''
+
+        self.update_ard_parameters()
+
+        # the downloads run in several batches, so we ask only once
+        mirror, uname, pword = download.ask_mirror_and_credentials(
+            mirror, uname, pword)
+
+        pipeline.bursts_to_ard(
+            self.burst_inventory,
+            inventory_df,
+            lambda download_df: self.download(download_df, mirror,
+                                              concurrent, uname, pword),
+            self.download_dir,
+            self.processing_dir,
+            self.temp_dir,
+            self.proc_file,
+            self.data_mount,
+            workers,
+            ncores,
+            self._download_scheduler(budget, evict))
+
+        self.bursts_to_ard(timeseries, timescan, mosaic,
+                           cut_to_aoi=cut_to_aoi, ncores=ncores,
+                           memory=memory)
+
     def create_timeseries_animation(self, timeseries_dir, product_list,
                                     outfile,
                                     shrink_factor=1, resampling_factor=5,
@@ -615,7 +702,8 @@ class Sentinel1_SLCBatch(Sentinel1):
 
     def multiprocess(self, timeseries=False, timescan=False, mosaic=False,
                      overwrite=False, exec_file=None, cut_to_aoi=False,
-                     ncores=os.cpu_count(), multiproc=os.cpu_count()):
+                     ncores=os.cpu_count(), multiproc=os.cpu_count(),
+                     memory=None):
         '''
         Function to read previously generated exec text files and run them using
         a specified number of cores in parallel (or the number of available cpus)
@@ -880,20 +968,12 @@ class Sentinel1_SLCBatch(Sentinel1):
             sys.stdout = _stdout
 
             if os.path.isfile(exec_mosaic_timeseries):
-                mosaic_timeseries_params = []
-                with open(exec_mosaic_timeseries, "r") as fp:
-                    mosaic_timeseries_params = [line.strip() for line in fp]
-                fp.close()
-                ##replaced multiprocessing pools with joblib (only prints when run in ipython or command line though)
-                Parallel(n_jobs=1, verbose=53, backend=multiprocessing)(
-                    delayed(mos.mosaic)(*params.split(';')) for params in
-                    mosaic_timeseries_params)
-                # def run_mosaic_timeseries_multiprocess(params):
-                #    from ost.mosaic import mosaic
-                #    mos.mosaic(*params.split(','))
-
-                # pool = multiprocessing.Pool(processes=multiproc)
-                # pool.map(run_mosaic_timeseries_multiprocess, mosaic_timeseries_params)
+                # the planner runs the mosaics concurrently within the
+                # cpu and memory budget
+                planner.run_timeseries(
+                    planner.plan_from_exec(exec_mosaic_timeseries),
+                    self.temp_dir, self.aoi if cut_to_aoi else False,
+                    multiproc, memory)
 
         # test existence of mosaic timeseries vrt exec files and run them in parallel
         if mosaic and timeseries:
@@ -950,7 +1030,8 @@ class Sentinel1_SLCBatch(Sentinel1):
                     mosaic_timescan_params = [line.strip() for line in fp]
                 fp.close()
 
-                ##replaced multiprocessing pools with joblib (only prints when run in ipython or command line though)
+                # the native mosaic engine processes the tiles of each
+                # mosaic on all cores, so mosaics run one after another
                 Parallel(n_jobs=1, verbose=53, backend=multiprocessing)(
                     delayed(mos.mosaic)(*params.split(';')) for params in
                     mosaic_timescan_params)
@@ -1070,9 +1151,75 @@ class Sentinel1_GRDBatch(Sentinel1):
                          'image resampling': img_res})
         self.ard_parameters['single ARD']['dem'] = dem_dict
 
+    def _subset_wkt(self, subset):
+
+        if subset:
+            if subset.split('.')[-1] == '.shp':
+                subset = str(vec.shp_to_wkt(subset, buffer=0.1, envelope=True))
+            elif subset.startswith('POLYGON (('):
+                subset = loads(subset).buffer(0.1).to_wkt()
+            else:
+                print(' ERROR: No valid subset given.'
+                      ' Should be either path to a shapefile or a WKT Polygon.')
+                sys.exit()
+
+        return subset
+
+    def download_to_ard(self, inventory_df, mirror=None, concurrent=2,
+                        uname=None, pword=None, subset=None,
+                        timeseries=False, timescan=False, mosaic=False,
+                        cut_to_aoi=False, workers=1, budget=None,
+                        evict=False, memory=None):
+        '''Downloads and processes an inventory at the same time
+
+        Each acquisition is processed as soon as all of its frames are
+        downloaded. Once the downloads and the single ARD processing
+        are finished, the time-series, timescan and mosaic steps of
+        grds_to_ard follow.
+
+        Args:
+            inventory_df (GeoDataFrame): an OST compliant inventory
+            mirror (int): the download mirror (see Sentinel1.download)
+            concurrent (int): number of parallel downloads
+            uname (str): username for the mirror
+            pword (str): password for the mirror
+            subset (str): path to a shapefile or a WKT Polygon
+            workers (int): number of acquisitions processed in parallel
+            budget (float): maximum size (in GB) of the downloaded
+                            products kept on disk (None for no limit
+                            except the free disk space)
+            evict (bool): delete downloaded products once all
+                          acquisitions that need them are processed
+            memory (int): memory budget (in bytes) of the mosaics
+
+        '''
+
+        self.update_ard_parameters()
+
+        # the downloads run in several batches, so we ask only once
+        mirror, uname, pword = download.ask_mirror_and_credentials(
+            mirror, uname, pword)
+
+        pipeline.grds_to_ard(
+            inventory_df,
+            lambda download_df: self.download(download_df, mirror,
+                                              concurrent, uname, pword),
+            self.download_dir,
+            self.processing_dir,
+            self.temp_dir,
+            self.proc_file,
+            self._subset_wkt(subset),
+            self.data_mount,
+            workers,
+            self._download_scheduler(budget, evict))
+
+        self.grds_to_ard(inventory_df, subset, timeseries, timescan, mosaic,
+                         cut_to_aoi=cut_to_aoi, memory=memory)
+
     def grds_to_ard(self, inventory_df=None, subset=None, timeseries=False,
                     timescan=False, mosaic=False, overwrite=False,
-                    exec_file=None, cut_to_aoi=False):
+                    exec_file=None, cut_to_aoi=False, ncores=os.cpu_count(),
+                    memory=None):
 
         self.update_ard_parameters()
 
@@ -1087,15 +1234,7 @@ class Sentinel1_GRDBatch(Sentinel1):
         #                  ' DEM instead.')
         #            self.ard_parameters['dem'] = 'ASTER 1sec GDEM'
 
-        if subset:
-            if subset.split('.')[-1] == '.shp':
-                subset = str(vec.shp_to_wkt(subset, buffer=0.1, envelope=True))
-            elif subset.startswith('POLYGON (('):
-                subset = loads(subset).buffer(0.1).to_wkt()
-            else:
-                print(' ERROR: No valid subset given.'
-                      ' Should be either path to a shapefile or a WKT Polygon.')
-                sys.exit()
+        subset = self._subset_wkt(subset)
 
         # check number of already prcessed acquisitions
         nr_of_processed = len(
@@ -1202,7 +1341,9 @@ class Sentinel1_GRDBatch(Sentinel1):
                 inventory_df,
                 self.processing_dir,
                 self.temp_dir,
-                cut_to_aoi
+                cut_to_aoi,
+                ncores,
+                memory
             )
 
         if mosaic and timescan and not subset:
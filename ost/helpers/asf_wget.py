@@ -4,16 +4,11 @@ from Alaska satellite Faciltity's Vertex server
 '''
 
 import os
-from os.path import join as opj
-import glob
 import requests
-import tqdm
-import multiprocessing
 from subprocess import Popen
 from subprocess import PIPE
 
-from ost.helpers import helpers as h
-from ost import Sentinel1_Scene as S1Scene
+from ost.helpers import download_engine
 
 
 # we need this class for earthdata access
@@ -77,6 +72,35 @@ def check_connection(uname, pword):
     return response
 
 
+class WgetMirror(download_engine.Mirror):
+    '''Mirror adapter for ASF that downloads with wget'''
+
+    name = 'asf_wget'
+
+    # ASF allows up to 10 concurrent connections
+    max_connections = 10
+
+    # wget downloads the whole file itself
+    ranges = False
+
+    def url(self, scene, inventory_row=None):
+        return scene.asf_url()
+
+    def download(self, engine, job):
+
+        with engine._host_limit(job.url, self):
+            command = ('wget --check-certificate=off -c -nv --http-user=' +
+                       self.uname + ' --http-passwd="' + self.pword +
+                       '" -O ' + job.filename + ' ' + job.url)
+            process = Popen(command, stdout=PIPE, stderr=PIPE, shell=True)
+            astdout, astderr = process.communicate()
+            print(astdout, astderr)
+
+        if process.returncode != 0:
+            raise IOError('wget exited with code {}'.format(
+                process.returncode))
+
+
 def s1_download(argument_list):
     """
     This function will download S1 products from ASF mirror.
@@ -94,91 +118,14 @@ def s1_download(argument_list):
     uname = argument_list[2]
     pword = argument_list[3]
 
-    #session = SessionWithHeaderRedirection(uname, pword)
-
     print(' INFO: Downloading scene to: {}'.format(filename))
-    # submit the request using the session
-    #response = session.get(url, stream=True)
-
-    # raise an exception in case of http errors
-    #response.raise_for_status()
-
-    # get download size
-    #total_length = int(response.headers.get('content-length', 0))
-
-    # define chunk_size
-    #chunk_size = 1024
-
-    # check if file is partially downloaded
-    if os.path.exists(filename):
-        os.remove(filename)
-
-    zip_test = 1
-    while zip_test is not None and zip_test <= 10:
-        command='wget --check-certificate=off -c -nv --http-user='+uname+' --http-passwd="'+pword+'" -O '+filename+' '+url
-        process = Popen(command, stdout=PIPE, stderr=PIPE, shell=True)    
-        astdout, astderr = process.communicate()    
-        print(astdout, astderr)
-
-
-        print(' INFO: Checking the zip archive of {} for inconsistency'
-                  .format(filename))
-        zip_test = h.check_zipfile(filename)
-        # if it did not pass the test, remove the file
-        # in the while loop it will be downlaoded again
-        if zip_test is not None:
-            print(' INFO: {} did not pass the zip test. \
-                  Re-downloading the full scene.'.format(filename))
-            if os.path.exists(filename):
-                os.remove(filename)
-            # otherwise we change the status to True
-        else:
-            print(' INFO: {} passed the zip test.'.format(filename))
-            with open(str('{}.downloaded'.format(filename)), 'w') as file:
-                file.write('successfully downloaded \n')
+    job = download_engine.DownloadJob(url, filename)
+    download_engine.DownloadEngine(
+        WgetMirror(uname, pword), concurrent=1, progress=False).download([job])
 
 
 def batch_download(inventory_df, download_dir, uname, pword, concurrent=10):
 
-    # create list of scenes
-    scenes = inventory_df['identifier'].tolist()
-    
-    check, i = False, 1
-    while check is False and i <= 10:
-
-        asf_list = []
-
-        for scene_id in scenes:
-
-            scene = S1Scene(scene_id)
-            filepath = scene._download_path(download_dir, True)
-
-            if os.path.exists('{}.downloaded'.format(filepath)):
-                print(' INFO: {} is already downloaded.'
-                      .format(scene.scene_id))
-            else:
-                asf_list.append([scene.asf_url(), filepath,
-                                 uname, pword])
-
-        if asf_list:
-            pool = multiprocessing.Pool(processes=concurrent)
-            pool.map(s1_download, asf_list)
-                    
-        downloaded_scenes = glob.glob(
-            opj(download_dir, 'SAR', '*', '20*', '*', '*',
-                '*.zip.downloaded'))
-
-        if len(inventory_df['identifier'].tolist()) == len(downloaded_scenes):
-            check = True
-            print(' INFO: All products are downloaded.')
-        else:
-            check = False
-            for scene in scenes:
-
-                scene = S1Scene(scene)
-                filepath = scene._download_path(download_dir)
-
-                if os.path.exists('{}.downloaded'.format(filepath)):
-                    scenes.remove(scene.scene_id)
-
-        i += 1
+    mirror = WgetMirror(uname, pword)
+    return download_engine.batch_download(
+        inventory_df, download_dir, mirror, concurrent)
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+'''This module writes Cloud-Optimized GeoTiffs (COG)
+
+Processing functions write their output window by window (optionally
+from several threads) into a temporary tiled GeoTiff. When the writer is
+closed, the file is converted into a COG with internal tiling,
+compression and overviews, so remote readers only fetch the blocks and
+resolution levels they need.
+
+    with CogWriter(outfile, profile) as dst:
+        for window in windows:
+            dst.write(array, window=window)
+
+'''
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import rasterio
+import rasterio.shutil
+
+
+class CogWriter():
+    '''Writes windows of a raster into a Cloud-Optimized GeoTiff
+
+    Args:
+        outfile (str): path of the output COG
+        profile (dict): rasterio profile (dtype, count, crs, transform,
+                        width, height, nodata) of the output
+        compress (str): compression of the COG (e.g. 'deflate', 'lzw',
+                        'zstd' or None)
+        blocksize (int): size (in pixels) of the internal tiles
+        overviews (bool): build internal overviews
+        resampling (str): resampling of the overviews (e.g. 'average'
+                          or 'nearest' for masks and classes)
+        nbits (int): bits per pixel of packed uint8 outputs (e.g. 1 for
+                     binary masks)
+
+    '''
+
+    def __init__(self, outfile, profile, compress='deflate', blocksize=512,
+                 overviews=True, resampling='average', nbits=None):
+
+        self.outfile = outfile
+        self.compress = compress
+        self.blocksize = blocksize
+        self.overviews = overviews
+        self.resampling = resampling
+        self.nbits = nbits
+
+        # windows are written to a tiled GeoTiff, which is converted at the
+        # end, since the COG driver can only create copies
+        self.temp_file = os.path.join(
+            os.path.dirname(os.path.abspath(outfile)),
+            '.{}.tmp.tif'.format(os.path.basename(outfile)))
+
+        profile = dict(profile)
+        for key in ('compress', 'predictor', 'blockxsize', 'blockysize',
+                    'interleave', 'photometric'):
+            profile.pop(key, None)
+        profile.update({'driver': 'GTiff', 'tiled': True,
+                        'blockxsize': blocksize, 'blockysize': blocksize,
+                        'BIGTIFF': 'IF_SAFER'})
+
+        self.profile = profile
+        self._lock = threading.Lock()
+        self.dataset = rasterio.open(self.temp_file, 'w', **profile)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *args):
+
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def write(self, array, window=None, indexes=None):
+        '''Writes an array into a window of the output (thread-safe)'''
+
+        with self._lock:
+            self.dataset.write(array, window=window, indexes=indexes)
+
+    def update_tags(self, *args, **kwargs):
+
+        with self._lock:
+            self.dataset.update_tags(*args, **kwargs)
+
+    def set_band_description(self, band, description):
+
+        with self._lock:
+            self.dataset.set_band_description(band, description)
+
+    def abort(self):
+        '''Closes and removes the temporary file without writing the COG'''
+
+        if not self.dataset.closed:
+            self.dataset.close()
+        if os.path.exists(self.temp_file):
+            os.remove(self.temp_file)
+
+    def close(self):
+        '''Converts the written raster into the COG'''
+
+        if self.dataset.closed:
+            return
+
+        self.dataset.close()
+        try:
+            to_cog(self.temp_file, self.outfile, self.compress,
+                   self.blocksize, self.overviews, self.resampling,
+                   self.nbits)
+        finally:
+            os.remove(self.temp_file)
+
+
+def to_cog(infile, outfile, compress='deflate', blocksize=512,
+           overviews=True, resampling='average', nbits=None):
+    '''Converts a raster into a Cloud-Optimized GeoTiff
+
+    Args:
+        infile (str): path of the input raster
+        outfile (str): path of the output COG
+        compress (str): compression of the COG
+        blocksize (int): size (in pixels) of the internal tiles
+        overviews (bool): build internal overviews
+        resampling (str): resampling of the overviews
+        nbits (int): bits per pixel of packed uint8 outputs
+
+    '''
+
+    options = {
+        'driver': 'COG',
+        'blocksize': blocksize,
+        'compress': compress.upper() if compress else 'NONE',
+        'overviews': 'AUTO' if overviews else 'NONE',
+        'overview_resampling': resampling.upper(),
+        'bigtiff': 'IF_SAFER',
+        'num_threads': 'ALL_CPUS'
+    }
+    if nbits:
+        # the predictor does not apply to packed sub-byte pixels
+        options['nbits'] = nbits
+    elif compress and compress.lower() in ('deflate', 'lzw', 'zstd'):
+        options['predictor'] = 'YES'
+
+    if os.path.exists(outfile):
+        os.remove(outfile)
+
+    rasterio.shutil.copy(infile, outfile, **options)
+
+
+def write_windows(outfile, profile, function, windows, ncores=os.cpu_count(),
+                  **kwargs):
+    '''Creates a COG from arrays that are computed per window in parallel
+
+    Args:
+        outfile (str): path of the output COG
+        profile (dict): rasterio profile of the output
+        function (function): returns the array with shape
+                             (bands, height, width) of a window
+        windows (iterable): the windows of the output
+        ncores (int): number of windows processed in parallel
+        kwargs: options of the CogWriter (compress, blocksize, ...)
+
+    '''
+
+    with CogWriter(outfile, profile, **kwargs) as dst:
+
+        def _process(window):
+            dst.write(function(window), window=window)
+
+        with ThreadPoolExecutor(max_workers=int(ncores)) as executor:
+            # raise errors of the workers
+            list(executor.map(_process, windows))
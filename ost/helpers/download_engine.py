@@ -0,0 +1,999 @@
+# -*- coding: utf-8 -*-
+'''This module provides the download engine shared by all mirrors
+
+The engine downloads products concurrently with a pool of threads. Each
+thread keeps its own pooled HTTP session, so connections are re-used across
+products. Mirror specific parts, i.e. authentication and URL resolution, are
+handled by mirror adapters (subclasses of Mirror) that live in the
+respective mirror modules (scihub, asf, asf_wget, peps and onda).
+'''
+
+import os
+from os.path import join as opj
+import json
+import hashlib
+import time
+import threading
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+import tqdm
+
+from ost.helpers import helpers as h, order_manager
+
+
+# functions called with the job and the result of each finished download
+_listeners = []
+
+
+def add_listener(function):
+    '''Registers a function that is called after each finished download
+
+    The function is called from the download threads with the job and
+    the result (True if the product has been downloaded).
+
+    Args:
+        function (function): the listener
+
+    '''
+
+    _listeners.append(function)
+
+
+def remove_listener(function):
+    '''Removes a registered listener'''
+
+    if function in _listeners:
+        _listeners.remove(function)
+
+
+def _notify(job, result):
+
+    for function in list(_listeners):
+        try:
+            function(job, result)
+        except Exception as error:
+            print(' WARNING: Download listener failed ({}).'.format(error))
+
+
+class DownloadJob():
+    '''A single product download
+
+    Args:
+        url (str): the url of the product
+        filename (str): the local path of the download
+        scene_id (str): the scene identifier (optional)
+        md5 (str): the expected MD5 checksum (optional)
+        mirror (Mirror): the mirror of the url (defaults to the engine's)
+        sources (list): alternative (mirror, url) sources of the product
+
+    '''
+
+    def __init__(self, url, filename, scene_id=None, md5=None, mirror=None,
+                 sources=None):
+        self.url = url
+        self.filename = filename
+        self.scene_id = scene_id
+        self.md5 = md5
+        self.mirror = mirror
+        self.sources = sources or [(mirror, url)]
+        self.digest = None
+        self.size = None
+        self.segments = None
+
+        # the size is added to the progress bar once, not on every retry
+        self.tracked = False
+
+        # telemetry of the download
+        self.stats = {'mirror': None, 'attempts': 0, 'bytes': 0,
+                      'mirror_bytes': {}, 'ttfb': None,
+                      'checksum_failures': 0, 'start': None, 'end': None}
+
+    @property
+    def journal(self):
+        '''Path of the file that tracks the progress of the segments'''
+        return '{}.segments'.format(self.filename)
+
+    def __repr__(self):
+        return 'DownloadJob({})'.format(self.scene_id or self.filename)
+
+
+class Mirror():
+    '''Base class of the mirror adapters
+
+    Subclasses define how to authenticate and how to resolve the download
+    url of a scene. They can also override download() in case a mirror
+    needs a completely different download mechanism.
+
+    Args:
+        uname (str): username for the mirror
+        pword (str): password for the mirror
+
+    '''
+
+    name = 'generic'
+
+    # maximum number of concurrent connections per host
+    max_connections = 4
+
+    # maximum number of segments a single product is split into
+    segments = 1
+
+    # whether the mirror can serve byte ranges to the engine
+    ranges = True
+
+    # whether offline products can be ordered (see OrderManager)
+    ordering = False
+
+    # maximum number of retrieval requests for offline products, either
+    # outstanding at the same time or, if order_window is set, placed
+    # within a sliding window of that many seconds
+    order_quota = None
+    order_window = None
+
+    def __init__(self, uname=None, pword=None):
+        self.uname = uname
+        self.pword = pword
+
+    def session(self):
+        '''Creates a new authenticated session'''
+
+        session = requests.Session()
+        if self.uname:
+            session.auth = (self.uname, self.pword)
+
+        return session
+
+    def url(self, scene, inventory_row=None):
+        '''Resolves the download url of a scene
+
+        Args:
+            scene (Sentinel1_Scene): the scene to download
+            inventory_row (Series): the row of the scene in the inventory
+
+        Returns:
+            str: the url of the product
+
+        '''
+
+        raise NotImplementedError
+
+    def probe(self, scene, inventory_row=None):
+        '''Checks if a scene can be downloaded right away from the mirror
+
+        Args:
+            scene (Sentinel1_Scene): the scene to download
+            inventory_row (Series): the row of the scene in the inventory
+
+        Returns:
+            str: the url of the product, or None if it is not available
+
+        '''
+
+        return self.url(scene, inventory_row)
+
+    def checksum(self, session, job):
+        '''Retrieves the MD5 checksum of a product, if the mirror provides it
+
+        Args:
+            session (Session): an authenticated session
+            job (DownloadJob): the download job
+
+        Returns:
+            str: the MD5 checksum or None
+
+        '''
+
+        return None
+
+    def online(self, session, job):
+        '''Checks if a product can be downloaded right away
+
+        Args:
+            session (Session): an authenticated session
+            job (DownloadJob): the download job
+
+        Returns:
+            bool: False if the product needs to be ordered first
+
+        '''
+
+        return True
+
+    def order(self, session, job):
+        '''Requests the retrieval of an offline product
+
+        Args:
+            session (Session): an authenticated session
+            job (DownloadJob): the download job
+
+        Returns:
+            bool: True if the request has been accepted
+
+        '''
+
+        return True
+
+    def check_response(self, response):
+        '''Raises an error for unsuccessful responses'''
+
+        if response.status_code == 401:
+            raise ValueError(' ERROR: Username/Password are incorrect.')
+
+        response.raise_for_status()
+
+    def download(self, engine, job):
+        '''Downloads a single job, by default over HTTP with the engine'''
+
+        return engine.http_download(job)
+
+
+class DownloadEngine():
+    '''The download engine for Sentinel-1 products
+
+    Args:
+        mirror (Mirror): the default mirror adapter for jobs without one
+        concurrent (int): number of parallel downloads
+        chunk_size (int): size (in bytes) of the chunks written to disk
+        retries (int): number of attempts per product
+        progress (bool): show a progress bar over all downloads
+        segments (int): maximum number of segments per product
+                        (defaults to the mirrors' settings)
+        min_segment_size (int): minimum size (in bytes) of a segment
+        full_check (bool): check the CRC of all members of products whose
+                           mirror provides no checksum (decompresses the
+                           whole product)
+
+    '''
+
+    def __init__(self, mirror=None, concurrent=4, chunk_size=1024 * 1024,
+                 retries=5, progress=True, segments=None,
+                 min_segment_size=64 * 1024 * 1024, full_check=False):
+
+        self.mirror = mirror
+        self.concurrent = concurrent
+        self.chunk_size = chunk_size
+        self.segments = segments
+        self.min_segment_size = min_segment_size
+        self.retries = retries
+        self.progress = progress
+        self.full_check = full_check
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._host_limits = {}
+        self._pbar = None
+        self._executor = None
+
+        # measured throughput (bytes, seconds) and active jobs per mirror
+        self._throughput = {}
+        self._active = {}
+
+    def _mirror(self, job):
+        return job.mirror or self.mirror
+
+    def _session(self, mirror=None):
+
+        mirror = mirror or self.mirror
+
+        # requests sessions are not thread-safe, so every thread gets
+        # its own session (per mirror) with a connection pool
+        if not hasattr(self._local, 'sessions'):
+            self._local.sessions = {}
+
+        if mirror.name not in self._local.sessions:
+            session = mirror.session()
+            adapter = HTTPAdapter(pool_connections=mirror.max_connections,
+                                  pool_maxsize=mirror.max_connections)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            self._local.sessions[mirror.name] = session
+
+        return self._local.sessions[mirror.name]
+
+    def _host_limit(self, url, mirror=None):
+
+        mirror = mirror or self.mirror
+        host = urllib.parse.urlparse(url).hostname
+        with self._lock:
+            if host not in self._host_limits:
+                self._host_limits[host] = threading.BoundedSemaphore(
+                    mirror.max_connections)
+
+            return self._host_limits[host]
+
+    def _update_progress(self, nbytes=0, total=0):
+
+        if self._pbar is None:
+            return
+
+        with self._lock:
+            if total:
+                self._pbar.total += total
+                self._pbar.refresh()
+            if nbytes:
+                self._pbar.update(nbytes)
+
+    def _track(self, job, nbytes=0):
+
+        # retries resume with the progress of the previous attempts, so only
+        # the first attempt adds the size and the bytes already on disk
+        if job.tracked:
+            return
+
+        job.tracked = True
+        self._update_progress(nbytes=nbytes, total=job.size)
+
+    def _transferred(self, job, response, nbytes, mirror):
+
+        with self._lock:
+            # time until the response headers arrived
+            if job.stats['ttfb'] is None:
+                job.stats['ttfb'] = response.elapsed.total_seconds()
+            job.stats['bytes'] += nbytes
+
+            # segments and retries may be served by different mirrors
+            mirror_bytes = job.stats['mirror_bytes']
+            mirror_bytes[mirror.name] = mirror_bytes.get(mirror.name, 0) + \
+                nbytes
+
+        self._update_progress(nbytes)
+
+    def http_download(self, job):
+        '''Downloads a job over HTTP, resuming partial downloads
+
+        Large products are split into segments that are downloaded in
+        parallel, if the mirror allows it and the server supports range
+        requests.
+
+        Args:
+            job (DownloadJob): the download job
+
+        '''
+
+        segments = self.segments or self._mirror(job).segments
+        if os.path.exists(job.journal) or (
+                segments > 1 and not os.path.exists(job.filename)):
+            if self.segmented_download(job):
+                return
+
+        self.stream_download(job)
+
+    def stream_download(self, job):
+        '''Downloads a job over a single connection, resuming from the end
+        of a partially downloaded file
+
+        Args:
+            job (DownloadJob): the download job
+
+        '''
+
+        mirror = self._mirror(job)
+        session = self._session(mirror)
+
+        # check if file is partially downloaded
+        first_byte = 0
+        if os.path.exists(job.filename):
+            first_byte = os.path.getsize(job.filename)
+
+        headers = {}
+        if first_byte:
+            headers['Range'] = 'bytes={}-'.format(first_byte)
+
+        with self._host_limit(job.url, mirror), session.get(
+                job.url, headers=headers, stream=True) as response:
+
+            # range is beyond the file size, i.e. file is complete
+            if response.status_code == 416 and job.size in (None, first_byte):
+                job.size = first_byte
+                return
+
+            mirror.check_response(response)
+
+            # the server ignored the range request, so we start from scratch
+            if response.status_code != 206:
+                first_byte = 0
+
+            length = int(response.headers.get('content-length', 0))
+            if job.size is None:
+                job.size = first_byte + length
+                self._track(job, first_byte)
+
+            # the checksum is calculated while streaming, only an already
+            # downloaded part of the file needs to be read again
+            md5 = None
+            if job.md5:
+                md5 = hashlib.md5()
+                if first_byte:
+                    with open(job.filename, 'rb') as file:
+                        for chunk in iter(
+                                lambda: file.read(self.chunk_size), b''):
+                            md5.update(chunk)
+
+            with open(job.filename, 'ab' if first_byte else 'wb') as file:
+                for chunk in response.iter_content(self.chunk_size):
+                    if chunk:
+                        file.write(chunk)
+                        if md5:
+                            md5.update(chunk)
+                        self._transferred(job, response, len(chunk),
+                                          mirror)
+
+            if md5:
+                job.digest = md5.hexdigest()
+
+        if os.path.getsize(job.filename) < job.size:
+            raise IOError('Incomplete download of {}'.format(job.filename))
+
+    def _probe(self, mirror, url):
+
+        # ask for the first byte to get the size and range support
+        with self._host_limit(url, mirror), self._session(mirror).get(
+                url, headers={'Range': 'bytes=0-0'}, stream=True) as response:
+
+            mirror.check_response(response)
+            if response.status_code != 206:
+                return None
+
+            return int(response.headers['Content-Range'].split('/')[-1])
+
+    def _save_journal(self, job, force=False):
+
+        # the journal is written at most every 2 seconds
+        now = time.time()
+        if not force and now - getattr(job, '_journal_time', 0) < 2:
+            return
+
+        job._journal_time = now
+        with open('{}.tmp'.format(job.journal), 'w') as file:
+            json.dump({'size': job.size, 'segments': job.segments}, file)
+        os.replace('{}.tmp'.format(job.journal), job.journal)
+
+    def _fetch_segment(self, job, segment, source=None):
+
+        start, end, written = segment
+        if start + written > end:
+            return
+
+        mirror, url = source or (self._mirror(job), job.url)
+        mirror = mirror or self.mirror
+
+        headers = {'Range': 'bytes={}-{}'.format(start + written, end)}
+        with self._host_limit(url, mirror), self._session(mirror).get(
+                url, headers=headers, stream=True) as response:
+
+            mirror.check_response(response)
+            if response.status_code != 206:
+                raise IOError('Server did not honour the range request')
+
+            # unbuffered, so that the journal never runs ahead of the file
+            with open(job.filename, 'r+b', buffering=0) as file:
+                file.seek(start + written)
+                for chunk in response.iter_content(self.chunk_size):
+                    chunk = memoryview(chunk)[:end + 1 - start - segment[2]]
+                    while chunk:
+                        chunk = chunk[file.write(chunk):]
+
+                    with self._lock:
+                        nbytes = (file.tell() - start) - segment[2]
+                        segment[2] += nbytes
+                        self._save_journal(job)
+
+                    self._transferred(job, response, nbytes, mirror)
+
+        if start + segment[2] <= end:
+            raise IOError('Incomplete segment {}-{} of {}'.format(
+                start, end, job.filename))
+
+    def _segment_sources(self, job):
+
+        # alternative mirrors can only serve segments of identical products
+        sources = [(self._mirror(job), job.url)]
+        for mirror, url in job.sources:
+            if (mirror is None or mirror is sources[0][0] or
+                    not mirror.ranges or len(job.segments) < 2):
+                continue
+            try:
+                if self._probe(mirror, url) == job.size:
+                    sources.append((mirror, url))
+            except (requests.exceptions.RequestException, ValueError):
+                pass
+
+        return sources
+
+    def segmented_download(self, job):
+        '''Downloads a job in parallel byte ranges into a preallocated file
+
+        The progress of each segment is tracked in a journal next to the
+        download, so interrupted downloads resume every segment where it
+        stopped. If the product is available from several mirrors with the
+        same size, the segments are spread over these mirrors.
+
+        Args:
+            job (DownloadJob): the download job
+
+        Returns:
+            bool: False if the server does not support range requests
+
+        '''
+
+        # resume from the journal
+        if os.path.exists(job.journal) and os.path.exists(job.filename):
+            with open(job.journal, 'r') as file:
+                journal = json.load(file)
+            job.size, job.segments = journal['size'], journal['segments']
+            done = sum(segment[2] for segment in job.segments)
+            self._track(job, done)
+
+        else:
+            size = self._probe(self._mirror(job), job.url)
+            if size is None:
+                return False
+
+            # adapt the number of segments to the product size
+            nr_of_segments = int(max(1, min(
+                self.segments or self._mirror(job).segments,
+                size // self.min_segment_size)))
+            bounds = [size * i // nr_of_segments
+                      for i in range(nr_of_segments + 1)]
+            job.size = size
+            job.segments = [[bounds[i], bounds[i + 1] - 1, 0]
+                            for i in range(nr_of_segments)]
+            self._track(job)
+
+            # preallocate a (sparse) file
+            with open(job.filename, 'wb') as file:
+                file.truncate(size)
+            self._save_journal(job, force=True)
+
+        sources = self._segment_sources(job)
+        try:
+            with ThreadPoolExecutor(max_workers=len(job.segments)) as executor:
+                list(executor.map(
+                    lambda i: self._fetch_segment(
+                        job, job.segments[i], sources[i % len(sources)]),
+                    range(len(job.segments))))
+        finally:
+            with self._lock:
+                self._save_journal(job, force=True)
+
+        os.remove(job.journal)
+        return True
+
+    def verify(self, job):
+        '''Verifies a downloaded product
+
+        The structure of the zip archive is checked from its central
+        directory. If the mirror provides a checksum, the MD5 of the file
+        is compared as well, and in case of a mismatch the damaged members
+        are located by their CRC. Without a checksum, the CRC of all
+        members is only checked if the engine runs with full_check, so by
+        default a corrupted member of such a product is not detected.
+
+        Args:
+            job (DownloadJob): the download job
+
+        Returns:
+            None if the product is fine, otherwise a list of (start, end)
+            byte ranges that need to be downloaded again
+
+        '''
+
+        damaged = h.check_zipfile_structure(job.filename)
+        if damaged:
+            return damaged
+
+        # without a checksum, corruption inside the members is only found
+        # by their CRC, which is as expensive as unpacking the product
+        if not job.md5:
+            return h.check_zipfile_crc(job.filename) if self.full_check \
+                else None
+
+        if job.digest is None:
+            job.digest = h.file_md5(job.filename)
+
+        if job.digest.lower() == job.md5.lower():
+            return None
+
+        print(' INFO: Checksum of {} does not match.'.format(job.filename))
+        return h.check_zipfile_crc(job.filename) or [
+            (0, os.path.getsize(job.filename) - 1)]
+
+    def refetch(self, job, ranges):
+        '''Downloads the given byte ranges of a product again
+
+        Args:
+            job (DownloadJob): the download job
+            ranges (list): (start, end) byte ranges
+
+        '''
+
+        print(' INFO: Re-downloading {} damaged part(s) of {}.'.format(
+            len(ranges), job.filename))
+
+        job.size = os.path.getsize(job.filename)
+        job.segments = [[start, end, 0] for start, end in ranges]
+        job.digest = None
+        self._save_journal(job, force=True)
+
+        for segment in job.segments:
+            self._fetch_segment(job, segment)
+
+        os.remove(job.journal)
+
+    def _select_source(self, job, rank=True):
+
+        # rank the sources by their measured throughput, shared by the
+        # number of downloads that are currently running on the mirror
+        def score(source):
+            mirror = source[0] or self.mirror
+            nbytes, seconds = self._throughput.get(mirror.name, (0, 0))
+            speed = nbytes / seconds if seconds else float('inf')
+            return speed / (1 + self._active.get(mirror.name, 0))
+
+        with self._lock:
+            if rank:
+                job.sources.sort(key=score, reverse=True)
+            job.mirror, job.url = job.sources[0]
+            mirror = self._mirror(job)
+            self._active[mirror.name] = self._active.get(mirror.name, 0) + 1
+
+        return mirror
+
+    def _failover(self, job):
+
+        # move the failed source to the end and continue from the next one
+        with self._lock:
+            job.sources.append(job.sources.pop(0))
+            job.mirror, job.url = job.sources[0]
+
+        print(' INFO: Switching download of {} to {}.'.format(
+            job.scene_id or job.filename, self._mirror(job).name))
+
+        # partial downloads can only be continued from identical products
+        if job.size is not None and os.path.exists(job.filename):
+            try:
+                size = self._probe(self._mirror(job), job.url)
+            except (requests.exceptions.RequestException, ValueError):
+                size = None
+            if size != job.size:
+                for file in (job.filename, job.journal):
+                    if os.path.exists(file):
+                        os.remove(file)
+                job.size, job.segments, job.digest = None, None, None
+
+    def _run(self, job):
+
+        result = False
+        job.stats['start'] = time.time()
+        try:
+            result = self._attempt(job)
+        finally:
+            job.stats['end'] = time.time()
+            _notify(job, result)
+
+        return result
+
+    def _attempt(self, job):
+
+        for attempt in range(self.retries):
+
+            # after a failover, the order of the sources is kept
+            mirror = self._select_source(job, rank=attempt == 0) \
+                if len(job.sources) > 1 else self._mirror(job)
+            start = time.time()
+            job.stats['attempts'] += 1
+            job.stats['mirror'] = mirror.name
+            try:
+                if job.md5 is None:
+                    job.md5 = mirror.checksum(self._session(mirror), job)
+
+                mirror.download(self, job)
+
+                # check the archive and download damaged parts again
+                damaged = self.verify(job)
+                if damaged is not None:
+                    job.stats['checksum_failures'] += 1
+                if damaged:
+                    self.refetch(job, damaged)
+                    damaged = self.verify(job)
+                    if damaged is not None:
+                        job.stats['checksum_failures'] += 1
+
+                if damaged is None:
+                    with self._lock:
+                        nbytes, seconds = self._throughput.get(
+                            mirror.name, (0, 0))
+                        self._throughput[mirror.name] = (
+                            nbytes + job.size, seconds + time.time() - start)
+
+                    with open('{}.downloaded'.format(job.filename), 'w') as file:
+                        file.write('successfully downloaded \n')
+                    return True
+
+                print(' INFO: {} did not pass the integrity check. '
+                      'Re-downloading the full scene.'.format(job.filename))
+                os.remove(job.filename)
+                job.size, job.segments, job.digest = None, None, None
+
+            except ValueError as error:
+                # there is no other mirror to try, so the job fails
+                if len(job.sources) < 2:
+                    print(' ERROR: Download of {} failed ({}).'.format(
+                        job.filename, str(error).strip()))
+                    return False
+                print(' WARNING: Authentication failed on {}.'.format(
+                    mirror.name))
+                self._failover(job)
+            except (requests.exceptions.RequestException, IOError) as error:
+                print(' WARNING: Download of {} failed ({}). Attempt {} of {}.'
+                      .format(job.filename, error, attempt + 1, self.retries))
+                if len(job.sources) > 1:
+                    self._failover(job)
+            finally:
+                if len(job.sources) > 1:
+                    with self._lock:
+                        self._active[mirror.name] -= 1
+
+            time.sleep(min(2 ** attempt, 60))
+
+        return False
+
+    def start(self):
+        '''Starts the engine for jobs that are submitted one by one'''
+
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrent)
+        if self.progress:
+            self._pbar = tqdm.tqdm(total=0, unit='B', unit_scale=True,
+                                   desc=' INFO: Downloading')
+
+    def submit(self, job, callback=None):
+        '''Submits a job to the started engine
+
+        Args:
+            job (DownloadJob): the download job
+            callback (function): called with the job and the result
+                                 (True if downloaded) once it is finished
+
+        Returns:
+            Future: the future of the job
+
+        '''
+
+        future = self._executor.submit(self._run, job)
+        if callback:
+            future.add_done_callback(lambda future: callback(
+                job, future.exception() is None and future.result()))
+
+        return future
+
+    def join(self):
+        '''Waits for all submitted jobs and stops the engine'''
+
+        try:
+            self._executor.shutdown(wait=True)
+        finally:
+            if self._pbar is not None:
+                self._pbar.close()
+                self._pbar = None
+
+    def download(self, jobs):
+        '''Downloads a list of jobs concurrently
+
+        Args:
+            jobs (list): DownloadJob instances
+
+        Returns:
+            list: the jobs that failed
+
+        '''
+
+        jobs = [job for job in jobs
+                if not os.path.exists('{}.downloaded'.format(job.filename))]
+        if not jobs:
+            return []
+
+        self.start()
+        try:
+            futures = [self.submit(job) for job in jobs]
+            failed = []
+            for job, future in zip(jobs, futures):
+                # an error of one job must not stop collecting the others
+                try:
+                    if not future.result():
+                        failed.append(job)
+                except Exception as error:
+                    print(' ERROR: Download of {} failed ({}).'.format(
+                        job.filename, error))
+                    failed.append(job)
+        finally:
+            self.join()
+
+        return failed
+
+
+def create_jobs(inventory_df, download_dir, mirror, workers=8):
+    '''Creates the download jobs for all scenes of an inventory
+
+    Scenes that are already downloaded are skipped. The download urls
+    are resolved in parallel.
+
+    Args:
+        inventory_df (GeoDataFrame): an OST compliant Sentinel-1 inventory
+        download_dir (str): the directory for the downloads
+        mirror (Mirror): the mirror adapter
+        workers (int): number of parallel url requests
+
+    Returns:
+        list: the download jobs
+
+    '''
+
+    from ost import Sentinel1_Scene as S1Scene
+
+    scenes = []
+    for _, row in inventory_df.iterrows():
+
+        scene = S1Scene(row.identifier)
+        filepath = scene._download_path(download_dir, True)
+
+        if os.path.exists('{}.downloaded'.format(filepath)):
+            print(' INFO: {} is already downloaded.'.format(scene.scene_id))
+        else:
+            scenes.append((scene, row, filepath))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        urls = list(executor.map(
+            lambda scene: mirror.url(scene[0], scene[1]), scenes))
+
+    return [DownloadJob(url, filepath, scene.scene_id, mirror=mirror)
+            for (scene, _, filepath), url in zip(scenes, urls)]
+
+
+def batch_download(inventory_df, download_dir, mirror, concurrent=4):
+    '''Downloads all scenes of an inventory from a mirror
+
+    Args:
+        inventory_df (GeoDataFrame): an OST compliant Sentinel-1 inventory
+        download_dir (str): the directory for the downloads
+        mirror (Mirror): the mirror adapter
+        concurrent (int): number of parallel downloads
+
+    Returns:
+        list: the jobs that failed
+
+    '''
+
+    jobs = create_jobs(inventory_df, download_dir, mirror)
+    failed = DownloadEngine(mirror, concurrent=concurrent).download(jobs)
+
+    if failed:
+        print(' WARNING: {} products could not be downloaded: {}'.format(
+            len(failed), ', '.join(job.scene_id for job in failed)))
+    else:
+        print(' INFO: All products are downloaded.')
+
+    return failed
+
+
+def probe_mirrors(inventory_df, download_dir, mirrors, workers=16):
+    '''Checks the availability of all scenes on all mirrors in parallel
+
+    Args:
+        inventory_df (GeoDataFrame): an OST compliant Sentinel-1 inventory
+        download_dir (str): the directory for the downloads
+        mirrors (list): the mirror adapters
+        workers (int): number of parallel requests
+
+    Returns:
+        tuple: the download jobs, with the available sources of each scene
+               ordered by the response time of the mirrors, and the
+               identifiers of the scenes that are not available anywhere
+
+    '''
+
+    from ost import Sentinel1_Scene as S1Scene
+
+    scenes = []
+    for _, row in inventory_df.iterrows():
+        scene = S1Scene(row.identifier)
+        filepath = scene._download_path(download_dir, True)
+        if os.path.exists('{}.downloaded'.format(filepath)):
+            print(' INFO: {} is already downloaded.'.format(scene.scene_id))
+        else:
+            scenes.append((scene, row, filepath))
+
+    def _probe(argument_list):
+        (scene, row, _), mirror = argument_list
+        start = time.time()
+        try:
+            url = mirror.probe(scene, row)
+        # the legacy scihub helpers exit on connection errors
+        except (requests.exceptions.RequestException, ValueError, IOError,
+                SystemExit) as error:
+            print(' WARNING: Could not probe {} on {} ({}).'.format(
+                scene.scene_id, mirror.name, error))
+            url = None
+
+        return url, time.time() - start
+
+    print(' INFO: Checking the availability of {} scenes on {} mirrors.'
+          .format(len(scenes), len(mirrors)))
+    argument_list = [(scene, mirror) for scene in scenes for mirror in mirrors]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(_probe, argument_list))
+
+    # median response time per mirror
+    latency = {}
+    for i, mirror in enumerate(mirrors):
+        times = sorted(t for url, t in results[i::len(mirrors)] if url)
+        latency[mirror.name] = times[len(times) // 2] if times \
+            else float('inf')
+
+    jobs, unavailable = [], []
+    for i, (scene, row, filepath) in enumerate(scenes):
+        probes = results[i * len(mirrors):(i + 1) * len(mirrors)]
+        sources = sorted(
+            [(mirror, url) for mirror, (url, _) in zip(mirrors, probes) if url],
+            key=lambda source: latency[source[0].name])
+
+        if sources:
+            jobs.append(DownloadJob(sources[0][1], filepath, scene.scene_id,
+                                    mirror=sources[0][0], sources=sources))
+        else:
+            unavailable.append(scene.scene_id)
+
+    return jobs, unavailable
+
+
+def multi_mirror_download(inventory_df, download_dir, mirrors, concurrent=4):
+    '''Downloads all scenes of an inventory from the fastest available mirror
+
+    All mirrors are probed for all scenes. Each scene is then downloaded
+    from the available mirror with the best throughput, switching to
+    another mirror if a download fails. Scenes that are offline on all
+    mirrors are ordered from the first mirror that takes orders.
+
+    Args:
+        inventory_df (GeoDataFrame): an OST compliant Sentinel-1 inventory
+        download_dir (str): the directory for the downloads
+        mirrors (list): the mirror adapters
+        concurrent (int): number of parallel downloads
+
+    Returns:
+        list: identifiers of the scenes that have not been downloaded
+
+    '''
+
+    jobs, unavailable = probe_mirrors(inventory_df, download_dir, mirrors)
+    if unavailable:
+        print(' INFO: {} scenes are not available on any mirror right now.'
+              .format(len(unavailable)))
+
+    failed = DownloadEngine(concurrent=concurrent).download(jobs)
+    missing = [job.scene_id for job in failed]
+
+    # the same orders as in the single mirror download of the mirror
+    ordering = [mirror for mirror in mirrors if mirror.ordering]
+    if unavailable and ordering:
+        mirror = ordering[0]
+        print(' INFO: Ordering the offline scenes from {}.'.format(
+            mirror.name))
+        manager = order_manager.OrderManager(
+            DownloadEngine(mirror, concurrent=concurrent), mirror,
+            opj(download_dir, '.{}_orders.json'.format(mirror.name)))
+        unavailable = [job.scene_id for job in manager.run(create_jobs(
+            inventory_df[inventory_df.identifier.isin(unavailable)],
+            download_dir, mirror))]
+
+    missing += unavailable
+
+    if missing:
+        print(' WARNING: {} products could not be downloaded: {}'.format(
+            len(missing), ', '.join(missing)))
+    else:
+        print(' INFO: All products are downloaded.')
+
+    return missing
@@ -15,6 +15,8 @@ import subprocess
 import time
 import datetime
 from datetime import timedelta
+import hashlib
+import struct
 from pathlib import Path
 import zipfile
 
@@ -287,12 +289,16 @@ def check_out_tiff(file, test_stats=True):
     # check for file size of the dim file
     tiff_size_in_mb = os.path.getsize(file) / 1048576
 
-    if tiff_size_in_mb < 0.3:
+    ds = gdal.Open(file)
+    if ds is None:
+        return 666
+
+    # compressed (cloud optimized) tiffs of small areas can be tiny
+    compressed = ds.GetMetadata('IMAGE_STRUCTURE').get('COMPRESSION')
+    if tiff_size_in_mb < 0.3 and not compressed:
         return 666
 
     if test_stats:
-        # open the file
-        ds = gdal.Open(file)
         stats = ds.GetRasterBand(1).GetStatistics(0, 1)
 
         # check for mean value of layer
@@ -326,6 +332,108 @@ def check_zipfile(filename):
     else:
         return zip_test
     
+def _zip_member_ranges(archive, size):
+    '''Returns the byte ranges of all members of an opened zip archive'''
+
+    infos = sorted(archive.infolist(), key=lambda x: x.header_offset)
+    ends = [info.header_offset for info in infos[1:]] + [archive.start_dir]
+
+    return [(info, info.header_offset, min(end, size) - 1)
+            for info, end in zip(infos, ends)]
+
+
+def check_zipfile_structure(filename):
+    '''Checks the structure of a zip archive without decompressing it
+
+    The central directory is read and for each member it is checked
+    that its local header is in place and its data lies within the file.
+
+    Args:
+        filename (str): path to the zip archive
+
+    Returns:
+        None if the archive is consistent, otherwise a list of
+        (start, end) byte ranges of the damaged members (the whole
+        file if the central directory is not readable)
+
+    '''
+
+    size = os.path.getsize(filename)
+    try:
+        archive = zipfile.ZipFile(filename)
+    except (zipfile.BadZipFile, OSError):
+        return [(0, size - 1)]
+
+    damaged = []
+    with archive, open(filename, 'rb') as file:
+        for info, start, end in _zip_member_ranges(archive, size):
+            file.seek(start)
+            header = file.read(30)
+            if len(header) < 30 or header[:4] != b'PK\x03\x04':
+                damaged.append((start, end))
+                continue
+
+            # the data follows the file name and the extra field of the
+            # local header, which may differ from the central directory
+            name_length, extra_length = struct.unpack('<HH', header[26:30])
+            if start + 30 + name_length + extra_length + \
+                    info.compress_size > end + 1:
+                damaged.append((start, end))
+
+    return damaged or None
+
+
+def check_zipfile_crc(filename):
+    '''Checks the CRC of all members of a zip archive
+
+    Args:
+        filename (str): path to the zip archive
+
+    Returns:
+        None if all members are fine, otherwise a list of
+        (start, end) byte ranges of the damaged members
+
+    '''
+
+    size = os.path.getsize(filename)
+    try:
+        archive = zipfile.ZipFile(filename)
+    except (zipfile.BadZipFile, OSError):
+        return [(0, size - 1)]
+
+    damaged = []
+    with archive:
+        for info, start, end in _zip_member_ranges(archive, size):
+            try:
+                with archive.open(info) as member:
+                    while member.read(1024 * 1024):
+                        pass
+            except Exception:
+                damaged.append((start, end))
+
+    return damaged or None
+
+
+def file_md5(filename, chunk_size=1024 * 1024):
+    '''Calculates the MD5 checksum of a file
+
+    Args:
+        filename (str): path to the file
+        chunk_size (int): size of the blocks read at once
+
+    Returns:
+        str: the hex digest of the checksum
+
+    '''
+
+    md5 = hashlib.md5()
+    with open(filename, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            md5.update(chunk)
+
+    return md5.hexdigest()
+
+
 def resolution_in_degree(latitude, meters):
     '''Convert resolution in meters to degree based on Latitude
 
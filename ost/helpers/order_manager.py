@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+'''This module handles the retrieval of offline Sentinel-1 products
+
+Mirrors like Copernicus' scihub (long term archive) and CNES' PEPS (tape)
+do not serve older products right away. They have to be ordered first and
+become available after minutes to hours. The order manager submits
+retrieval requests for all offline products at once, within the quota of
+the mirror, and polls their status with an exponential backoff. Products
+are handed to the download engine as soon as they are online, so online
+products are downloaded while the others are still being retrieved.
+
+The state of the orders is kept in a JSON file, so an interrupted batch
+download continues polling the existing orders instead of placing new
+ones.
+
+'''
+
+import os
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+# states of the products
+OFFLINE = 'offline'
+ORDERED = 'ordered'
+ONLINE = 'online'
+DOWNLOADED = 'downloaded'
+FAILED = 'failed'
+
+
+class OrderManager():
+    '''Orders offline products and downloads them as they come online
+
+    Args:
+        engine (DownloadEngine): the engine for the downloads
+        mirror (Mirror): the mirror adapter the orders are placed at
+        state_file (str): path to the JSON file holding the order states
+        poll_interval (int): seconds before the first status check
+                             of an order
+        max_poll_interval (int): maximum seconds between two status checks
+        max_wait (int): maximum seconds to wait for offline products
+                        (None waits until all are retrieved)
+        workers (int): number of parallel status requests
+
+    '''
+
+    def __init__(self, engine, mirror, state_file, poll_interval=60,
+                 max_poll_interval=3600, max_wait=None, workers=8):
+
+        self.engine = engine
+        self.mirror = mirror
+        self.state_file = state_file
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.max_wait = max_wait
+        self.workers = workers
+
+        self._lock = threading.Lock()
+        self.state = self._load()
+
+    def _load(self):
+
+        if not os.path.exists(self.state_file):
+            return {}
+
+        try:
+            with open(self.state_file, 'r') as file:
+                return json.load(file)
+        except ValueError:
+            print(' WARNING: Could not read the order state file {}. '
+                  'Starting with a fresh state.'.format(self.state_file))
+            return {}
+
+    def _save(self):
+
+        with self._lock:
+            temp_file = '{}.tmp'.format(self.state_file)
+            with open(temp_file, 'w') as file:
+                json.dump(self.state, file, indent=1)
+            os.replace(temp_file, self.state_file)
+
+    def _set(self, job, status, **kwargs):
+
+        with self._lock:
+            entry = self.state.setdefault(job.scene_id, {})
+            entry['status'] = status
+            entry.update(kwargs)
+
+    def _status(self, job):
+        return self.state.get(job.scene_id, {}).get('status')
+
+    def _check(self, jobs, function):
+        '''Runs a status or order request for all jobs in parallel'''
+
+        def _request(job):
+            try:
+                return function(self.engine._session(self.mirror), job)
+            except requests.exceptions.RequestException as error:
+                print(' WARNING: Request for {} failed ({}).'.format(
+                    job.scene_id, error))
+                return None
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            return list(executor.map(_request, jobs))
+
+    def _downloaded(self, job, result):
+
+        self._set(job, DOWNLOADED if result else FAILED)
+        self._save()
+
+    def _download(self, job):
+
+        self._set(job, ONLINE)
+        self.engine.submit(job, callback=self._downloaded)
+
+    def _order(self, jobs):
+        '''Orders offline products within the quota of the mirror'''
+
+        now = time.time()
+        offline = [job for job in jobs if self._status(job) == OFFLINE]
+
+        if self.mirror.order_quota is not None:
+            if self.mirror.order_window is None:
+                placed = len([job for job in jobs
+                              if self._status(job) == ORDERED])
+            else:
+                # the order times are kept in the state file, so the
+                # window holds across runs
+                placed = len([
+                    entry for entry in self.state.values()
+                    if now - entry.get('ordered', float('-inf')) <
+                    self.mirror.order_window])
+            offline = offline[:max(self.mirror.order_quota - placed, 0)]
+
+        if not offline:
+            return
+
+        print(' INFO: Ordering {} offline products from {}.'.format(
+            len(offline), self.mirror.name))
+
+        for job, accepted in zip(offline,
+                                 self._check(offline, self.mirror.order)):
+            if accepted:
+                self._set(job, ORDERED, ordered=now, attempts=0,
+                          interval=self.poll_interval,
+                          next_poll=now + self.poll_interval)
+            else:
+                # quota exceeded on the server side, try again later
+                break
+
+    def _poll(self, jobs):
+        '''Checks the status of all orders that are due'''
+
+        now = time.time()
+        due = [job for job in jobs if self._status(job) == ORDERED and
+               self.state[job.scene_id]['next_poll'] <= now]
+
+        for job, online in zip(due, self._check(due, self.mirror.online)):
+            if online:
+                print(' INFO: {} is online after {:.0f} minutes.'.format(
+                    job.scene_id,
+                    (now - self.state[job.scene_id]['ordered']) / 60))
+                self._download(job)
+            else:
+                entry = self.state[job.scene_id]
+                interval = min(entry['interval'] * 2, self.max_poll_interval)
+                self._set(job, ORDERED, attempts=entry['attempts'] + 1,
+                          interval=interval, next_poll=now + interval)
+
+    def _sleep(self, jobs):
+        '''Waits until the next order is due to be polled'''
+
+        polls = [self.state[job.scene_id]['next_poll'] for job in jobs
+                 if self._status(job) == ORDERED]
+
+        # orders rejected by the server are retried after the poll interval
+        wait = min(polls) - time.time() if polls else self.poll_interval
+        time.sleep(min(max(wait, 0), self.max_poll_interval))
+
+    def run(self, jobs):
+        '''Downloads all jobs, ordering the offline products
+
+        Args:
+            jobs (list): DownloadJob instances of the mirror
+
+        Returns:
+            list: the jobs that failed or are still offline
+
+        '''
+
+        jobs = [job for job in jobs
+                if not os.path.exists('{}.downloaded'.format(job.filename))]
+        if not jobs:
+            return []
+
+        print(' INFO: Checking the online status of {} products on {}.'
+              .format(len(jobs), self.mirror.name))
+
+        self.engine.start()
+        try:
+            # downloads of online products start right away
+            for job, online in zip(jobs, self._check(jobs, self.mirror.online)):
+                if online:
+                    self._download(job)
+                elif self._status(job) != ORDERED:
+                    # existing orders of an earlier run are kept
+                    self._set(job, OFFLINE)
+            self._save()
+
+            start = time.time()
+            while True:
+
+                waiting = [job for job in jobs
+                           if self._status(job) in (OFFLINE, ORDERED)]
+                if not waiting:
+                    break
+
+                if self.max_wait is not None and \
+                        time.time() - start > self.max_wait:
+                    print(' WARNING: Stopped waiting for {} offline products.'
+                          ' Run the download again to continue.'.format(
+                              len(waiting)))
+                    break
+
+                self._order(waiting)
+                self._poll(waiting)
+                self._save()
+
+                if any(self._status(job) in (OFFLINE, ORDERED)
+                       for job in waiting):
+                    self._sleep(waiting)
+
+        finally:
+            self.engine.join()
+            self._save()
+
+        failed = [job for job in jobs if self._status(job) != DOWNLOADED]
+        if failed:
+            print(' WARNING: {} products could not be downloaded: {}'.format(
+                len(failed), ', '.join(job.scene_id for job in failed)))
+        else:
+            print(' INFO: All products are downloaded.')
+
+        return failed
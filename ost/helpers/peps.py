@@ -1,18 +1,16 @@
 # -*- coding: utf-8 -*-
 
 # import standard libs
-import os
 import getpass
+from os.path import join as opj
 import urllib
-import time
-import multiprocessing
 
 # import non-standar libes
 import requests
-import tqdm
 
 # import ost classes/functions
-from ost.helpers import helpers as h
+from ost.helpers import download_engine
+from ost.helpers import order_manager
 
 
 def ask_credentials():
@@ -81,6 +79,51 @@ def check_connection(uname, pword):
     return response.status_code
 
 
+class PepsMirror(download_engine.Mirror):
+    '''Mirror adapter for CNES' PEPS'''
+
+    name = 'peps'
+    max_connections = 4
+    segments = 4
+
+    # number of products staged from tape at the same time
+    ordering = True
+    order_quota = 50
+
+    def url(self, scene, inventory_row=None):
+
+        if inventory_row is not None and 'pepsUrl' in inventory_row:
+            return inventory_row['pepsUrl']
+
+        return scene.peps_uuid(self.uname, self.pword)[1]
+
+    def online(self, session, job):
+
+        # like Sentinel1_Scene.peps_online_status, 202 means on tape
+        with session.get(job.url, stream=True) as response:
+            if response.status_code == 202:
+                return False
+
+            self.check_response(response)
+
+        return True
+
+    def order(self, session, job):
+
+        # requesting a product on tape triggers its staging
+        with session.get(job.url, stream=True) as response:
+            if response.status_code not in (200, 202):
+                self.check_response(response)
+
+        return True
+
+    def probe(self, scene, inventory_row=None):
+
+        # products on tape are not available right away
+        status, url = scene.peps_online_status(self.uname, self.pword)
+        return url if status == 'online' else None
+
+
 def s1_download(argument_list):
     '''Function to download a single Sentinel-1 product from CNES' PEPS
 
@@ -99,139 +142,34 @@ def s1_download(argument_list):
     uname = argument_list[2]
     pword = argument_list[3]
 
-    # get first response for file Size
-    response = requests.get(url, stream=True, auth=(uname, pword))
-
-    # get download size
-    total_length = int(response.headers.get('content-length', 0))
-
-    # define chunk_size
-    chunk_size = 1024
-
-    # check if file is partially downloaded
-    if os.path.exists(filename):
-
-        first_byte = os.path.getsize(filename)
-        if first_byte == total_length:
-            print(' INFO: {} already downloaded.'.format(filename))
-        else:
-            print(' INFO: Continue downloading scene to: {}'.format(
-                filename))
-
-    else:
-        print(' INFO: Downloading scene to: {}'.format(filename))
-        first_byte = 0
-
-    if first_byte >= total_length:
-        return total_length
-
-    zip_test = 1
-    while zip_test is not None and zip_test <= 10:
-
-        while first_byte < total_length:
-            
-            # get byte offset for already downloaded file
-            header = {"Range": "bytes={}-{}".format(first_byte, total_length)}
-            response = requests.get(url, headers=header, stream=True,
-                                    auth=(uname, pword))
-    
-            # actual download
-            with open(filename, "ab") as file:
-    
-                if total_length is None:
-                    file.write(response.content)
-                else:
-                    pbar = tqdm.tqdm(total=total_length, initial=first_byte,
-                                     unit='B', unit_scale=True,
-                                     desc=' INFO: Downloading: ')
-                    for chunk in response.iter_content(chunk_size):
-                        if chunk:
-                            file.write(chunk)
-                            pbar.update(chunk_size)
-            pbar.close()
-            # updated fileSize
-            first_byte = os.path.getsize(filename)
-            
-        # zipFile check
-        print(' INFO: Checking the zip archive of {} for inconsistency'.format(
-            filename))
-        zip_test = h.check_zipfile(filename)
-        # if it did not pass the test, remove the file
-        # in the while loop it will be downlaoded again
-        if zip_test is not None:
-            print(' INFO: {} did not pass the zip test. \
-                  Re-downloading the full scene.'.format(filename))
-            os.remove(filename)
-            first_byte = 0
-        # otherwise we change the status to True
-        else:
-            print(' INFO: {} passed the zip test.'.format(filename))
-            with open(str('{}.downloaded'.format(filename)), 'w') as file:
-                file.write('successfully downloaded \n')
+    print(' INFO: Downloading scene to: {}'.format(filename))
+    job = download_engine.DownloadJob(url, filename)
+    download_engine.DownloadEngine(
+        PepsMirror(uname, pword), concurrent=1).download([job])
 
 
 def batch_download(inventory_df, download_dir, uname, pword, concurrent=10):
+    '''Downloads all scenes of an inventory from CNES' PEPS
+
+    Products on tape are staged and downloaded as soon as they are online,
+    while online products are downloaded right away.
+
+    Args:
+        inventory_df (GeoDataFrame): an OST compliant Sentinel-1 inventory
+        download_dir (str): the directory for the downloads
+        uname (str): username of CNES' PEPS
+        pword (str): password of CNES' PEPS
+        concurrent (int): number of parallel downloads
+
+    Returns:
+        list: the jobs that failed or are still offline
+
+    '''
+
+    mirror = PepsMirror(uname, pword)
+    jobs = download_engine.create_jobs(inventory_df, download_dir, mirror)
+    manager = order_manager.OrderManager(
+        download_engine.DownloadEngine(mirror, concurrent=concurrent),
+        mirror, opj(download_dir, '.peps_orders.json'))
 
-    from ost import Sentinel1_Scene as S1Scene
-    print(' INFO: Getting the storage status (online/onTape) of each scene.')
-    print(' INFO: This may take a while.')
-
-    # this function does not just check,
-    # but it already triggers the production of the S1 scene
-    inventory_df['pepsStatus'], inventory_df['pepsUrl'] = (
-        zip(*[S1Scene(product).peps_online_status(uname, pword)
-              for product in inventory_df.identifier.tolist()]))
-
-    # as long as there are any scenes left for downloading, loop
-    while len(inventory_df[inventory_df['pepsStatus'] != 'downloaded']) > 0:
-
-        # excluded downlaoded scenes
-        inventory_df = inventory_df[inventory_df['pepsStatus'] != 'downloaded']
-
-        # recheck for status
-        inventory_df['pepsStatus'], inventory_df['pepsUrl'] = (
-            zip(*[S1Scene(product).peps_online_status(uname, pword)
-                  for product in inventory_df.identifier.tolist()]))
-
-        # if all scenes to download are on Tape, we wait for a minute
-        if len(inventory_df[inventory_df['pepsStatus'] == 'online']) == 0:
-            print('INFO: Imagery still on tape, we will wait for 1 minute ' \
-                  'and try again.')
-            time.sleep(60)
-
-        # else we start downloading
-        else:
-
-            # create the peps_list for parallel download
-            peps_list = []
-            for index, row in (
-                    inventory_df[inventory_df['pepsStatus'] == 'online']
-                    .iterrows()):
-
-                # get scene identifier
-                scene_id = row.identifier
-                # construct download path
-                scene = S1Scene(scene_id)
-                download_path = scene._download_path(download_dir, True)
-                # put all info to the peps_list for parallelised download
-                peps_list.append(
-                    [inventory_df.pepsUrl[
-                        inventory_df.identifier == scene_id].tolist()[0],
-                        download_path, uname, pword])
-
-            # parallelised download
-            pool = multiprocessing.Pool(processes=concurrent)
-            pool.map(s1_download, peps_list)
-
-            # routine to check if the file has been downloaded
-            for index, row in (
-                    inventory_df[inventory_df['pepsStatus'] == 'online']
-                    .iterrows()):
-
-                # get scene identifier
-                scene_id = row.identifier
-                # construct download path
-                scene = S1Scene(scene_id)
-                download_path = scene._download_path(download_dir)
-                if os.path.exists(download_path):
-                    inventory_df.at[index, 'pepsStatus'] = 'downloaded'
+    return manager.run(jobs)
@@ -11,6 +11,7 @@ import json
 import glob
 import shutil
 import itertools
+import threading
 
 # geo libs
 import gdal
@@ -18,9 +19,18 @@ import fiona
 import imageio
 import rasterio
 import rasterio.mask
-from rasterio.features import shapes
+from rasterio import windows
+from rasterio.enums import Resampling
+from rasterio.features import shapes, geometry_mask, geometry_window
+from rasterio.windows import Window
+from affine import Affine
+from shapely.affinity import affine_transform
+from shapely.geometry import mapping, shape
+from shapely.ops import unary_union
+from concurrent.futures import ThreadPoolExecutor
 
 from ost.helpers import helpers as h
+from ost.helpers import cog
 
 # script infos
 __author__ = 'Andreas Vollrath'
@@ -34,67 +44,217 @@ __status__ = 'Production'
 
 
 
-def replace_value(rasterfn, value_to_replace, new_value):
+def _block_windows(dataset, pixels=1024 * 1024):
 
-    # open raster file
-    raster = gdal.Open(rasterfn, gdal.GA_Update)
+    # multiples of the internal blocks, so no block is read twice
+    block_height, block_width = dataset.block_shapes[0]
+    if block_width >= dataset.width:
+        cols = dataset.width
+    else:
+        cols = block_width * max(1, int(np.sqrt(pixels)) // block_width)
+    rows = block_height * max(1, pixels // cols // block_height)
 
-    # Get blocksizes for iterating over tiles (chuuks)
-    my_block_size = raster.GetRasterBand(1).GetBlockSize()
-    x_block_size = my_block_size[0]
-    y_block_size = my_block_size[1]
+    for row in range(0, dataset.height, rows):
+        for col in range(0, dataset.width, cols):
+            yield Window(col, row, min(cols, dataset.width - col),
+                         min(rows, dataset.height - row))
 
-    # Get image sizes
-    cols = raster.RasterXSize
-    rows = raster.RasterYSize
 
-    # loop through y direction
-    for y in range(0, rows, y_block_size):
-        if y + y_block_size < rows:
-            ysize = y_block_size
-        else:
-            ysize = rows - y
+def update_raster(rasterfn, function, windows=None, bands=None, ncores=1):
+    '''Updates a raster in place, window by window
 
-        # loop throug x direction
-        for x in range(0, cols, x_block_size):
-            if x + x_block_size < cols:
-                xsize = x_block_size
-            else:
-                xsize = cols - x
+    By default, the windows are aligned to the internal blocks of the
+    raster (e.g. full lines for ENVI files). Reading and writing are
+    serialized, while the function runs in parallel on several windows.
 
-            raster_array = np.array(raster.GetRasterBand(1).ReadAsArray(
-                x, y, xsize, ysize))
-            raster_array[raster_array <= np.float32(value_to_replace)] = np.float32(
-                new_value)
+    Args:
+        rasterfn (str): the raster file
+        function (function): takes the array (bands, rows, cols) and the
+                             window, returns the updated array (or None
+                             to leave the window as it is)
+        windows (iterable): the windows to update (by default all)
+        bands (list): the bands to update (by default all)
+        ncores (int): number of windows processed in parallel
 
-            raster.GetRasterBand(1).WriteArray(raster_array, x, y)
+    '''
 
+    with rasterio.open(rasterfn, 'r+') as dst:
+        indexes = list(bands) if bands else list(dst.indexes)
+        if windows is None:
+            windows = list(_block_windows(dst))
+        lock = threading.Lock()
 
-def polygonize_raster(infile, outfile, mask_value=1, driver='ESRI Shapefile'):
+        def _update(window):
 
-    with rasterio.open(infile) as src:
+            with lock:
+                array = dst.read(indexes, window=window)
 
-        image = src.read(1)
+            array = function(array, window)
+            if array is not None:
+                with lock:
+                    dst.write(array, indexes=indexes, window=window)
 
-        if mask_value is not None:
-            mask = image == mask_value
-        else:
-            mask = None
+        with ThreadPoolExecutor(max_workers=int(ncores)) as executor:
+            list(executor.map(_update, windows))
+
+
+def replace_value(rasterfn, value_to_replace, new_value, ncores=1):
+    '''Replaces all values up to the given one in all bands of a raster
+
+    Args:
+        rasterfn (str): the raster file (updated in place)
+        value_to_replace (float): values less or equal are replaced
+        new_value (float): the new value
+        ncores (int): number of windows processed in parallel
+
+    '''
+
+    def _replace(array, window):
+        array[array <= np.float32(value_to_replace)] = np.float32(new_value)
+        return array
+
+    update_raster(rasterfn, _replace, ncores=ncores)
+
+
+def _clean_polygons(polygons, simplify=None, min_area=None):
+
+    # tolerance and area are given in pixels
+    for polygon in polygons:
+        if simplify:
+            polygon = polygon.simplify(simplify, preserve_topology=True)
+        if polygon.is_empty or (min_area and polygon.area < min_area):
+            continue
+        yield polygon
+
+
+def _to_map(polygon, transform):
+
+    return affine_transform(polygon, transform.to_shapely())
 
-        results = (
-            {'properties': {'raster_val': v}, 'geometry': s}
-            for i, (s, v)
-            in enumerate(
-                shapes(image, mask=mask, transform=src.transform)))
 
-        with fiona.open(
-            outfile, 'w',
-            driver=driver,
-            crs=src.crs,
-            schema={'properties': [('raster_val', 'int')],
-                    'geometry': 'Polygon'}) as dst:
+def polygonize_raster(infile, outfile, mask_value=1, driver=None,
+                      tile_size=4096, simplify=None, min_area=None):
+    '''Polygonizes the areas of a raster tile by tile
 
-            dst.writerecords(results)
+    The raster is polygonized in pixel coordinates, one tile at a time.
+    Polygons on the seams between tiles are merged row by row, all others
+    are written right away, so only one row of tiles is kept in memory.
+
+    Args:
+        infile (str): the raster (first band is polygonized)
+        outfile (str): the output vector file
+        mask_value (int): value of the areas to polygonize (None for all)
+        driver (str): OGR driver of the output (by default GPKG for
+                      .gpkg files, ESRI Shapefile otherwise)
+        tile_size (int): size (in pixels) of the tiles
+        simplify (float): tolerance (in pixels) of the Douglas-Peucker
+                          simplification
+        min_area (float): polygons smaller than this area (in pixels)
+                          are dropped
+
+    '''
+
+    if driver is None:
+        driver = 'GPKG' if outfile.endswith('.gpkg') else 'ESRI Shapefile'
+
+    schema = {'properties': [('raster_val', 'int')], 'geometry': 'Polygon'}
+    with rasterio.open(infile) as src, fiona.open(
+            outfile, 'w', driver=driver, crs=src.crs, schema=schema) as dst:
+
+        def _write(polygons, value):
+            dst.writerecords(
+                {'properties': {'raster_val': int(value)},
+                 'geometry': mapping(_to_map(polygon, src.transform))}
+                for polygon in _clean_polygons(polygons, simplify, min_area))
+
+        # polygons on the bottom seam of the previous row of tiles
+        carry = {}
+        for row in range(0, src.height, tile_size):
+            bottom = min(row + tile_size, src.height)
+
+            seams = carry
+            for window in _tile_windows(src.width, bottom - row, tile_size):
+                window = Window(window.col_off, row, window.width,
+                                window.height)
+                image = src.read(1, window=window)
+                mask = image == mask_value if mask_value is not None else None
+
+                for geometry, value in shapes(
+                        image, mask=mask, transform=Affine.translation(
+                            window.col_off, row)):
+                    polygon = shape(geometry)
+                    minx, miny, maxx, maxy = polygon.bounds
+                    if (minx == window.col_off > 0 or miny == row > 0 or
+                            maxx == window.col_off + window.width < src.width
+                            or maxy == bottom < src.height):
+                        seams.setdefault(value, []).append(polygon)
+                    else:
+                        _write([polygon], value)
+
+            # merge across the seams, complete polygons are written
+            carry = {}
+            for value, polygons in seams.items():
+                merged = unary_union(polygons)
+                for polygon in getattr(merged, 'geoms', [merged]):
+                    if polygon.bounds[3] == bottom < src.height:
+                        carry.setdefault(value, []).append(polygon)
+                    else:
+                        _write([polygon], value)
+
+
+def polygonize_array(array, transform, mask_value=1, simplify=None,
+                     min_area=None):
+    '''Polygonizes the areas of an array with the given value
+
+    Args:
+        array (ndarray): the 2D array (e.g. a validity mask)
+        transform (Affine): the geotransform of the array
+        mask_value (int): value of the areas to polygonize
+        simplify (float): tolerance (in pixels) of the Douglas-Peucker
+                          simplification
+        min_area (float): polygons smaller than this area (in pixels)
+                          are dropped
+
+    Returns:
+        list: the shapely polygons
+
+    '''
+
+    image = array.astype('uint8')
+    polygons = (shape(geometry) for geometry, _ in shapes(
+        image, mask=image == mask_value))
+    return [_to_map(polygon, transform)
+            for polygon in _clean_polygons(polygons, simplify, min_area)]
+
+
+def polygonize_mask(mask, transform, crs, outfile, temp_dir,
+                    simplify=None, min_area=None):
+    '''Writes a boolean mask to disk and polygonizes it tile by tile
+
+    Args:
+        mask (ndarray): the 2D boolean mask
+        transform (Affine): the geotransform of the mask
+        crs (CRS): the crs of the mask
+        outfile (str): the output vector file
+        temp_dir (str): directory for the temporary mask raster
+        simplify (float): tolerance (in pixels) of the Douglas-Peucker
+                          simplification
+        min_area (float): polygons smaller than this area (in pixels)
+                          are dropped
+
+    '''
+
+    mask_file = opj(temp_dir, '{}.tif'.format(
+        os.path.splitext(os.path.basename(outfile))[0]))
+    with rasterio.open(
+            mask_file, 'w', driver='GTiff', width=mask.shape[1],
+            height=mask.shape[0], count=1, dtype='uint8', crs=crs,
+            transform=transform, tiled=True, compress='deflate') as dst:
+        dst.write(mask.astype('uint8'), 1)
+
+    polygonize_raster(mask_file, outfile, simplify=simplify,
+                      min_area=min_area)
+    os.remove(mask_file)
 
 
 def outline(infile, outfile, ndv=0, less_then=False):
@@ -201,45 +361,68 @@ def rescale_to_float(int_array, data_type_name):
     return float_array
 
 
+def _tile_windows(width, height, tile_size=1024):
+
+    for row in range(0, height, tile_size):
+        for col in range(0, width, tile_size):
+            yield Window(col, row, min(tile_size, width - col),
+                         min(tile_size, height - row))
+
+
 def mask_by_shape(infile, outfile, shapefile, to_db=False, datatype='float32',
                   rescale=True, min_value=0.000001, max_value=1, ndv=None,
-                  description=True):
+                  description=True, ncores=os.cpu_count(), compress='deflate'):
 
     # import shapefile geometries
     with fiona.open(shapefile, 'r') as file:
         features = [feature['geometry'] for feature in file
                     if feature['geometry']]
 
-    # import raster
+    # the window of the shapes' bounding box (i.e. the crop)
     with rasterio.open(infile) as src:
-        out_image, out_transform = rasterio.mask.mask(src, features, crop=True)
-        out_meta = src.meta.copy()
-        out_image = np.ma.masked_where(out_image == ndv, out_image)
+        crop = geometry_window(src, features)
+        crop_transform = src.window_transform(crop)
+        fill = src.nodata if src.nodata is not None else 0
+        out_meta = src.profile.copy()
+
+    out_meta.update({'height': int(crop.height), 'width': int(crop.width),
+                     'transform': crop_transform, 'nodata': ndv,
+                     'dtype': datatype})
+
+    def _mask(window):
+
+        # each thread needs its own dataset handle
+        with rasterio.open(infile) as src:
+            out_image = src.read(window=Window(
+                crop.col_off + window.col_off, crop.row_off + window.row_off,
+                window.width, window.height))
+
+        outside = geometry_mask(
+            features, out_shape=out_image.shape[1:],
+            transform=windows.transform(window, crop_transform))
+        out_image[:, outside] = fill
+
+        # if to decibel should be applied
+        if to_db is True:
+            out_image = convert_to_db(out_image)
+
+        if rescale:
+            # if we scale to another d
+            if datatype != 'float32':
+
+                if datatype == 'uint8':
+                    out_image = scale_to_int(out_image, min_value, max_value, 'uint8')
+                elif datatype == 'uint16':
+                    out_image = scale_to_int(out_image, min_value, max_value, 'uint16')
+
+        return out_image.astype(datatype)
+
+    with cog.CogWriter(outfile, out_meta, compress=compress) as dest:
+        with ThreadPoolExecutor(max_workers=int(ncores)) as executor:
+            list(executor.map(
+                lambda window: dest.write(_mask(window), window=window),
+                _tile_windows(int(crop.width), int(crop.height))))
 
-    
-    # unmask array
-    out_image = out_image.data
-    
-    # if to decibel should be applied
-    if to_db is True:
-        out_image = convert_to_db(out_image)
-
-    if rescale:
-        # if we scale to another d
-        if datatype != 'float32':
-
-            if datatype == 'uint8':
-                out_image = scale_to_int(out_image, min_value, max_value, 'uint8')
-            elif datatype == 'uint16':
-                out_image = scale_to_int(out_image, min_value, max_value, 'uint16')
-
-    out_meta.update({'driver': 'GTiff', 'height': out_image.shape[1],
-                     'width': out_image.shape[2], 'transform': out_transform,
-                     'nodata': ndv, 'dtype': datatype, 'tiled': True,
-                     'blockxsize': 128, 'blockysize': 128})
-
-    with rasterio.open(outfile, 'w', **out_meta) as dest:
-        dest.write(out_image)
         if description:
             dest.update_tags(1, 
                     BAND_NAME='{}'.format(os.path.basename(infile)[:-4]))
@@ -297,16 +480,70 @@ def norm(band, percentile=False):
     return (band - band_min)/(band_max - band_min)
 
 
+def build_overviews(rasterfn, resampling='average', min_size=256):
+    '''Builds the overview pyramid of a raster, if it has none yet
+
+    Formats without internal overviews (e.g. the ENVI files of DIMAP
+    products) get an external .ovr file, their header is not touched.
+
+    Args:
+        rasterfn (str): the raster file
+        resampling (str): resampling of the overviews
+        min_size (int): size (in pixels) of the smallest overview
+
+    '''
+
+    with rasterio.open(rasterfn) as src:
+        if src.overviews(1):
+            return
+        size = min(src.width, src.height)
+
+    factors = []
+    while size // (2 ** (len(factors) + 1)) >= min_size:
+        factors.append(2 ** (len(factors) + 1))
+
+    if factors:
+        with rasterio.open(rasterfn, 'r+') as dst:
+            dst.build_overviews(factors, Resampling[resampling])
+            dst.update_tags(ns='rio_overview', resampling=resampling)
+
+
+def read_preview(filepath, shrink_factor=25, resampling=5, out_shape=None):
+    '''Reads a raster decimated from its closest overview level
+
+    Args:
+        filepath (str): the raster file
+        shrink_factor (int): the decimation factor
+        resampling (int): the resampling (5 = average)
+        out_shape (tuple): height and width of the preview (instead of
+                           the shrink factor)
+
+    Returns:
+        ndarray: the array (bands, height, width) of the preview
+
+    '''
+
+    with rasterio.open(filepath) as src:
+        if out_shape is None:
+            out_shape = (int(src.height / shrink_factor),
+                         int(src.width / shrink_factor))
+        factor = min(src.height / out_shape[0], src.width / out_shape[1])
+        levels = [level for level, overview in enumerate(src.overviews(1))
+                  if overview <= factor]
+        count = src.count
+
+    # the overview levels are ordered from the finest to the coarsest
+    kwargs = {'overview_level': levels[-1]} if levels else {}
+    with rasterio.open(filepath, **kwargs) as src:
+        return src.read(out_shape=(count,) + tuple(out_shape),
+                        resampling=Resampling(resampling))
+
+
 def visualise_rgb(filepath, shrink_factor=25):
 
     import matplotlib.pyplot as plt
 
-    with rasterio.open(filepath) as src:
-        array = src.read(
-                out_shape=(src.count, int(src.height / shrink_factor),
-                           int(src.width / shrink_factor)),
-                resampling=5    # 5 = average
-                )
+    array = read_preview(filepath, shrink_factor, 5)    # 5 = average
 
     array[array == 0] = np.nan
     red = norm(scale_to_int(array[0], -18, 0, 'uint8'))
@@ -382,8 +619,8 @@ def create_rgb_jpeg(filelist, outfile=None, shrink_factor=1, resampling_factor=5
         out_meta.update(height=new_height, width=new_width)
         count=1
         
-        layer1 = src.read(
-                out_shape=(src.count, new_height, new_width),
+        layer1 = read_preview(
+                filelist[0], out_shape=(new_height, new_width),
                 resampling=resampling_factor    # 5 = average
                 )[0]
         if stretch:
@@ -395,19 +632,18 @@ def create_rgb_jpeg(filelist, outfile=None, shrink_factor=1, resampling_factor=5
         layer1[layer1 == 0] = np.nan
         
     if len(filelist) > 1:
-        with rasterio.open(filelist[1]) as src:
-            layer2 = src.read(
-                    out_shape=(src.count, new_height, new_width),
-                    resampling=resampling_factor    # 5 = average
-                    )[0]
-            if stretch:
-                minimum_list.append(calc_min(layer2, stretch))
-                maximum_list.append(calc_max(layer2, stretch))
-            else:
-                minimum_list.append(get_min(filelist[1]))
-                maximum_list.append(get_max(filelist[1]))
-            layer2[layer2 == 0] = np.nan
-            count=3
+        layer2 = read_preview(
+                filelist[1], out_shape=(new_height, new_width),
+                resampling=resampling_factor    # 5 = average
+                )[0]
+        if stretch:
+            minimum_list.append(calc_min(layer2, stretch))
+            maximum_list.append(calc_max(layer2, stretch))
+        else:
+            minimum_list.append(get_min(filelist[1]))
+            maximum_list.append(get_max(filelist[1]))
+        layer2[layer2 == 0] = np.nan
+        count=3
             
     if len(filelist) == 2:    # that should be the BS ratio case
         layer3 = np.subtract(layer1, layer2)
@@ -416,11 +652,10 @@ def create_rgb_jpeg(filelist, outfile=None, shrink_factor=1, resampling_factor=5
         
     elif len(filelist) >= 3:
         # that's the full 3layer case
-        with rasterio.open(filelist[2]) as src:
-            layer3 = src.read(
-                    out_shape=(src.count, new_height, new_width),
-                    resampling=resampling_factor    # 5 = average
-                    )[0]
+        layer3 = read_preview(
+                filelist[2], out_shape=(new_height, new_width),
+                resampling=resampling_factor    # 5 = average
+                )[0]
         if stretch:
             minimum_list.append(calc_min(layer3, stretch))
             maximum_list.append(calc_max(layer3, stretch))
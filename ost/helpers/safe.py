@@ -0,0 +1,328 @@
+# -*- coding: utf-8 -*-
+'''This module provides uniform access to the content of Sentinel-1 products
+
+A product can be an unpacked SAFE folder (e.g. on a DIAS mount), a local
+zip archive or a zip archive on a HTTP server. The access classes list and
+read the members of the SAFE structure relative to the product root
+(e.g. 'manifest.safe' or 'annotation/s1a-iw1-slc-vv-....xml'), so metadata
+can be parsed without unpacking or copying the full product.
+
+Remote archives are read by HTTP range requests through a block cache,
+so only the central directory of the archive and the requested members
+are transferred. For GDAL based readers, the corresponding /vsizip/ and
+/vsicurl/ paths are provided.
+
+'''
+
+import os
+from os.path import join as opj
+import io
+import fnmatch
+import hashlib
+import threading
+import zipfile
+from collections import OrderedDict
+
+import requests
+
+
+class HttpRangeFile(io.RawIOBase):
+    '''A read-only file object on top of HTTP range requests
+
+    The file is read in blocks that are kept in a LRU cache in memory
+    and, optionally, in a cache directory on disk.
+
+    Args:
+        url (str): url of the file
+        session (Session): a (authenticated) requests session
+        block_size (int): size (in bytes) of the blocks
+        cache_blocks (int): number of blocks kept in memory
+        cache_dir (str): directory for a persistent block cache
+
+    '''
+
+    def __init__(self, url, session=None, block_size=1024 * 1024,
+                 cache_blocks=64, cache_dir=None):
+
+        super().__init__()
+        self.url = url
+        self.session = session or requests.Session()
+        self.block_size = block_size
+        self.cache_blocks = cache_blocks
+        self.cache_dir = cache_dir
+        if cache_dir:
+            self.cache_dir = opj(
+                cache_dir, hashlib.md5(url.encode()).hexdigest())
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+        self._blocks = OrderedDict()
+        self._lock = threading.Lock()
+        self._position = 0
+
+        # the size is taken from the Content-Range of a 1 byte request
+        with self.session.get(url, headers={'Range': 'bytes=0-0'},
+                              stream=True) as response:
+            if response.status_code == 401:
+                raise ValueError(' ERROR: Username/Password are incorrect.')
+            response.raise_for_status()
+            if response.status_code != 206:
+                raise IOError(' ERROR: {} does not support range requests.'
+                              .format(url))
+            self.size = int(response.headers['Content-Range'].split('/')[1])
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self.size
+
+        self._position = max(offset, 0)
+        return self._position
+
+    def _fetch(self, index):
+
+        cache_file = opj(self.cache_dir, str(index)) if self.cache_dir \
+            else None
+        if cache_file and os.path.exists(cache_file):
+            with open(cache_file, 'rb') as file:
+                return file.read()
+
+        start = index * self.block_size
+        end = min(start + self.block_size, self.size) - 1
+        response = self.session.get(
+            self.url, headers={'Range': 'bytes={}-{}'.format(start, end)})
+        response.raise_for_status()
+
+        # a server (or proxy) that ignores the range returns the full file
+        block = response.content
+        if response.status_code != 206 or len(block) != end - start + 1:
+            raise IOError(' ERROR: Range {}-{} of {} has not been returned.'
+                          .format(start, end, self.url))
+
+        if cache_file:
+            with open('{}.tmp'.format(cache_file), 'wb') as file:
+                file.write(block)
+            os.replace('{}.tmp'.format(cache_file), cache_file)
+
+        return block
+
+    def _block(self, index):
+
+        with self._lock:
+            if index in self._blocks:
+                self._blocks.move_to_end(index)
+                return self._blocks[index]
+
+        # fetched without the lock, so readers of other blocks do not wait
+        block = self._fetch(index)
+
+        with self._lock:
+            self._blocks[index] = block
+            if len(self._blocks) > self.cache_blocks:
+                self._blocks.popitem(last=False)
+
+        return block
+
+    def readinto(self, buffer):
+
+        length = min(len(buffer), self.size - self._position)
+        if length <= 0:
+            return 0
+
+        view = memoryview(buffer)
+        done = 0
+        while done < length:
+            index, offset = divmod(self._position + done, self.block_size)
+            data = self._block(index)[offset:offset + length - done]
+            view[done:done + len(data)] = data
+            done += len(data)
+
+        self._position += done
+        return done
+
+
+class SafeAccess():
+    '''Base class for the access to the members of a SAFE product'''
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        pass
+
+    def namelist(self):
+        '''Lists all files relative to the root of the SAFE structure'''
+
+        raise NotImplementedError
+
+    def open(self, member):
+        '''Opens a member as a binary file object'''
+
+        raise NotImplementedError
+
+    def read(self, member):
+        '''Reads the full content of a member'''
+
+        with self.open(member) as file:
+            return file.read()
+
+    def glob(self, pattern):
+        '''Lists all members matching a unix style pattern'''
+
+        return sorted(fnmatch.filter(self.namelist(), pattern))
+
+    def crc(self, member):
+        '''The CRC of a member, if known without reading it'''
+
+        return None
+
+    def gdal_path(self, member):
+        '''The path of a member for GDAL'''
+
+        raise NotImplementedError
+
+
+class SafeDirectory(SafeAccess):
+    '''Access to an unpacked SAFE folder, e.g. on a DIAS mount
+
+    Args:
+        path (str): path to the SAFE folder
+
+    '''
+
+    def __init__(self, path):
+        self.path = path
+
+    def namelist(self):
+
+        names = []
+        for root, _, files in os.walk(self.path):
+            names.extend(os.path.relpath(opj(root, file), self.path)
+                         for file in files)
+
+        return names
+
+    def open(self, member):
+        return open(opj(self.path, member), 'rb')
+
+    def gdal_path(self, member):
+        return opj(self.path, member)
+
+
+class SafeZip(SafeAccess):
+    '''Access to a zipped SAFE product, locally or by HTTP range requests
+
+    Args:
+        path (str): path or url of the zip archive
+        session (Session): a requests session for remote archives
+        cache_dir (str): directory for a persistent block cache of
+                         remote archives
+
+    '''
+
+    def __init__(self, path, session=None, cache_dir=None):
+
+        self.path = path
+        self.remote = path.startswith(('http://', 'https://'))
+
+        if self.remote:
+            self._file = HttpRangeFile(path, session, cache_dir=cache_dir)
+            self.archive = zipfile.ZipFile(self._file)
+        else:
+            self._file = None
+            self.archive = zipfile.ZipFile(path)
+
+        # all members are stored below the SAFE folder of the product
+        names = self.archive.namelist()
+        self.root = names[0].split('/')[0] + '/' if names else ''
+
+    def close(self):
+
+        self.archive.close()
+        if self._file:
+            self._file.close()
+
+    def namelist(self):
+        return [name[len(self.root):] for name in self.archive.namelist()
+                if name.startswith(self.root) and not name.endswith('/')]
+
+    def open(self, member):
+        return self.archive.open(self.root + member)
+
+    def crc(self, member):
+        return self.archive.getinfo(self.root + member).CRC
+
+    def gdal_path(self, member):
+
+        archive = '/vsicurl/{}'.format(self.path) if self.remote \
+            else self.path
+        return '/vsizip/{}/{}{}'.format(archive, self.root, member)
+
+
+def open_safe(path, session=None, cache_dir=None):
+    '''Opens a Sentinel-1 product for reading its members
+
+    Args:
+        path (str): a SAFE folder, a zip archive or the url of a zip archive
+        session (Session): a requests session for remote archives
+        cache_dir (str): directory for a persistent block cache of
+                         remote archives
+
+    Returns:
+        SafeAccess: the access object of the product
+
+    '''
+
+    # ONDA mounts the SAFE folder below a folder named like the zip archive
+    if os.path.isdir(path):
+        return SafeDirectory(path)
+
+    if path.startswith(('http://', 'https://')) or path[-4:] == '.zip':
+        return SafeZip(path, session, cache_dir)
+
+    raise IOError(' ERROR: {} is not a Sentinel-1 product.'.format(path))
+
+
+def configure_gdal(cache_size=256 * 1024 * 1024, uname=None, pword=None):
+    '''Sets the GDAL options for reading products through /vsizip/ and
+    /vsicurl/
+
+    Args:
+        cache_size (int): size (in bytes) of GDAL's block cache for
+                          virtual files
+        uname (str): username for remote archives
+        pword (str): password for remote archives
+
+    '''
+
+    import gdal
+
+    options = {
+        'VSI_CACHE': 'TRUE',
+        'VSI_CACHE_SIZE': str(cache_size),
+        'CPL_VSIL_CURL_CACHE_SIZE': str(cache_size),
+        'CPL_VSIL_CURL_ALLOWED_EXTENSIONS': '.zip,.tiff,.xml,.safe',
+        # avoid listing the remote directory on each open
+        'GDAL_DISABLE_READDIR_ON_OPEN': 'EMPTY_DIR',
+        'GDAL_HTTP_MULTIRANGE': 'YES',
+        'GDAL_HTTP_MERGE_CONSECUTIVE_RANGES': 'YES'
+    }
+
+    if uname:
+        options['GDAL_HTTP_USERPWD'] = '{}:{}'.format(uname, pword)
+
+    for key, value in options.items():
+        gdal.SetConfigOption(key, value)
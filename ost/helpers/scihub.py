@@ -4,19 +4,17 @@ This module provides functions for searching and downloading data from
 Copernicus scihub server.
 '''
 
-import os
-from os.path import join as opj
-import glob
 import getpass
 import datetime
-import multiprocessing
 import urllib
+from os.path import join as opj
+
 import requests
-import tqdm
 #import zipfile
 from shapely.wkt import loads
 
-from ost.helpers import helpers as h
+from ost.helpers import download_engine
+from ost.helpers import order_manager
 
 
 def ask_credentials():
@@ -231,6 +229,80 @@ def check_connection(uname, pword):
     return response.status_code
 
 
+class ScihubMirror(download_engine.Mirror):
+    '''Mirror adapter for Copernicus' scihub'''
+
+    name = 'scihub'
+
+    # scihub allows only 2 concurrent downloads per user
+    max_connections = 2
+
+    # and 20 retrievals from the long term archive per hour
+    ordering = True
+    order_quota = 20
+    order_window = 3600
+
+    base_url = 'https://scihub.copernicus.eu/apihub/'
+
+    def product_url(self, uuid):
+        return '{}odata/v1/Products(\'{}\')/$value'.format(self.base_url, uuid)
+
+    def url(self, scene, inventory_row=None):
+
+        if inventory_row is not None and 'uuid' in inventory_row:
+            uuid = inventory_row['uuid']
+        else:
+            uuid = scene.scihub_uuid(
+                connect(uname=self.uname, pword=self.pword))
+
+        return self.product_url(uuid)
+
+    def probe(self, scene, inventory_row=None):
+
+        # products in the long term archive are not available right away
+        url = self.url(scene, inventory_row)
+        opener = connect(uname=self.uname, pword=self.pword)
+        if scene.scihub_online_status(opener) is False:
+            return None
+
+        return url
+
+    def online(self, session, job):
+
+        # same url as Sentinel1_Scene.scihub_online_status
+        response = session.get(job.url.replace('/$value', '/Online/$value'))
+        self.check_response(response)
+        return response.text.strip() == 'true'
+
+    def order(self, session, job):
+
+        # like Sentinel1_Scene.scihub_trigger_production, requesting an
+        # offline product triggers its retrieval from the long term archive
+        with session.get(job.url, stream=True) as response:
+            if response.status_code in (200, 202):
+                return True
+
+            # 403 means the user's quota of retrieval requests is exhausted
+            if response.status_code != 403:
+                self.check_response(response)
+
+        return False
+
+    def checksum(self, session, job):
+
+        # same url as Sentinel1_Scene.scihub_md5, but from the known uuid
+        url = job.url.replace('/$value', '/Checksum/Value/$value')
+        try:
+            response = session.get(url)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as error:
+            print(' WARNING: Could not retrieve the checksum of {} ({}).'
+                  .format(job.filename, error))
+            return None
+
+        return response.text.strip()
+
+
 def s1_download(argument_list):
     '''Function to download a single Sentinel-1 product from Copernicus scihub
 
@@ -260,135 +332,33 @@ def s1_download(argument_list):
     if not pword:
         pword = getpass.getpass(' Your Copernicus Scihub Password:')
 
-    # define url
-    url = ('https://scihub.copernicus.eu/apihub/odata/v1/'
-           'Products(\'{}\')/$value'.format(uuid))
-
-    # get first response for file Size
-    response = requests.get(url, stream=True, auth=(uname, pword))
-
-    # check response
-    if response.status_code == 401:
-        raise ValueError(' ERROR: Username/Password are incorrect.')
-    elif response.status_code != 200:
-        print(' ERROR: Something went wrong, will try again in 30 seconds.')
-        response.raise_for_status()
+    mirror = ScihubMirror(uname, pword)
+    job = download_engine.DownloadJob(mirror.product_url(uuid), filename)
+    download_engine.DownloadEngine(mirror, concurrent=1).download([job])
 
-    # get download size
-    total_length = int(response.headers.get('content-length', 0))
 
-    # define chunk_size
-    chunk_size = 1024
-
-    # check if file is partially downloaded
-    if os.path.exists(filename):
-        first_byte = os.path.getsize(filename)
-    else:
-        first_byte = 0
-
-    if first_byte >= total_length:
-        return total_length
-
-    zip_test = 1
-    while zip_test is not None:
-
-        while first_byte < total_length:
-
-            # get byte offset for already downloaded file
-            header = {"Range": "bytes={}-{}".format(first_byte, total_length)}
-
-            print(' INFO: Downloading scene to: {}'.format(filename))
-            response = requests.get(url, headers=header, stream=True,
-                                    auth=(uname, pword))
-
-            # actual download
-            with open(filename, "ab") as file:
-
-                if total_length is None:
-                    file.write(response.content)
-                else:
-                    pbar = tqdm.tqdm(total=total_length, initial=first_byte,
-                                     unit='B', unit_scale=True,
-                                     desc=' INFO: Downloading: ')
-                    for chunk in response.iter_content(chunk_size):
-                        if chunk:
-                            file.write(chunk)
-                            pbar.update(chunk_size)
-            pbar.close()
-            # update first_byte
-            first_byte = os.path.getsize(filename)
-
-        # zipFile check
-        print(' INFO: Checking the zip archive of {} for inconsistency'.format(
-            filename))
-        zip_test = h.check_zipfile(filename)
-        
-        # if it did not pass the test, remove the file
-        # in the while loop it will be downlaoded again
-        if zip_test is not None:
-            print(' INFO: {} did not pass the zip test. \
-                  Re-downloading the full scene.'.format(filename))
-            os.remove(filename)
-            first_byte = 0
-        # otherwise we change the status to True
-        else:
-            print(' INFO: {} passed the zip test.'.format(filename))
-            with open(str('{}.downloaded'.format(filename)), 'w') as file:
-                file.write('successfully downloaded \n')
+def batch_download(inventory_df, download_dir, uname, pword, concurrent=2):
+    '''Downloads all scenes of an inventory from Copernicus scihub
 
+    Products in the long term archive are ordered and downloaded as soon
+    as they are online, while online products are downloaded right away.
 
-def batch_download(inventory_df, download_dir, uname, pword, concurrent=2):
-    
-    from ost import Sentinel1_Scene as S1Scene
-    from ost.helpers import scihub
-    
-    # create list of scenes
-    scenes = inventory_df['identifier'].tolist()
-    
-    check, i = False, 1
-    while check is False and i <= 10:
-
-        download_list = []
-
-        for scene_id in scenes:
-
-            scene = S1Scene(scene_id)
-            filepath = scene._download_path(download_dir, True)
-            
-            try:
-                uuid = (inventory_df['uuid']
-                    [inventory_df['identifier'] == scene_id].tolist())
-            except KeyError:
-                uuid = scene.scihub_uuid(scihub.connect(uname, pword)) 
-            
-            if os.path.exists('{}.downloaded'.format(filepath)):
-                print(' INFO: {} is already downloaded.'
-                      .format(scene.scene_id))
-            else:
-                # create list objects for download
-                download_list.append([uuid[0], filepath, uname, pword])
-
-        if download_list:
-            pool = multiprocessing.Pool(processes=concurrent)
-            pool.map(s1_download, download_list)
-                    
-        downloaded_scenes = glob.glob(
-            opj(download_dir, 'SAR', '*', '20*', '*', '*',
-                '*.zip.downloaded'))
-    
-        if len(inventory_df['identifier'].tolist()) == len(downloaded_scenes):
-            print(' INFO: All products are downloaded.')
-            check = True
-        else:
-            check = False
-            for scene in scenes:
+    Args:
+        inventory_df (GeoDataFrame): an OST compliant Sentinel-1 inventory
+        download_dir (str): the directory for the downloads
+        uname (str): username of Copernicus' scihub
+        pword (str): password of Copernicus' scihub
+        concurrent (int): number of parallel downloads
 
-                scene = S1Scene(scene)
-                filepath = scene._download_path(download_dir)
+    Returns:
+        list: the jobs that failed or are still offline
 
-                if os.path.exists('{}.downloaded'.format(filepath)):
-                    scenes.remove(scene.scene_id)
+    '''
 
-        i += 1
+    mirror = ScihubMirror(uname, pword)
+    jobs = download_engine.create_jobs(inventory_df, download_dir, mirror)
+    manager = order_manager.OrderManager(
+        download_engine.DownloadEngine(mirror, concurrent=concurrent),
+        mirror, opj(download_dir, '.scihub_orders.json'))
 
-            
\ No newline at end of file
+    return manager.run(jobs)
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+'''This module records telemetry of the downloads
+
+A DownloadTelemetry object listens to the download engine and records,
+for each finished product, the mirror, the transferred bytes, the duration,
+the number of attempts, the time-to-first-byte and the checksum failures.
+The records are appended to a JSON-lines log and aggregated per mirror,
+which can be retrieved in-process or exported in the Prometheus text
+format (e.g. for the textfile collector of the node exporter). The bytes
+are counted for the mirror that served them, the other metrics for the
+mirror of the last attempt.
+
+'''
+
+import os
+import json
+import threading
+from datetime import datetime, timezone
+
+from ost.helpers import download_engine
+
+
+class DownloadTelemetry():
+    '''Collects telemetry of all downloads of the download engine
+
+    Args:
+        log_file (str): path of the JSON-lines log (optional)
+        prometheus_file (str): path of a Prometheus text file that is
+                               updated after each download (optional)
+
+    Use it as a context manager around the downloads:
+
+        with DownloadTelemetry('download.jsonl') as telemetry:
+            download.download_sentinel1(...)
+        telemetry.summary()
+
+    '''
+
+    def __init__(self, log_file=None, prometheus_file=None):
+
+        self.log_file = log_file
+        self.prometheus_file = prometheus_file
+        self.products = []
+        self.mirrors = {}
+        self._lock = threading.Lock()
+        self._file_lock = threading.Lock()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def start(self):
+        '''Starts listening to the download engine'''
+
+        download_engine.add_listener(self.record)
+
+    def stop(self):
+        '''Stops listening to the download engine'''
+
+        download_engine.remove_listener(self.record)
+
+    def record(self, job, result):
+        '''Records a finished download (download engine listener)
+
+        Args:
+            job (DownloadJob): the download job
+            result (bool): True if the product has been downloaded
+
+        '''
+
+        stats = job.stats
+        duration = (stats['end'] or 0) - (stats['start'] or 0)
+
+        # mirrors that download externally (e.g. wget) do not report bytes
+        nbytes = stats['bytes'] or (job.size if result else 0) or 0
+        mirror_bytes = dict(stats['mirror_bytes']) if stats['bytes'] \
+            else {stats['mirror']: nbytes}
+
+        entry = {
+            'time': datetime.now(timezone.utc).isoformat(),
+            'scene_id': job.scene_id,
+            'filename': job.filename,
+            'mirror': stats['mirror'],
+            'result': 'success' if result else 'failure',
+            'bytes': nbytes,
+            'mirror_bytes': mirror_bytes,
+            'duration': duration,
+            'throughput': nbytes / duration if duration > 0 else None,
+            'attempts': stats['attempts'],
+            'retries': max(stats['attempts'] - 1, 0),
+            'ttfb': stats['ttfb'],
+            'checksum_failures': stats['checksum_failures']
+        }
+
+        with self._lock:
+            self.products.append(entry)
+
+            for name in set(mirror_bytes) | {entry['mirror']}:
+                self.mirrors.setdefault(name, {
+                    'downloads': 0, 'failures': 0, 'bytes': 0,
+                    'seconds': 0.0, 'retries': 0, 'checksum_failures': 0,
+                    'ttfb_seconds': 0.0, 'ttfb_count': 0})
+            for name, served in mirror_bytes.items():
+                self.mirrors[name]['bytes'] += served
+
+            mirror = self.mirrors[entry['mirror']]
+            mirror['downloads' if result else 'failures'] += 1
+            mirror['seconds'] += duration
+            mirror['retries'] += entry['retries']
+            mirror['checksum_failures'] += entry['checksum_failures']
+            if entry['ttfb'] is not None:
+                mirror['ttfb_seconds'] += entry['ttfb']
+                mirror['ttfb_count'] += 1
+
+            if self.log_file:
+                with open(self.log_file, 'a') as file:
+                    file.write(json.dumps(entry) + '\n')
+
+        if self.prometheus_file:
+            self.write_prometheus(self.prometheus_file)
+
+    def metrics(self):
+        '''Returns the aggregated metrics per mirror
+
+        Returns:
+            dict: mirror name as key, dictionary with the numbers of
+                  downloads, failures, retries and checksum failures, the
+                  bytes, seconds, throughput (bytes/s) and mean
+                  time-to-first-byte (s) as value
+
+        '''
+
+        with self._lock:
+            metrics = {}
+            for name, mirror in self.mirrors.items():
+                metrics[name] = dict(mirror)
+                metrics[name]['throughput'] = (
+                    mirror['bytes'] / mirror['seconds']
+                    if mirror['seconds'] else None)
+                metrics[name]['mean_ttfb'] = (
+                    mirror['ttfb_seconds'] / mirror['ttfb_count']
+                    if mirror['ttfb_count'] else None)
+
+        return metrics
+
+    def prometheus(self):
+        '''Exports the metrics per mirror in the Prometheus text format
+
+        Returns:
+            str: the metrics
+
+        '''
+
+        metrics = self.metrics()
+        families = [
+            ('downloads_total', 'counter', 'Downloaded products',
+             lambda m: m['downloads']),
+            ('failures_total', 'counter', 'Failed products',
+             lambda m: m['failures']),
+            ('bytes_total', 'counter', 'Transferred bytes',
+             lambda m: m['bytes']),
+            ('seconds_total', 'counter', 'Time spent downloading',
+             lambda m: m['seconds']),
+            ('retries_total', 'counter', 'Retried download attempts',
+             lambda m: m['retries']),
+            ('checksum_failures_total', 'counter',
+             'Products that failed the integrity check',
+             lambda m: m['checksum_failures']),
+            ('throughput_bytes_per_second', 'gauge',
+             'Mean throughput per product download',
+             lambda m: m['throughput']),
+            ('ttfb_seconds', 'gauge', 'Mean time to first byte',
+             lambda m: m['mean_ttfb'])
+        ]
+
+        lines = []
+        for name, kind, description, value in families:
+            lines.append('# HELP ost_download_{} {}'.format(name, description))
+            lines.append('# TYPE ost_download_{} {}'.format(name, kind))
+            for mirror, mirror_metrics in sorted(
+                    metrics.items(), key=lambda item: str(item[0])):
+                if value(mirror_metrics) is not None:
+                    lines.append('ost_download_{}{{mirror="{}"}} {}'.format(
+                        name, mirror, value(mirror_metrics)))
+
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, filename):
+        '''Writes the metrics in the Prometheus text format to a file'''
+
+        with self._file_lock:
+            with open('{}.tmp'.format(filename), 'w') as file:
+                file.write(self.prometheus())
+            os.replace('{}.tmp'.format(filename), filename)
+
+    def summary(self):
+        '''Prints the throughput and errors per mirror'''
+
+        for name, mirror in self.metrics().items():
+            print(' INFO: {}: {} products ({:.1f} GB) downloaded, '
+                  '{} failed, {} retries, {} checksum failures.'.format(
+                      name, mirror['downloads'],
+                      mirror['bytes'] / 1024 ** 3, mirror['failures'],
+                      mirror['retries'], mirror['checksum_failures']))
+            if mirror['throughput']:
+                print(' INFO: {}: {:.1f} MB/s per product, mean time to '
+                      'first byte {:.2f} s.'.format(
+                          name, mirror['throughput'] / 1024 ** 2,
+                          mirror['mean_ttfb'] or 0))
+
+
+def read_log(log_file):
+    '''Reads the records of a JSON-lines telemetry log
+
+    Args:
+        log_file (str): path of the log
+
+    Returns:
+        list: the records as dictionaries
+
+    '''
+
+    with open(log_file, 'r') as file:
+        return [json.loads(line) for line in file if line.strip()]
@@ -6,11 +6,15 @@ from functools import partial
 import osr
 import ogr
 import pyproj
+import numpy as np
 import geopandas as gpd
 
 from shapely.ops import transform
 from shapely.wkt import loads
-from shapely.geometry import Point, Polygon, mapping, shape
+from shapely.prepared import prep
+from shapely.strtree import STRtree
+from shapely.geometry import Point, Polygon, mapping, shape, box
+from shapely.geometry.base import BaseGeometry
 from fiona import collection
 from fiona.crs import from_epsg
 
@@ -361,16 +365,21 @@ def inventory_to_shp(inventory_df, outfile):
     inventory_df.to_file(outfile)
 
 
-def exterior(infile, outfile, buffer=None):
+def gdf_exterior(gdf, buffer=None):
 
-    gdf = gpd.read_file(infile, crs={'init': 'EPSG:4326'})
     gdf.geometry = gdf.geometry.apply(lambda row: Polygon(row.exterior))
     gdf_clean = gdf[gdf.geometry.area >= 1.0e-6]
     gdf_clean.geometry = gdf_clean.geometry.buffer(-0.0018)
     #if buffer:
     #    gdf.geometry = gdf.geometry.apply(
      #           lambda row: Polygon(row.buffer(-0.0018)))
-    gdf_clean.to_file(outfile)
+    return gdf_clean
+
+
+def exterior(infile, outfile, buffer=None):
+
+    gdf = gpd.read_file(infile, crs={'init': 'EPSG:4326'})
+    gdf_exterior(gdf, buffer).to_file(outfile)
 
 
 def difference(infile1, infile2, outfile):
@@ -402,6 +411,134 @@ def buffer_shape(infile, outfile, buffer=None):
                 })
 
 
+class AoiCoverage():
+    '''A helper class for fast coverage checks of footprints against an AOI
+
+    The AOI geometry is prepared once, so that repeated intersection tests
+    of many footprints do not rebuild the spatial structures of large
+    (e.g. country-wide) AOIs over and over again. Optionally, the AOI can be
+    simplified and/or split into tiles that are indexed by a STRtree. Area
+    calculations are then only done on the small AOI fragments that actually
+    overlap a footprint.
+
+    Args:
+        aoi: the AOI as WKT string, shapely geometry or GeoDataFrame
+        simplify (float): tolerance (in degree) for simplifying the AOI
+        tile_size (float): size (in degree) of the tiles the AOI is split into
+
+    '''
+
+    def __init__(self, aoi, simplify=None, tile_size=None):
+
+        if isinstance(aoi, str):
+            geometry = loads(aoi)
+        elif isinstance(aoi, (gpd.GeoDataFrame, gpd.GeoSeries)):
+            geometry = aoi.geometry.unary_union
+        else:
+            geometry = aoi
+
+        if simplify:
+            geometry = geometry.simplify(simplify, preserve_topology=True)
+
+        self.geometry = geometry
+        self.area = geometry.area
+        self._prepared = prep(geometry)
+
+        self.fragments, self._tree = None, None
+        if tile_size:
+            self.fragments = self._tile(geometry, tile_size)
+            self._tree = STRtree(self.fragments)
+
+    @staticmethod
+    def _tile(geometry, tile_size):
+
+        minx, miny, maxx, maxy = geometry.bounds
+        fragments = []
+        for x in np.arange(minx, maxx, tile_size):
+            for y in np.arange(miny, maxy, tile_size):
+                fragment = geometry.intersection(
+                    box(x, y, x + tile_size, y + tile_size))
+                if not fragment.is_empty and fragment.area > 0:
+                    fragments.append(fragment)
+
+        return fragments
+
+    def _candidates(self, footprint):
+
+        hits = self._tree.query(footprint)
+
+        # shapely >= 2.0 returns indices, older versions the geometries
+        return [self.fragments[hit] if isinstance(hit, (int, np.integer))
+                else hit for hit in hits]
+
+    def _area(self, footprint):
+
+        if footprint is None or footprint.is_empty:
+            return 0.
+
+        if not self._prepared.intersects(footprint):
+            return 0.
+
+        if self._prepared.within(footprint):
+            return self.area
+
+        if self._tree is not None:
+            return sum(fragment.intersection(footprint).area
+                       for fragment in self._candidates(footprint))
+
+        return self.geometry.intersection(footprint).area
+
+    def intersects(self, footprints):
+        '''Checks which footprints intersect the AOI
+
+        Args:
+            footprints: a single geometry or an iterable of geometries
+
+        Returns:
+            bool or numpy array of bools
+
+        '''
+
+        if isinstance(footprints, BaseGeometry):
+            return self._prepared.intersects(footprints)
+
+        return np.array([footprint is not None and
+                         self._prepared.intersects(footprint)
+                         for footprint in footprints], dtype=bool)
+
+    def intersection_area(self, footprints):
+        '''Calculates the area of the AOI covered by each footprint
+
+        Args:
+            footprints: a single geometry or an iterable of geometries
+
+        Returns:
+            float or numpy array of the intersecting areas (in square degree)
+
+        '''
+
+        if footprints is None or isinstance(footprints, BaseGeometry):
+            return self._area(footprints)
+
+        return np.array([self._area(footprint) for footprint in footprints],
+                        dtype='float64')
+
+    def covers(self, footprints, area_reduce=0):
+        '''Checks if footprints cover the full AOI
+
+        Args:
+            footprints: a single geometry or an iterable of geometries
+            area_reduce (float): tolerated uncovered area (in square degree)
+
+        Returns:
+            bool or numpy array of bools
+
+        '''
+
+        return (self.intersection_area(footprints) >=
+                self.area - area_reduce)
+
+
 def plot_inventory(aoi, inventory_df, transparency=0.05, annotate = False):
 
     import matplotlib.pyplot as plt
@@ -2,10 +2,9 @@
 import os
 from os.path import join as opj
 import gdal
-import numpy as np
 import rasterio
-from ost.helpers import vector as vec
 from ost.helpers import helpers as h
+from ost.mosaic import native
 
 
 def mosaic_to_vrt(ts_dir, product, outfiles):
@@ -18,7 +17,21 @@ def mosaic_to_vrt(ts_dir, product, outfiles):
                   options=vrt_options)
 
 
-def mosaic(filelist, outfile, temp_dir, cut_to_aoi=False, ncores=os.cpu_count()):
+def mosaic(filelist, outfile, temp_dir, cut_to_aoi=False, ncores=os.cpu_count(),
+           engine='native'):
+    '''Mosaics a list of images
+
+    Args:
+        filelist (list/str): the images (list or space separated string)
+        outfile (str): path of the output Cloud-Optimized GeoTiff
+        temp_dir (str): directory for temporary files (OTB engine)
+        cut_to_aoi (str): WKT of the AOI the mosaic is cut to, or False
+        ncores (int): number of cores used by the native engine
+        engine (str): 'native' for the built-in tiled engine or 'otb' for
+                      otbcli_Mosaic
+
+    '''
+
     if type(cut_to_aoi)==str:
         if cut_to_aoi == 'False':
             cut_to_aoi=False
@@ -32,15 +45,29 @@ def mosaic(filelist, outfile, temp_dir, cut_to_aoi=False, ncores=os.cpu_count())
     logfile = opj(
         os.path.dirname(outfile), '{}.errLog'.format(os.path.basename(outfile)[:-4])
     )
-        
+
+    if engine == 'native':
+        files = filelist.replace("'", '').replace(",", '').strip('][').split()
+        try:
+            native.mosaic(files, outfile, cut_to_aoi, int(ncores))
+        except Exception as error:
+            print(' ERROR: Mosaicking of {} failed ({}).'.format(
+                os.path.basename(outfile), error))
+            with open(logfile, 'w') as file:
+                file.write('{}\n'.format(error))
+            if os.path.isfile(outfile):
+                os.remove(outfile)
+            return
+
+        _check_mosaic(outfile, check_file)
+        return
+
     with rasterio.open(filelist.replace("'", '').replace(",", '').strip('][').split(' ')[0]) as src:
         dtype = src.meta['dtype']
         dtype = 'float' if dtype == 'float32' else dtype
         
-    if cut_to_aoi:
-        tempfile = opj(temp_dir, os.path.basename(outfile))
-    else: 
-        tempfile = outfile
+    # otb writes a plain GeoTiff, which is converted to a COG afterwards
+    tempfile = opj(temp_dir, os.path.basename(outfile))
     cmd = ('otbcli_Mosaic -ram 4096'
                     ' -progress 1'
                     ' -comp.feather large'
@@ -59,29 +86,17 @@ def mosaic(filelist, outfile, temp_dir, cut_to_aoi=False, ncores=os.cpu_count())
 
         return
 
-    if cut_to_aoi:
-        
-        # get aoi ina way rasterio wants it
-        features = vec.gdf_to_json_geometry(vec.wkt_to_gdf(cut_to_aoi))
-        
-         # import raster and mask
-        with rasterio.open(tempfile) as src:
-            out_image, out_transform = rasterio.mask.mask(src, features, crop=True)
-            out_meta = src.meta.copy()
-            ndv = src.nodata
-            out_image = np.ma.masked_where(out_image == ndv, out_image)
-        
-        out_meta.update({'driver': 'GTiff', 'height': out_image.shape[1],
-                         'width': out_image.shape[2], 'transform': out_transform,
-                         'tiled': True, 'blockxsize': 128, 'blockysize': 128})
-        
-        with rasterio.open(outfile, 'w', **out_meta) as dest:
-            dest.write(out_image.data)
-    
-        # remove intermediate file
-        os.remove(tempfile)
-    
-    # check     
+    # crop to the aoi while writing the tiles of the COG
+    native.mosaic([tempfile], outfile, cut_to_aoi, int(ncores), feather=0,
+                  harmonization=False, cache=None)
+    os.remove(tempfile)
+
+    _check_mosaic(outfile, check_file)
+
+
+def _check_mosaic(outfile, check_file):
+
+    # check
     return_code = h.check_out_tiff(outfile)
     if return_code != 0:
         if os.path.isfile(outfile):
@@ -0,0 +1,524 @@
+# -*- coding: utf-8 -*-
+'''A native mosaicking engine based on rasterio
+
+The mosaic is created tile by tile. For each output tile, only the
+overlapping windows of the input images are read, so memory usage is
+bounded by the tile size and the number of parallel workers, independent
+of the size of the mosaic.
+
+Seams are blended by feathering, i.e. each input is weighted by its
+distance to the nearest invalid pixel (clipped at the feather distance).
+Radiometric differences between the inputs are harmonized by a per-band
+gain and offset, which are estimated once from the statistics of all
+overlaps before the tiles are processed. If an AOI is given, the mosaic
+is cropped to its bounds and masked by its geometry while the tiles are
+written.
+
+'''
+
+import os
+import threading
+import itertools
+from collections import OrderedDict
+
+import numpy as np
+import rasterio
+from rasterio import features, warp, windows
+from rasterio.enums import Resampling
+from rasterio.transform import from_origin
+from rasterio.windows import Window, from_bounds
+from scipy import ndimage
+from shapely.wkt import loads
+
+from ost.helpers import cog
+
+
+def _intersection(bounds1, bounds2):
+
+    left, bottom = max(bounds1[0], bounds2[0]), max(bounds1[1], bounds2[1])
+    right, top = min(bounds1[2], bounds2[2]), min(bounds1[3], bounds2[3])
+
+    if left >= right or bottom >= top:
+        return None
+
+    return left, bottom, right, top
+
+
+class MosaicGeometry():
+    '''The output grid of a mosaic and the overlaps of its inputs
+
+    Args:
+        filelist (list): paths of the input images
+        tile_size (int): size (in pixels) of the processing tiles
+        aoi (str): WKT (in EPSG:4326) to which the mosaic is cut
+
+    '''
+
+    def __init__(self, filelist, tile_size=1024, aoi=None):
+
+        # a fixed order of the inputs makes the geometry of different
+        # layers of the same bursts comparable
+        self.filelist = sorted(filelist)
+        self.tile_size = tile_size
+
+        self.bounds = []
+        for file in self.filelist:
+            with rasterio.open(file) as src:
+                if file == self.filelist[0]:
+                    self.crs, self.res = src.crs, src.res
+                    self.count, self.dtype = src.count, src.dtypes[0]
+                    self.nodata = src.nodata if src.nodata is not None else 0
+                elif src.crs != self.crs or src.count != self.count:
+                    raise ValueError(
+                        ' ERROR: All images of a mosaic need the same '
+                        'projection and number of bands ({}).'.format(file))
+                self.bounds.append(tuple(src.bounds))
+
+        bounds = (min(b[0] for b in self.bounds),
+                  min(b[1] for b in self.bounds),
+                  max(b[2] for b in self.bounds),
+                  max(b[3] for b in self.bounds))
+
+        # the aoi is transformed to the projection of the images
+        self.aoi = None
+        if aoi:
+            self.aoi = warp.transform_geom(
+                'EPSG:4326', self.crs, loads(aoi).__geo_interface__)
+            aoi_bounds = features.bounds(self.aoi)
+            bounds = _intersection(bounds, aoi_bounds)
+            if bounds is None:
+                raise ValueError(
+                    ' ERROR: The images do not intersect with the AOI.')
+
+        self.transform = from_origin(bounds[0], bounds[3], *self.res)
+        self.width = max(int(round((bounds[2] - bounds[0]) / self.res[0])), 1)
+        self.height = max(int(round((bounds[3] - bounds[1]) / self.res[1])), 1)
+
+        # mosaics with the same key share the weights of their tiles
+        self.key = (str(self.crs), self.res, tuple(self.bounds), tile_size,
+                    aoi)
+
+        # pairs of overlapping images with the bounds of their overlap
+        self.overlaps = []
+        for i, j in itertools.combinations(range(len(self.filelist)), 2):
+            overlap = _intersection(self.bounds[i], self.bounds[j])
+            if overlap:
+                self.overlaps.append((i, j, overlap))
+
+    def tiles(self):
+        '''Yields the windows of the output tiles'''
+
+        for row in range(0, self.height, self.tile_size):
+            for col in range(0, self.width, self.tile_size):
+                yield Window(col, row,
+                             min(self.tile_size, self.width - col),
+                             min(self.tile_size, self.height - row))
+
+    def inputs(self, window, margin=0):
+        '''Lists the inputs that overlap a (buffered) output window
+
+        Args:
+            window (Window): the output window
+            margin (int): buffer (in pixels) around the window
+
+        Returns:
+            list: indices of the overlapping inputs
+
+        '''
+
+        left, top = self.transform * (window.col_off - margin,
+                                      window.row_off - margin)
+        right, bottom = self.transform * (
+            window.col_off + window.width + margin,
+            window.row_off + window.height + margin)
+
+        return [index for index, bounds in enumerate(self.bounds)
+                if _intersection(bounds, (left, bottom, right, top))]
+
+
+class _Reader():
+    '''Thread-local dataset handles for the windowed reads'''
+
+    def __init__(self, filelist):
+
+        self.filelist = filelist
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._handles = []
+
+    def dataset(self, index):
+
+        datasets = getattr(self._local, 'datasets', None)
+        if datasets is None:
+            datasets = self._local.datasets = {}
+
+        if index not in datasets:
+            datasets[index] = rasterio.open(self.filelist[index])
+            with self._lock:
+                self._handles.append(datasets[index])
+
+        return datasets[index]
+
+    def read(self, index, bounds, shape, nodata):
+        '''Reads an input into the grid of the given bounds and shape
+
+        Args:
+            index (int): index of the input
+            bounds (tuple): bounds of the target grid
+            shape (tuple): height and width of the target grid
+            nodata (float): value for pixels outside of the input
+
+        Returns:
+            ndarray: the float32 data with shape (bands, height, width)
+
+        '''
+
+        src = self.dataset(index)
+        height, width = shape
+        array = np.full((src.count, height, width), nodata, dtype='float32')
+
+        overlap = _intersection(tuple(src.bounds), bounds)
+        if overlap is None:
+            return array
+
+        # position of the overlap within the target grid
+        xres = (bounds[2] - bounds[0]) / width
+        yres = (bounds[3] - bounds[1]) / height
+        col_start = int(round((overlap[0] - bounds[0]) / xres))
+        col_stop = int(round((overlap[2] - bounds[0]) / xres))
+        row_start = int(round((bounds[3] - overlap[3]) / yres))
+        row_stop = int(round((bounds[3] - overlap[1]) / yres))
+        if col_stop <= col_start or row_stop <= row_start:
+            return array
+
+        window = from_bounds(*overlap, transform=src.transform)
+        array[:, row_start:row_stop, col_start:col_stop] = src.read(
+            window=window,
+            out_shape=(src.count, row_stop - row_start, col_stop - col_start),
+            out_dtype='float32',
+            resampling=Resampling.nearest)
+
+        return array
+
+    def close(self):
+
+        for handle in self._handles:
+            handle.close()
+        self._handles = []
+
+
+def _valid(array, nodata):
+    return np.isfinite(array) & (array != nodata)
+
+
+def harmonize(geometry, reader=None, sample_size=512):
+    '''Estimates a gain and offset per input and band from the overlaps
+
+    The gains equalize the standard deviations, the offsets the means of
+    the overlapping areas in a least squares sense, with a mean gain of
+    one and a mean offset of zero over all inputs.
+
+    Args:
+        geometry (MosaicGeometry): the geometry of the mosaic
+        reader (_Reader): reader for the inputs
+        sample_size (int): maximum size (in pixels) of the decimated reads
+                           of the overlaps
+
+    Returns:
+        tuple: arrays of the gains and offsets with shape (inputs, bands)
+
+    '''
+
+    nr_of_inputs = len(geometry.filelist)
+    gains = np.ones((nr_of_inputs, geometry.count))
+    offsets = np.zeros((nr_of_inputs, geometry.count))
+    if not geometry.overlaps:
+        return gains, offsets
+
+    own_reader = reader is None
+    reader = reader or _Reader(geometry.filelist)
+
+    # statistics of the overlaps at reduced resolution
+    stats = []
+    try:
+        for i, j, bounds in geometry.overlaps:
+            width = (bounds[2] - bounds[0]) / geometry.res[0]
+            height = (bounds[3] - bounds[1]) / geometry.res[1]
+            factor = max(width / sample_size, height / sample_size, 1)
+            shape = (max(int(height / factor), 1), max(int(width / factor), 1))
+
+            array1 = reader.read(i, bounds, shape, geometry.nodata)
+            array2 = reader.read(j, bounds, shape, geometry.nodata)
+            valid = _valid(array1, geometry.nodata) & \
+                _valid(array2, geometry.nodata)
+
+            for band in range(geometry.count):
+                if valid[band].sum() < 2:
+                    continue
+                values1 = array1[band][valid[band]].astype('float64')
+                values2 = array2[band][valid[band]].astype('float64')
+                stats.append((i, j, band, values1.mean(), values1.std(),
+                              values2.mean(), values2.std()))
+    finally:
+        if own_reader:
+            reader.close()
+
+    for band in range(geometry.count):
+        band_stats = [stat for stat in stats if stat[2] == band]
+        if not band_stats:
+            continue
+
+        # log(g_i) - log(g_j) = log(s_j / s_i), with sum(log(g)) = 0
+        rows, values = [], []
+        for i, j, _, _, std1, _, std2 in band_stats:
+            if std1 > 0 and std2 > 0:
+                row = np.zeros(nr_of_inputs)
+                row[i], row[j] = 1, -1
+                rows.append(row)
+                values.append(np.log(std2 / std1))
+        rows.append(np.ones(nr_of_inputs))
+        values.append(0)
+        log_gains = np.linalg.lstsq(
+            np.array(rows), np.array(values), rcond=None)[0]
+        gains[:, band] = np.exp(log_gains)
+
+        # o_i - o_j = g_j * m_j - g_i * m_i, with sum(o) = 0
+        rows, values = [], []
+        for i, j, _, mean1, _, mean2, _ in band_stats:
+            row = np.zeros(nr_of_inputs)
+            row[i], row[j] = 1, -1
+            rows.append(row)
+            values.append(gains[j, band] * mean2 - gains[i, band] * mean1)
+        rows.append(np.ones(nr_of_inputs))
+        values.append(0)
+        offsets[:, band] = np.linalg.lstsq(
+            np.array(rows), np.array(values), rcond=None)[0]
+
+    return gains, offsets
+
+
+def feather_weights(valid, feather, margin):
+    '''Weights of an input by the distance to its nearest invalid pixel
+
+    Args:
+        valid (ndarray): 2D validity mask of the buffered tile
+        feather (int): distance (in pixels) over which the weight rises
+                       from 0 to 1
+        margin (int): buffer (in pixels) of the tile that is cropped
+
+    Returns:
+        ndarray: the float32 weights of the tile without the buffer
+
+    '''
+
+    if feather <= 0:
+        weights = valid.astype('float32')
+    else:
+        # the padding makes sure there is an invalid pixel beyond the margin
+        distance = ndimage.distance_transform_edt(
+            np.pad(valid, 1, constant_values=False))[1:-1, 1:-1]
+        weights = (np.minimum(distance, feather) / feather).astype('float32')
+
+    if margin:
+        weights = weights[margin:-margin, margin:-margin]
+
+    return weights
+
+
+class WeightCache():
+    '''Caches the feather weights and AOI masks of mosaic tiles
+
+    The images of a burst timeseries (and timescan) share the same
+    footprints for all dates and products, so the weights of each input
+    within each tile are computed for the first layer only and reused for
+    all others. Invalid pixels of a layer are still excluded, but the
+    feathering does not adapt to them. Weights are stored as uint8, tiles
+    that are completely inside an input as a scalar.
+
+    Args:
+        max_bytes (int): maximum size of the cached arrays; the least
+                         recently used geometries are dropped first
+
+    '''
+
+    def __init__(self, max_bytes=1024 ** 3):
+
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, tile, item):
+        '''Returns the cached weights (None if not cached)'''
+
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            weights = self._entries[key].get((tile, item))
+
+        if weights is None or np.isscalar(weights):
+            return weights
+
+        return weights.astype('float32') / 255 if item != 'aoi' else weights
+
+    def put(self, key, tile, item, weights):
+        '''Stores the weights of an input (or the AOI mask) of a tile'''
+
+        if weights.min() == weights.max():
+            weights = weights.flat[0].item()
+        elif item != 'aoi':
+            weights = np.round(weights * 255).astype('uint8')
+
+        with self._lock:
+            entry = self._entries.setdefault(key, {})
+            entry[(tile, item)] = weights
+            self._entries.move_to_end(key)
+
+            self._bytes[key] = self._bytes.get(key, 0) + getattr(
+                weights, 'nbytes', 0)
+            while sum(self._bytes.values()) > self.max_bytes and \
+                    len(self._entries) > 1:
+                oldest, _ = self._entries.popitem(last=False)
+                del self._bytes[oldest]
+
+    def clear(self):
+
+        with self._lock:
+            self._entries.clear()
+            self._bytes.clear()
+
+
+# shared by all mosaics of a process (e.g. all steps of a timeseries)
+CACHE = WeightCache()
+
+
+def mosaic_tile(geometry, reader, window, gains, offsets, feather=64,
+                cache=None):
+    '''Creates a single tile of the mosaic
+
+    Args:
+        geometry (MosaicGeometry): the geometry of the mosaic
+        reader (_Reader): reader for the inputs
+        window (Window): the output window
+        gains (ndarray): gains with shape (inputs, bands)
+        offsets (ndarray): offsets with shape (inputs, bands)
+        feather (int): feather distance in pixels
+        cache (WeightCache): cache for the weights of the tile
+
+    Returns:
+        ndarray: the tile with shape (bands, height, width)
+
+    '''
+
+    height, width = int(window.height), int(window.width)
+    margin = max(feather, 0)
+    key, tile_id = (geometry.key, feather), (window.col_off, window.row_off)
+
+    # bounds of the tile, and buffered by the feather distance
+    left, top = geometry.transform * (window.col_off, window.row_off)
+    right, bottom = geometry.transform * (window.col_off + width,
+                                          window.row_off + height)
+    buffered = (left - margin * geometry.res[0],
+                bottom - margin * geometry.res[1],
+                right + margin * geometry.res[0],
+                top + margin * geometry.res[1])
+    shape = (height + 2 * margin, width + 2 * margin)
+
+    total = np.zeros((geometry.count, height, width), dtype='float32')
+    weight_sum = np.zeros((geometry.count, height, width), dtype='float32')
+
+    for index in geometry.inputs(window, margin):
+
+        weights = cache.get(key, tile_id, index) if cache else None
+        if weights is None:
+            # the weights need the data of the buffered tile
+            array = reader.read(index, buffered, shape, geometry.nodata)
+            valid = _valid(array, geometry.nodata)
+            weights = feather_weights(valid.any(axis=0), feather, margin)
+            if cache:
+                cache.put(key, tile_id, index, weights)
+
+            array = array[:, margin:margin + height, margin:margin + width]
+            valid = valid[:, margin:margin + height, margin:margin + width]
+        elif np.isscalar(weights) and weights == 0:
+            continue
+        else:
+            array = reader.read(index, (left, bottom, right, top),
+                                (height, width), geometry.nodata)
+            valid = _valid(array, geometry.nodata)
+
+        weights = weights * valid
+        if not weights.any():
+            continue
+
+        array = np.where(weights > 0, array, 0)
+        total += weights * (array * gains[index][:, None, None] +
+                            offsets[index][:, None, None])
+        weight_sum += weights
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        tile = np.where(weight_sum > 0, total / weight_sum, geometry.nodata)
+
+    # cut to the aoi
+    if geometry.aoi:
+        inside = cache.get(key, tile_id, 'aoi') if cache else None
+        if inside is None:
+            inside = features.geometry_mask(
+                [geometry.aoi], out_shape=(height, width),
+                transform=windows.transform(window, geometry.transform),
+                invert=True)
+            if cache:
+                cache.put(key, tile_id, 'aoi', inside)
+        tile[:, ~np.broadcast_to(inside, (height, width))] = geometry.nodata
+
+    if np.issubdtype(np.dtype(geometry.dtype), np.integer):
+        info = np.iinfo(geometry.dtype)
+        tile = np.clip(np.round(tile), info.min, info.max)
+
+    return tile.astype(geometry.dtype)
+
+
+def mosaic(filelist, outfile, cut_to_aoi=False, ncores=os.cpu_count(),
+           tile_size=1024, feather=64, harmonization=True, compress='deflate',
+           cache=CACHE):
+    '''Mosaics a list of images tile by tile
+
+    Args:
+        filelist (list): paths of the input images
+        outfile (str): path of the output Cloud-Optimized GeoTiff
+        cut_to_aoi (str): WKT (in EPSG:4326) to which the mosaic is cut
+        ncores (int): number of tiles processed in parallel
+        tile_size (int): size (in pixels) of the processing tiles
+        feather (int): feather distance in pixels (0 disables feathering)
+        harmonization (bool): harmonize the radiometry of the inputs
+        compress (str): compression of the output COG
+        cache (WeightCache): cache for the weights of mosaics with the
+                             same footprints (None disables caching)
+
+    '''
+
+    geometry = MosaicGeometry(filelist, tile_size, cut_to_aoi or None)
+    reader = _Reader(geometry.filelist)
+
+    try:
+        if harmonization:
+            gains, offsets = harmonize(geometry, reader)
+        else:
+            gains = np.ones((len(geometry.filelist), geometry.count))
+            offsets = np.zeros((len(geometry.filelist), geometry.count))
+
+        profile = {
+            'dtype': geometry.dtype, 'count': geometry.count,
+            'crs': geometry.crs, 'transform': geometry.transform,
+            'width': geometry.width, 'height': geometry.height,
+            'nodata': geometry.nodata
+        }
+
+        cog.write_windows(
+            outfile, profile,
+            lambda window: mosaic_tile(geometry, reader, window, gains,
+                                       offsets, feather, cache),
+            geometry.tiles(), ncores, compress=compress)
+    finally:
+        reader.close()
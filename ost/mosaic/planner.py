@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+'''This module plans and runs the mosaicking of timeseries layers
+
+The timeseries layers of all bursts (or tracks) are indexed once into a
+(product, step) table. The mosaics of the single time steps are
+independent, so they run concurrently within a CPU and memory budget.
+The timeseries VRT of a product is built as soon as all of its steps
+are mosaicked, while the mosaics of other products are still running.
+
+'''
+
+import os
+from os.path import join as opj
+import glob
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import gdal
+
+from ost.mosaic import mosaic as mos
+
+
+def _layer_date(file):
+
+    # coherence layers carry the master and slave date
+    parts = os.path.basename(file).split('.')
+    if '.coh.' in os.path.basename(file):
+        return '{}_{}'.format(parts[2], parts[1])
+
+    return parts[1]
+
+
+def index_timeseries(processing_dir):
+    '''Indexes the timeseries layers of all bursts or tracks at once
+
+    Args:
+        processing_dir (str): the processing directory of the project
+
+    Returns:
+        dict: (product, step) as key (e.g. ('bs.VV', 1)), the list of
+              the layers as value
+
+    '''
+
+    index = {}
+    for file in glob.glob(opj(processing_dir, '*', 'Timeseries', '*.tif')):
+
+        # skip the mosaics themselves
+        if os.path.basename(os.path.dirname(os.path.dirname(file))) == \
+                'Mosaic':
+            continue
+
+        parts = os.path.basename(file).split('.')
+        try:
+            step = int(parts[0])
+        except ValueError:
+            continue
+
+        product = '.'.join(parts[-3:-1])
+        index.setdefault((product, step), []).append(file)
+
+    return index
+
+
+def plan_timeseries(index, ts_dir, vrt_files, step_format='{:02d}',
+                    min_steps=1):
+    '''Plans the mosaics of all time steps of the given products
+
+    Args:
+        index (dict): the index of the timeseries layers
+                      (see index_timeseries)
+        ts_dir (str): the output directory of the mosaics
+        vrt_files (dict): product as key, path of its timeseries VRT as
+                          value (defines the products to mosaic)
+        step_format (str): format of the step in the file names
+        min_steps (int): minimum number of steps of a product
+
+    Returns:
+        list: a dictionary per product with the product, the VRT file and
+              the list of steps (each with step, files, outfile and
+              check_file)
+
+    '''
+
+    plan = []
+    for product, vrt_file in vrt_files.items():
+
+        steps = sorted(step for prod, step in index if prod == product)
+        if len(steps) < min_steps:
+            continue
+
+        tasks = []
+        for step in steps:
+            filelist = sorted(index[(product, step)])
+            datelist = sorted(_layer_date(file) for file in filelist)
+            start, end = datelist[0], datelist[-1]
+
+            dates = start if start == end else '{}-{}'.format(start, end)
+            outfile = opj(ts_dir, '{}.{}.{}.tif'.format(
+                step_format.format(step), dates, product))
+
+            tasks.append({
+                'step': step, 'files': filelist, 'outfile': outfile,
+                'check_file': opj(ts_dir, '.{}.processed'.format(
+                    os.path.basename(outfile)[:-4]))
+            })
+
+        plan.append({'product': product, 'vrt': vrt_file, 'steps': tasks})
+
+    return plan
+
+
+def plan_from_exec(exec_file):
+    '''Plans the mosaics listed in a timeseries exec file
+
+    The VRTs are not part of the plan, since the exec workflow builds
+    them in a step of its own.
+
+    Args:
+        exec_file (str): the exec file with one mosaic per line
+                         (files;outfile;temp_dir;cut_to_aoi;ncores)
+
+    Returns:
+        list: the plan (see plan_timeseries)
+
+    '''
+
+    products = {}
+    with open(exec_file, 'r') as file:
+        for line in file:
+            if not line.strip():
+                continue
+
+            filelist, outfile = line.strip().split(';')[:2]
+            parts = os.path.basename(outfile).split('.')
+            product = '.'.join(parts[-3:-1])
+            products.setdefault(product, []).append({
+                'step': int(parts[0]),
+                'files': filelist.replace("'", '').strip('][').split(', '),
+                'outfile': outfile,
+                'check_file': opj(os.path.dirname(outfile), '.{}.processed'
+                                  .format(os.path.basename(outfile)[:-4]))
+            })
+
+    return [{'product': product, 'vrt': None, 'steps': steps}
+            for product, steps in products.items()]
+
+
+def tile_memory(tile_size=1024, feather=64, count=1):
+    '''Estimates the memory (in bytes) of a single mosaic tile worker'''
+
+    # buffered input, validity mask, weights and the two accumulators
+    return (tile_size + 2 * feather) ** 2 * count * 4 * 4
+
+
+def run_timeseries(plan, temp_dir, cut_to_aoi=False, ncores=os.cpu_count(),
+                   memory=None):
+    '''Runs the mosaics of a timeseries plan concurrently
+
+    Args:
+        plan (list): the plan (see plan_timeseries)
+        temp_dir (str): directory for temporary files
+        cut_to_aoi (str): WKT of the AOI the mosaics are cut to, or False
+        ncores (int): number of cores used in total
+        memory (int): memory budget (in bytes) of all mosaics
+
+    Returns:
+        list: the VRT files that have been created
+
+    '''
+
+    tasks = []
+    for product in plan:
+        for task in product['steps']:
+            if os.path.isfile(task['check_file']):
+                print(' INFO: Mosaic layer {} already processed.'.format(
+                    os.path.basename(task['outfile'])))
+            else:
+                tasks.append((product['product'], task))
+
+    # the number of tiles in flight is bounded by the memory budget
+    workers = ncores
+    if memory:
+        workers = max(1, min(ncores, int(memory // tile_memory())))
+
+    jobs = max(1, min(len(tasks), workers // 2))
+    threads = max(1, workers // jobs)
+
+    remaining = {product['product']: len(
+        [task for name, task in tasks if name == product['product']])
+        for product in plan}
+    vrts = []
+
+    def _mosaic(product, task, threads=threads):
+
+        print(' INFO: Mosaicking layer {}.'.format(
+            os.path.basename(task['outfile'])))
+        mosaic_temp = opj(temp_dir, 'temp_{}_{}_mosaic_timeseries'.format(
+            product, task['step']))
+        os.makedirs(mosaic_temp, exist_ok=True)
+        mos.mosaic(task['files'], task['outfile'], mosaic_temp, cut_to_aoi,
+                   threads)
+
+    def _vrt(product):
+
+        if product['vrt'] is None:
+            return
+
+        outfiles = [task['outfile'] for task in product['steps']
+                    if os.path.isfile(task['check_file'])]
+        if len(outfiles) < len(product['steps']):
+            print(' WARNING: {} of {} layers of {} have not been mosaicked.'
+                  .format(len(product['steps']) - len(outfiles),
+                          len(product['steps']), product['product']))
+        if not outfiles:
+            return
+
+        vrt_options = gdal.BuildVRTOptions(srcNodata=0, separate=True)
+        gdal.BuildVRT(product['vrt'], outfiles, options=vrt_options)
+        vrts.append(product['vrt'])
+
+    products = {product['product']: product for product in plan}
+    for name, count in remaining.items():
+        if count == 0:
+            _vrt(products[name])
+
+    if not tasks:
+        return vrts
+
+    # the first mosaic fills the weight cache for all others
+    _mosaic(*tasks[0], threads=workers)
+    remaining[tasks[0][0]] -= 1
+    if remaining[tasks[0][0]] == 0:
+        _vrt(products[tasks[0][0]])
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = {executor.submit(_mosaic, *task): task[0]
+                   for task in tasks[1:]}
+
+        # vrts are built as soon as all steps of their product are done
+        for future in as_completed(futures):
+            future.result()
+            remaining[futures[future]] -= 1
+            if remaining[futures[future]] == 0:
+                _vrt(products[futures[future]])
+
+    return vrts
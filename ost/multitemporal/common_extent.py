@@ -4,28 +4,261 @@
 import os
 from os.path import join as opj
 import time
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+
 import gdal
+import numpy as np
+import rasterio
+import geopandas as gpd
+from affine import Affine
+from rasterio.enums import Resampling
+from rasterio.vrt import WarpedVRT
+from rasterio.windows import Window
+from scipy import ndimage
 
 from ost.helpers import helpers as h, raster as ras, vector as vec
 
 
-def mt_extent(list_of_scenes, out_file, temp_dir, buffer=None):
+def _row_windows(width, height, pixels=1024 * 1024):
+
+    # full-width strips follow the line interleave of the ENVI images
+    rows = max(1, pixels // width)
+    for row in range(0, height, rows):
+        yield Window(0, row, width, min(rows, height - row))
+
+
+def _reduce_window(infile, window, test, reduction):
+
+    result = None
+    with rasterio.open(infile) as src:
+        for band in range(1, src.count + 1):
+            array = src.read(band, window=window)
+
+            if result is None:
+                result = test(array)
+            elif reduction == 'and':
+                result &= test(array)
+            else:
+                result |= test(array)
+
+            # no need to read further dates
+            if (reduction == 'and' and not result.any()) or \
+                    (reduction == 'or' and result.all()):
+                break
+
+    return result
+
+
+def _reduce_cells(infile, test, reduction, factor, window):
+
+    # the minimum and maximum of each cell are tested, so no pixel is
+    # skipped (no data values are taken as they are)
+    with rasterio.open(infile) as src:
+        shape = (-(-int(window.height) // factor),
+                 -(-int(window.width) // factor))
+        options = dict(crs=src.crs, width=shape[1], height=shape[0],
+                       transform=src.window_transform(window) *
+                       Affine.scale(factor),
+                       src_nodata=None, nodata=None)
+
+        result = None
+        with WarpedVRT(src, resampling=Resampling.min, **options) as low, \
+                WarpedVRT(src, resampling=Resampling.max, **options) as high:
+            for band in range(1, src.count + 1):
+
+                if reduction == 'and':
+                    cells = test(low.read(band)) & test(high.read(band))
+                else:
+                    cells = test(low.read(band)) | test(high.read(band))
+
+                if result is None:
+                    result = cells
+                elif reduction == 'and':
+                    result &= cells
+                else:
+                    result |= cells
+
+    return result
+
+
+def _boundary_windows(uncertain, factor, width, height):
+
+    # one window per run of uncertain cells in a row of cells
+    for row in np.flatnonzero(uncertain.any(axis=1)):
+        cols = np.flatnonzero(uncertain[row])
+        for run in np.split(cols, np.flatnonzero(np.diff(cols) > 1) + 1):
+            col_off, row_off = run[0] * factor, row * factor
+            yield Window(col_off, row_off,
+                         min((run[-1] + 1) * factor, width) - col_off,
+                         min(factor, height - row_off))
+
+
+def reduce_mask(infile, test, reduction='and', ncores=os.cpu_count(),
+                approximate=False, factor=16, window=None):
+    '''Reduces a per-band test over all bands of a raster to a mask
+
+    The bands are read one by one per window and reduced by a logical AND
+    (or OR) in memory, so the memory does not grow with the number of
+    bands.
+
+    In approximate mode, the bands are first reduced to cells of the given
+    factor, by testing the minimum and maximum of each cell. A cell passes
+    an OR if any of its pixels may pass, and fails an AND if any may fail.
+    This is conservative for tests that are monotonic in the value or
+    exclude an extreme value (e.g. array > 0 or array != ndv, with ndv at
+    the edge of the value range). Only the cells along the boundaries of
+    the cell mask are read and reduced at full resolution, all other
+    pixels take the value of their cell.
+
+    Args:
+        infile (str): the raster (e.g. a VRT stack of all dates)
+        test (function): returns the boolean array of a band's array
+        reduction (str): 'and' or 'or'
+        ncores (int): number of windows processed in parallel
+        approximate (bool): refine the mask only along its boundaries
+        factor (int): decimation factor of the approximate mode
+        window (Window): the part of the raster to reduce (all by default)
+
+    Returns:
+        tuple: the boolean mask, its transform and crs
+
+    '''
+
+    with rasterio.open(infile) as src:
+        if window is None:
+            window = Window(0, 0, src.width, src.height)
+        transform, crs = src.window_transform(window), src.crs
+
+    col_off, row_off = int(window.col_off), int(window.row_off)
+    width, height = int(window.width), int(window.height)
+
+    if approximate:
+        coarse = _reduce_cells(infile, test, reduction, factor, window)
+
+        # cells with a differing neighbour (or at the edge) are refined
+        structure = np.ones((3, 3), dtype=bool)
+        uncertain = ndimage.binary_dilation(coarse, structure) & \
+            ~ndimage.binary_erosion(coarse, structure)
+
+        mask = np.repeat(np.repeat(coarse & ~uncertain, factor, axis=0),
+                         factor, axis=1)[:height, :width]
+        windows = _boundary_windows(uncertain, factor, width, height)
+    else:
+        mask = np.zeros((height, width), dtype=bool)
+        windows = _row_windows(width, height)
+
+    def _reduce(window):
+        # windows do not overlap, so the threads write distinct pixels
+        mask[window.row_off:window.row_off + window.height,
+             window.col_off:window.col_off + window.width] = _reduce_window(
+                 infile, Window(col_off + window.col_off,
+                                row_off + window.row_off,
+                                window.width, window.height),
+                 test, reduction)
+
+    with ThreadPoolExecutor(max_workers=int(ncores)) as executor:
+        list(executor.map(_reduce, windows))
+
+    return mask, transform, crs
+
+
+def valid_mask(infile, ndv=0, less_then=False, ncores=os.cpu_count(),
+               approximate=False):
+    '''Finds the pixels that are valid in all bands of a raster
+
+    Args:
+        infile (str): the raster (e.g. a VRT stack of all dates)
+        ndv (float): the no data value
+        less_then (bool): also treat values below ndv as no data
+        ncores (int): number of windows processed in parallel
+        approximate (bool): refine the mask only along its boundaries
+
+    Returns:
+        tuple: the boolean mask, its transform and crs
+
+    '''
+
+    if less_then:
+        return reduce_mask(infile, lambda array: array > ndv, 'and', ncores,
+                           approximate)
+
+    return reduce_mask(infile, lambda array: array != ndv, 'and', ncores,
+                       approximate)
+
+
+def mt_extent(list_of_scenes, out_file, temp_dir, buffer=None,
+              ncores=os.cpu_count(), approximate=False):
+    '''Creates the common valid extent of a list of scenes
+
+    Args:
+        list_of_scenes (list): the scenes (or their string representation)
+        out_file (str): the output shapefile of the extent
+        temp_dir (str): directory for the temporary stack of the scenes
+        buffer (float): buffer of the extent
+        ncores (int): number of windows processed in parallel
+        approximate (bool): refine the extent only along its boundaries
+
+    '''
+
     if type(list_of_scenes) == str:
         list_of_scenes = list_of_scenes.replace("'", '').strip('][').split(', ')
-    out_dir = os.path.dirname(out_file)
+
+    # extents of several bursts may share the temp_dir
+    os.makedirs(temp_dir, exist_ok=True)
+    extent_vrt = opj(temp_dir, '{}.vrt'.format(
+        os.path.basename(out_file)[:-4]))
     vrt_options = gdal.BuildVRTOptions(srcNodata=0, separate=True)
 
     # build vrt stack from all scenes
-    gdal.BuildVRT(opj(out_dir, 'extent.vrt'),
-                  list_of_scenes,
-                  options=vrt_options)
+    gdal.BuildVRT(extent_vrt, list_of_scenes, options=vrt_options)
     start = time.time()
 
-    outline_file = opj(temp_dir, os.path.basename(out_file))
-    ras.outline(opj(out_dir, 'extent.vrt'), outline_file, 0, False)
-
-    vec.exterior(outline_file, out_file, buffer)
-    h.delete_shapefile(outline_file)
+    # polygonize the common valid area tile by tile, simplified at
+    # pixel tolerance to avoid staircase outlines
+    mask, transform, crs = valid_mask(extent_vrt, 0, False, int(ncores),
+                                      approximate)
+    extent_gpkg = opj(temp_dir, '{}.gpkg'.format(
+        os.path.basename(out_file)[:-4]))
+    ras.polygonize_mask(mask, transform, crs, extent_gpkg, temp_dir,
+                        simplify=1)
+    vec.gdf_exterior(gpd.read_file(extent_gpkg), buffer).to_file(out_file)
 
-    os.remove(opj(out_dir, 'extent.vrt'))
+    os.remove(extent_vrt)
+    os.remove(extent_gpkg)
     h.timer(start)
+
+
+def _mt_extent(argument_list):
+    '''Worker for the parallel creation of extents'''
+
+    list_of_scenes, out_file, temp_dir, buffer, ncores, approximate = \
+        argument_list
+    mt_extent(list_of_scenes, out_file, temp_dir, buffer, ncores, approximate)
+
+
+def mt_extents(extent_list, temp_dir, buffer=None, ncores=os.cpu_count(),
+               approximate=False):
+    '''Creates the common extents of several bursts (or tracks) in parallel
+
+    Args:
+        extent_list (list): tuples of the list of scenes and the output
+                            file of each extent
+        temp_dir (str): directory for temporary files
+        buffer (float): buffer of the extents
+        ncores (int): number of cores used in total
+        approximate (bool): refine the extents only along their boundaries
+
+    '''
+
+    if not extent_list:
+        return
+
+    processes = max(1, min(len(extent_list), int(ncores)))
+    threads = max(1, int(ncores) // processes)
+    argument_list = [[list_of_scenes, out_file, temp_dir, buffer, threads,
+                      approximate]
+                     for list_of_scenes, out_file in extent_list]
+
+    with multiprocessing.Pool(processes=processes) as pool:
+        pool.map(_mt_extent, argument_list, chunksize=1)
@@ -3,21 +3,106 @@
 import os
 from os.path import join as opj
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 import gdal
+import fiona
 import rasterio
 import numpy as np
+from rasterio.features import geometry_mask, geometry_window
+from rasterio.windows import Window
 
-from ost.helpers import helpers as h, raster as ras, vector as vec
+from ost.helpers import helpers as h, raster as ras, cog
+from ost.multitemporal import common_extent
 
 
-def mt_layover(filelist, outfile, temp_dir, extent, update_extent=False):
+def _or_window(infile, window):
+
+    # the masks are bit flags, so the dates are combined by a bitwise OR
+    with rasterio.open(infile) as src:
+        result = src.read(1, window=window, out_dtype='uint8')
+        for band in range(2, src.count + 1):
+
+            # no need to read further dates
+            if result.all():
+                break
+
+            result |= src.read(band, window=window, out_dtype='uint8')
+
+    return result
+
+
+def ls_union(infile, shapefile, ncores=os.cpu_count(), approximate=False):
+    '''Reduces a stack of layover/shadow masks within the given shapes
+
+    Args:
+        infile (str): the stack of the masks of all dates (e.g. a VRT)
+        shapefile (str): the shapes (e.g. the extent) the mask is cropped to
+        ncores (int): number of windows processed in parallel
+        approximate (bool): refine the mask only along its boundaries
+
+    Returns:
+        tuple: the boolean layover/shadow mask and the boolean mask of
+               the shapes (both cropped), their transform and crs
+
+    '''
+
+    # the crop to the shapes
+    with fiona.open(shapefile, 'r') as file:
+        features = [feature['geometry'] for feature in file
+                    if feature['geometry']]
+
+    with rasterio.open(infile) as src:
+        crop = geometry_window(src, features)
+        transform = src.window_transform(crop)
+        crs = src.crs
+
+    col_off, row_off = int(crop.col_off), int(crop.row_off)
+    width, height = int(crop.width), int(crop.height)
+    inside = geometry_mask(features, out_shape=(height, width),
+                           transform=transform, invert=True)
+
+    if approximate:
+        # union of the layover/shadow areas of all dates, only the
+        # crop is reduced
+        mask, _, _ = common_extent.reduce_mask(
+            infile, lambda array: array > 0, 'or', int(ncores),
+            approximate=True,
+            window=Window(col_off, row_off, width, height))
+
+    else:
+        mask = np.zeros((height, width), dtype=bool)
+
+        def _reduce(window):
+            # windows do not overlap, so the threads write distinct pixels
+            mask[window.row_off:window.row_off + window.height,
+                 window.col_off:window.col_off + window.width] = _or_window(
+                     infile, Window(col_off + window.col_off,
+                                    row_off + window.row_off,
+                                    window.width, window.height)) > 0
+
+        with ThreadPoolExecutor(max_workers=int(ncores)) as executor:
+            list(executor.map(_reduce,
+                              common_extent._row_windows(width, height)))
+
+    return mask & inside, inside, transform, crs
+
+
+def mt_layover(filelist, outfile, temp_dir, extent, update_extent=False,
+               approximate=False, ncores=os.cpu_count()):
     '''
     This function is usally used in the time-series workflow of OST. A list
     of the filepaths layover/shadow masks
 
+    The masks are reduced window by window within the extent of the burst
+    (or track) and written as a 1-bit COG, already cropped to the extent.
+    The masked extent is the extent minus the layover/shadow areas,
+    computed on the raster and polygonized once.
+
     :param filelist - list of files
     :param out_dir - directory where the output file will be stored
+    :param approximate - reduce the masks at full resolution only along
+                         the boundaries of a decimated reduction
     :return path to the multi-temporal layover/shadow mask file generated
     '''
     if type(filelist) == str:
@@ -25,56 +110,46 @@ def mt_layover(filelist, outfile, temp_dir, extent, update_extent=False):
     if type(update_extent) == str:
         if update_extent == 'False':
             update_extent = False
+    if type(approximate) == str:
+        approximate = approximate == 'True'
     # get some info
     burst_dir = os.path.dirname(outfile)
     burst = os.path.basename(burst_dir)
     extent = opj(burst_dir, '{}.extent.shp'.format(burst))
-    
+
     # get the start time for Info on processing time
     start = time.time()
-    # create path to out file
-    ls_layer = opj(temp_dir, os.path.basename(outfile))
+    ls_vrt = opj(temp_dir, 'ls.vrt')
 
     # create a vrt-stack out of
     print(' INFO: Creating common Layover/Shadow Mask')
     vrt_options = gdal.BuildVRTOptions(srcNodata=0, separate=True)
-    gdal.BuildVRT(opj(temp_dir, 'ls.vrt'), filelist, options=vrt_options)
-
-    with rasterio.open(opj(temp_dir, 'ls.vrt')) as src:
+    gdal.BuildVRT(ls_vrt, filelist, options=vrt_options)
 
-        # get metadata
-        meta = src.meta
-        # update driver and reduced band count
-        meta.update(driver='GTiff', count=1, dtype='uint8')
+    mask, inside, transform, crs = ls_union(ls_vrt, extent, ncores,
+                                            approximate)
+    profile = {'driver': 'GTiff', 'dtype': 'uint8', 'count': 1, 'crs': crs,
+               'transform': transform, 'width': mask.shape[1],
+               'height': mask.shape[0], 'nodata': 0}
+    with cog.CogWriter(outfile, profile, resampling='nearest',
+                       nbits=1) as dst:
+        dst.write(mask.astype('uint8'), indexes=1)
+        dst.update_tags(
+            1, BAND_NAME='{}'.format(os.path.basename(outfile)[:-4]))
+        dst.set_band_description(
+            1, '{}'.format(os.path.basename(outfile)[:-4]))
 
-        # create outfiles
-        with rasterio.open(ls_layer, 'w', **meta) as out_min:
-
-            # loop through blocks
-            for _, window in src.block_windows(1):
-
-                # read array with all bands
-                stack = src.read(range(1, src.count + 1), window=window)
-
-                # get stats
-                arr_max = np.nanmax(stack, axis=0)
-                arr = arr_max / arr_max
-
-                out_min.write(np.uint8(arr), window=window, indexes=1)
-
-    ras.mask_by_shape(ls_layer, outfile, extent, to_db=False,
-                      datatype='uint8', rescale=False, ndv=0)
-    os.remove(ls_layer)
+    os.remove(ls_vrt)
     h.timer(start)
 
     if update_extent:
         print(' INFO: Calculating symetrical difference of extent and ls_mask')
-        # polygonize the multi-temporal ls mask
-        ras.polygonize_raster(outfile, '{}.shp'.format(outfile[:-4]))
-        
+
         # create file for masked extent
         extent_ls_masked = opj(burst_dir, '{}.extent.masked.shp'.format(burst))
-        
-        # calculate difference between burst exntetn and ls mask, fr masked extent
-        vec.difference(extent, '{}.shp'.format(outfile[:-4]), extent_ls_masked)
-                
\ No newline at end of file
+
+        # the difference is taken on the raster, so only the result is
+        # polygonized (simplified at pixel tolerance, without slivers)
+        ras.polygonize_mask(inside & ~mask, transform, crs,
+                            extent_ls_masked, temp_dir, simplify=1,
+                            min_area=4)
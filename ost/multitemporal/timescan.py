@@ -12,6 +12,7 @@ import numpy as np
 from scipy import stats
 
 from ost.helpers import raster as ras
+from ost.helpers import cog
 from ost.helpers import helpers as h
 
 
@@ -180,8 +181,7 @@ def mt_metrics(stack, out_prefix, metrics, rescale_to_datatype=False,
         metric_dict = {}
         for metric in metrics:
             filename = '{}.{}.tif'.format(out_prefix, metric)
-            metric_dict[metric] = rasterio.open(
-                filename, 'w', **meta)
+            metric_dict[metric] = cog.CogWriter(filename, meta)
 
         # scaling factors in case we have to rescale to integer
         minimums = {'avg': -30, 'max': -30, 'min': -30,
@@ -273,10 +273,17 @@ def mt_metrics(stack, out_prefix, metrics, rescale_to_datatype=False,
                 metric_dict[metric].set_band_description(1, 
                     '{}_{}'.format(os.path.basename(out_prefix), metric))
 
-    # close the output files
+    # close all writers first, which creates the cloud optimized geotiffs
+    try:
+        for metric in metrics:
+            metric_dict[metric].close()
+    except Exception:
+        # remove the temporary files of the writers not closed yet
+        for metric in metrics:
+            metric_dict[metric].abort()
+        raise
+
     for metric in metrics:
-        # close rio opening
-        metric_dict[metric].close()
         # construct filename
         filename = '{}.{}.tif'.format(out_prefix, metric)
         return_code = h.check_out_tiff(filename)
@@ -284,10 +291,11 @@ def mt_metrics(stack, out_prefix, metrics, rescale_to_datatype=False,
             # remove all files and return
             for metric in metrics:
                 filename = '{}.{}.tif'.format(out_prefix, metric)
-                os.remove(filename)
-            
+                if os.path.exists(filename):
+                    os.remove(filename)
+
             return return_code
-        
+
     if return_code == 0:
         dirname = os.path.dirname(out_prefix)
         check_file = opj(dirname, '.{}.processed'.format(os.path.basename(out_prefix)))
@@ -8,92 +8,228 @@ from os.path import join as opj
 import glob
 import json
 import itertools
+import multiprocessing
 
-import gdal
-import geopandas as gpd
+import numpy as np
+import pandas as pd
 
 from ost.helpers import scihub, vector as vec 
 from ost.s1 import burst_to_ard
 from ost import Sentinel1_Scene as S1Scene
+from ost.s1.s1scene import burst_records_to_gdf
+from ost.s1 import burst_cache
 from ost.helpers import raster as ras
 from ost.multitemporal import common_extent
 from ost.multitemporal import common_ls_mask
 from ost.multitemporal import ard_to_ts
 from ost.multitemporal import timescan
 from ost.mosaic import mosaic
+from ost.mosaic import planner
 
 
-def burst_inventory(inventory_df, outfile, download_dir=os.getenv('HOME'),
-                    data_mount='/eodata', uname=None, pword=None):
-    '''Creates a Burst GeoDataFrame from an OST inventory file
+def _burst_records(argument_list):
+    '''Worker function that extracts the burst records of a local product
 
     Args:
+        argument_list (list): scene_id, download_dir, data_mount and the
+                              cached (checksum, records) entry of the scene
+                              (None if caching is disabled)
 
     Returns:
+        tuple: the scene_id, the checksum of the annotation files, the list
+               of burst records (None if the product is not stored locally)
+               and a flag if the records have been newly parsed
+
+    '''
+
+    scene_id, download_dir, data_mount, cached = argument_list
+
+    # read into S1scene class
+    scene = S1Scene(scene_id)
+    filepath = scene.get_path(download_dir, data_mount)
+    if not filepath:
+        return scene_id, None, None, False
+
+    checksum = None
+    if cached is not False:
+        checksum = burst_cache.annotation_checksum(filepath)
+        if cached and cached[0] == checksum:
+            return scene_id, checksum, cached[1], False
+
+    print(' INFO: Getting burst info from {}.'.format(scene.scene_id))
+    return scene_id, checksum, scene._annotation_records(filepath), True
+
 
+def cluster_anx_time(burst_gdf, tolerance=1, reference_bids=None):
+    '''Unifies the AnxTime of bursts that belong to the same burst id
+
+    The AnxTime of the same burst varies slightly between acquisitions.
+    The AnxTimes are therefore sorted per orbit direction, track and swath
+    and split into clusters wherever the gap between consecutive values
+    exceeds the tolerance. Each cluster gets the most frequent AnxTime of
+    its members (the smallest one in case of a tie). Optionally, the
+    clusters are snapped to the AnxTime of reference burst ids.
+
+    Args:
+        burst_gdf (GeoDataFrame): burst inventory with Direction, Track,
+                                  SwathID and AnxTime columns
+        tolerance (int): maximum gap of AnxTimes (in 1/10 s) within a cluster
+        reference_bids (list): burst ids to snap the clusters to
+
+    Returns:
+        numpy array: the unified AnxTime for each burst
 
     '''
-    # create column names for empty data frame
-    column_names = ['SceneID', 'Track', 'Direction', 'Date', 'SwathID',
-                    'AnxTime', 'BurstNr', 'geometry']
 
-    # crs for empty dataframe
-    crs = {'init': 'epsg:4326', 'no_defs': True}
-    # create empty dataframe
-    gdf_full = gpd.GeoDataFrame(columns=column_names, crs=crs)
-    # uname, pword = scihub.askScihubCreds()
+    if len(burst_gdf) == 0:
+        return burst_gdf.AnxTime.values
+
+    keys = (burst_gdf.Direction.astype(str).str[0] +
+            burst_gdf.Track.astype(str) + '_' +
+            burst_gdf.SwathID.astype(str)).values
+    anx_times = burst_gdf.AnxTime.astype('int64').values
+
+    # sort by key and AnxTime and split at key changes and gaps
+    order = np.lexsort((anx_times, keys))
+    sorted_keys, sorted_anx = keys[order], anx_times[order]
+    breaks = np.concatenate([[False], (
+        (sorted_keys[1:] != sorted_keys[:-1]) |
+        (np.diff(sorted_anx) > tolerance))])
+    clusters = np.cumsum(breaks)
+
+    # most frequent value per cluster, the smallest one in case of ties
+    counts = pd.DataFrame({'cluster': clusters, 'anx': sorted_anx}).groupby(
+        ['cluster', 'anx']).size().reset_index(name='count')
+    counts = counts.sort_values(
+        ['cluster', 'count', 'anx'], ascending=[True, False, True],
+        kind='mergesort').drop_duplicates('cluster')
+    representative = counts.anx.to_numpy(copy=True)
+
+    # snap to the reference burst ids
+    if reference_bids is not None:
+        reference = {}
+        for bid in set(reference_bids):
+            key, anx = bid.rsplit('_', 1)
+            reference.setdefault(key, []).append(int(anx))
+
+        cluster_keys = sorted_keys[np.searchsorted(clusters, counts.cluster)]
+        for i, key in enumerate(cluster_keys):
+            if key in reference:
+                ref = np.array(reference[key])
+                nearest = ref[np.argmin(np.abs(ref - representative[i]))]
+                if abs(nearest - representative[i]) <= tolerance:
+                    representative[i] = nearest
+
+    unified = np.empty_like(anx_times)
+    unified[order] = representative[clusters]
+    return unified
 
-    for scene_id in inventory_df.identifier:
 
-        # read into S1scene class
-        scene = S1Scene(scene_id)
+def burst_inventory(inventory_df, outfile, download_dir=os.getenv('HOME'),
+                    data_mount='/eodata', uname=None, pword=None,
+                    ncores=os.cpu_count(), cache_file=None,
+                    reference_bids=None):
+    '''Creates a Burst GeoDataFrame from an OST inventory file
 
-        print(' INFO: Getting burst info from {}.'.format(scene.scene_id))
-        
-        # get orbit direction
-        orbit_direction = inventory_df[
-            inventory_df.identifier == scene_id].orbitdirection.values[0]
+    The annotation files of locally available products are parsed
+    in parallel. Products that are not available locally are read
+    from scihub. If a cache file is given, burst records of products
+    that have been parsed before are taken from the cache.
 
-        filepath = scene.get_path(download_dir, data_mount)
-        if not filepath:
+    Args:
+        inventory_df (GeoDataFrame): an OST compliant Sentinel-1 inventory
+        outfile (str): path to the output burst inventory file
+        download_dir (str): directory of the downloaded products
+        data_mount (str): mount point of the DIAS data
+        uname (str): scihub username
+        pword (str): scihub password
+        ncores (int): number of parallel processes for local products
+        cache_file (str): path to the SQLite burst metadata cache
+        reference_bids (list): burst ids (e.g. of an earlier burst
+                               inventory) to which the AnxTimes are snapped
+
+    Returns:
+        GeoDataFrame: the burst inventory
+
+    '''
+
+    # get orbit direction per scene
+    directions = dict(zip(inventory_df.identifier,
+                          inventory_df.orbitdirection))
+
+    # get cached burst records
+    cache, cached = None, {}
+    if cache_file:
+        cache = burst_cache.BurstCache(cache_file)
+        cached = cache.get(inventory_df.identifier.unique())
+        print(' INFO: Found {} of {} scenes in the burst cache.'.format(
+            len(cached), len(directions)))
+
+    # parse local products in parallel
+    argument_list = [[scene_id, download_dir, data_mount,
+                      cached.get(scene_id) if cache else False]
+                     for scene_id in inventory_df.identifier]
+    if ncores > 1 and len(argument_list) > 1:
+        pool = multiprocessing.Pool(processes=ncores)
+        results = pool.map(_burst_records, argument_list)
+        pool.close()
+        pool.join()
+    else:
+        results = [_burst_records(args) for args in argument_list]
+
+    records, new_entries = [], []
+    for scene_id, checksum, scene_records, parsed in results:
+
+        if scene_records is None and scene_id in cached:
+            # product is not stored locally, but has been seen before
+            scene_records = cached[scene_id][1]
+
+        elif scene_records is None:
+            # read into S1scene class
+            scene = S1Scene(scene_id)
             print(' INFO: Retrieving burst info from scihub'
                   ' (need to download xml files)')
             if not uname and not pword:
                 uname, pword = scihub.ask_credentials()
-                
+
             opener = scihub.connect(uname=uname, pword=pword)
             if scene.scihub_online_status(opener) is False:
                 print(' INFO: Product needs to be online'
                       ' to create a burst database.')
                 print(' INFO: Download the product first and '
                       ' do the burst list from the local data.')
-            else:
-                single_gdf = scene._scihub_annotation_get(uname, pword)
-        elif filepath[-4:] == '.zip':
-            single_gdf = scene._zip_annotation_get(download_dir, data_mount)
-        elif filepath[-5:] == '.SAFE':
-            single_gdf = scene._safe_annotation_get(download_dir, data_mount)
-           
+                continue
 
-        # add orbit direction
-        single_gdf['Direction'] = orbit_direction
+            scene_records = [
+                (row.SceneID, int(row.Track), str(row.Date), row.SwathID,
+                 int(row.AnxTime), int(row.BurstNr), row.geometry.wkt)
+                for row in scene._scihub_annotation_get(
+                    uname, pword).itertuples()]
+            parsed = True
 
-        # append
-        gdf_full = gdf_full.append(single_gdf)
+        if parsed:
+            new_entries.append((scene_id, checksum, scene_records))
 
+        # add orbit direction
+        records.extend(record + (directions[scene_id], )
+                       for record in scene_records)
 
-    gdf_full = gdf_full.reset_index(drop=True)
+    # update the cache with newly parsed scenes
+    if cache:
+        cache.update(new_entries)
+        cache.close()
 
-    for i in gdf_full['AnxTime'].unique():
+    # build the GeoDataFrame once
+    gdf_full = burst_records_to_gdf(
+        [record[:-1] for record in records],
+        crs={'init': 'epsg:4326', 'no_defs': True})
+    gdf_full['Direction'] = [record[-1] for record in records]
 
-        # get similar burst times
-        idx = gdf_full.index[(gdf_full.AnxTime >= i - 1) &
-                             (gdf_full.AnxTime <= i + 1) &
-                             (gdf_full.AnxTime != i)].unique().values
+    gdf_full = gdf_full.reset_index(drop=True)
 
-        # reset all to first value
-        for j in idx:
-            gdf_full.at[j, 'AnxTime'] = i
+    # unify similar burst times
+    gdf_full['AnxTime'] = cluster_anx_time(
+        gdf_full, reference_bids=reference_bids)
 
     # create the acrual burst id
     gdf_full['bid'] = gdf_full.Direction.str[0] + \
@@ -121,20 +257,13 @@ def refine_burst_inventory(aoi, burst_gdf, outfile, coverages=None):
 
     '''
 
-    # turn aoi into a geodataframe
-    aoi_gdf = gpd.GeoDataFrame(vec.wkt_to_gdf(aoi).buffer(0.05))
-    aoi_gdf.columns = ['geometry']
+    # turn aoi into a prepared geometry
+    aoi_coverage = vec.AoiCoverage(vec.wkt_to_gdf(aoi).buffer(0.05))
     # get columns of input dataframe for later return function
     cols = burst_gdf.columns
 
     # 1) get only intersecting footprints (double, since we do this before)
-    burst_gdf = gpd.sjoin(burst_gdf, aoi_gdf, how='inner', op='intersects')
-
-    # if aoi  gdf has an id field we need to rename the changed id_left field
-    if 'id_left' in burst_gdf.columns.tolist():
-        # rename id_left to id
-        burst_gdf.columns = (['id' if x == 'id_left' else x
-                              for x in burst_gdf.columns.tolist()])
+    burst_gdf = burst_gdf[aoi_coverage.intersects(burst_gdf.geometry)].copy()
     
     # remove duplicates
     burst_gdf.drop_duplicates(['SceneID', 'Date', 'bid'], inplace=True)
@@ -157,25 +286,25 @@ def refine_burst_inventory(aoi, burst_gdf, outfile, coverages=None):
     return burst_gdf[cols]
 
 
-def burst_to_ard_batch(burst_inventory, download_dir, processing_dir,
-                       temp_dir, proc_file, data_mount='/eodata', 
-                       exec_file=None,ncores=os.cpu_count()):
-    '''Handles the batch processing of a OST complinat burst inventory file
+def burst_tasks(burst_inventory, processing_dir, ard):
+    '''Creates the single burst ARD processing tasks of a burst inventory
+
+    Each task covers one burst at one date. Apart from the last date of
+    the time-series, the burst of the next date is used as slave for the
+    coherence calculation.
 
     Args:
-        burst_inventory (GeoDataFrame):
-        download_dir (str):
-        processing_dir (str):
-        temp_dir (str):
-        ard_parameters (dict):
+        burst_inventory (GeoDataFrame): an OST compliant burst inventory
+        processing_dir (str): the processing directory of the project
+        ard (dict): the single ARD parameters
 
-    '''
+    Returns:
+        list: dictionaries with the parameters of each task, including
+              the scene identifiers of the master and slave products
 
-    # load ard parameters
-    with open(proc_file, 'r') as ard_file:
-        ard_params = json.load(ard_file)['processing parameters']
-        ard = ard_params['single ARD']
+    '''
 
+    tasks = []
     for burst in burst_inventory.bid.unique():      # ***
 
         # create a list of dates over which we loop
@@ -185,11 +314,8 @@ def burst_to_ard_batch(burst_inventory, download_dir, processing_dir,
         # loop through dates
         for idx, date in enumerate(dates):      # ******
 
-            print(' INFO: Entering burst {} at date {}.'.format(burst, date))
             # get master date
             master_date = dates[idx]
-            # we set this for handling the end of the time-series
-            end = False
             coherence = ard['coherence']
 
             # try to get slave date
@@ -197,8 +323,6 @@ def burst_to_ard_batch(burst_inventory, download_dir, processing_dir,
                 slave_date = dates[idx + 1]    # last burst in timeseries?
             except IndexError:
                 end = True
-                print(' INFO: Reached the end of the time-series.'
-                      ' Therefore no coherence calculation is done.')
                 if ard['product type'] == 'Coherence_only':
                     continue
             else:
@@ -209,105 +333,121 @@ def burst_to_ard_batch(burst_inventory, download_dir, processing_dir,
                 (burst_inventory.Date == master_date) &
                 (burst_inventory.bid == burst)]
 
-            master_scene = S1Scene(master_burst.SceneID.values[0])
-
-            # get path to file
-            master_file = master_scene.get_path(download_dir, data_mount)
-            # get subswath
-            subswath = master_burst.SwathID.values[0]
-            # get burst number in file
-            master_burst_nr = master_burst.BurstNr.values[0]
-            # create a fileId
-            master_id = '{}_{}'.format(master_date, master_burst.bid.values[0])
-
-            # create out folder
-            out_dir = opj(processing_dir, burst, date)
-            os.makedirs(out_dir, exist_ok=True)
-
-            # check if already processed
-            if os.path.isfile(opj(out_dir, '.processed')):
-                print(' INFO: Burst {} from {} already processed'.format(
-                      burst, date))
+            task = dict(
+                burst=burst, date=date, end=end,
+                master_scene=master_burst.SceneID.values[0],
+                # get subswath
+                subswath=master_burst.SwathID.values[0],
+                # get burst number in file
+                master_burst_nr=master_burst.BurstNr.values[0],
+                # create a fileId
+                master_id='{}_{}'.format(master_date,
+                                         master_burst.bid.values[0]),
+                out_dir=opj(processing_dir, burst, date),
+                coherence=coherence,
+                slave_scene=None, slave_burst_nr=None, slave_id=None)
+
+            if end is True:
+                task['coherence'] = False
             else:
-                
-                if end is True:
-                    coherence = False
-                    slave_file, slave_burst_nr, slave_id = None, None, None
-
-                else:
-                    # read slave burst
-                    slave_burst = burst_inventory[
-                            (burst_inventory.Date == slave_date) &
-                            (burst_inventory.bid == burst)]
-    
-                    slave_scene = S1Scene(slave_burst.SceneID.values[0])
-    
-                    # get path to slave file
-                    slave_file = slave_scene.get_path(download_dir,
-                                                      data_mount)
-    
+                # read slave burst
+                slave_burst = burst_inventory[
+                        (burst_inventory.Date == slave_date) &
+                        (burst_inventory.bid == burst)]
+
+                task.update(
+                    slave_scene=slave_burst.SceneID.values[0],
                     # burst number in slave file (subswath is same)
-                    slave_burst_nr = slave_burst.BurstNr.values[0]
-    
+                    slave_burst_nr=slave_burst.BurstNr.values[0],
                     # outfile name
-                    slave_id = '{}_{}'.format(slave_date,
-                                              slave_burst.bid.values[0])
-    
-                # just write command into a textfile
-                if exec_file:
-                    # remove older files in case they exist - need a better way than this as we would like to append to
-                    # a text file which can then be read line by line
-                    #if os.path.isfile(exec_file):
-                    #    os.remove(exec_file)
-                    # construct command arguments
-                    '''args = ('-m {} -ms {} -mn {} -mi {} -p {} -o {} -t {} '
-                            '-s {} -sn {} -si {} -c {} -r {} -nc {}').format(
-                                  master_file, subswath, master_burst_nr, master_id, 
-                                  proc_file, out_dir, temp_dir, 
-                                  slave_file, slave_burst_nr, slave_id, 
-                                  coherence, False, ncores)                                
-                    
-                    # get path to graph
-                    rootpath = imp.find_module('ost')[1]
-                    python_exe = opj(rootpath, 's1', 'burst_to_ard.py')
-                    with open(exec_file, 'a') as exe:
-                        exe.write('{} {} \n'.format(python_exe, args))'''
-
-                    parallel_temp_dir=temp_dir+'/temp_'+burst+'_'+date
-                    os.makedirs(parallel_temp_dir, exist_ok=True)
-
-                    args = ('{};{};{};{};{};{};{};{};{};{};{};{};{}').format(
-                                  master_file, subswath, master_burst_nr, master_id,
-                                  proc_file, out_dir, parallel_temp_dir,
-                                  slave_file, slave_burst_nr, slave_id,
-                                  coherence, False, ncores)
-
-                    # get path to graph
-                    #rootpath = imp.find_module('ost')[1]
-                    #python_exe = opj(rootpath, 's1', 'burst_to_ard.py')
-                    exec_burst_to_ard=exec_file+'_burst_to_ard.txt'
-                    with open(exec_burst_to_ard, 'a') as exe:
-                        exe.write('{}\n'.format(args))
-
-                
-                # run the command      
-                else:
-                    # run routine
-                    burst_to_ard.burst_to_ard(
-                         master_file=master_file,
-                         swath=subswath,
-                         master_burst_nr=master_burst_nr,
-                         master_burst_id=master_id,
-                         proc_file=proc_file,
-                         out_dir=out_dir,
-                         temp_dir=temp_dir,
-                         slave_file=slave_file,
-                         slave_burst_nr=slave_burst_nr,
-                         slave_burst_id=slave_id,
-                         coherence=coherence,
-                         remove_slave_import=False)
-            
-            
+                    slave_id='{}_{}'.format(slave_date,
+                                            slave_burst.bid.values[0]))
+
+            tasks.append(task)
+
+    return tasks
+
+
+def burst_to_ard_batch(burst_inventory, download_dir, processing_dir,
+                       temp_dir, proc_file, data_mount='/eodata', 
+                       exec_file=None,ncores=os.cpu_count()):
+    '''Handles the batch processing of a OST complinat burst inventory file
+
+    Args:
+        burst_inventory (GeoDataFrame):
+        download_dir (str):
+        processing_dir (str):
+        temp_dir (str):
+        ard_parameters (dict):
+
+    '''
+
+    # load ard parameters
+    with open(proc_file, 'r') as ard_file:
+        ard_params = json.load(ard_file)['processing parameters']
+        ard = ard_params['single ARD']
+
+    for task in burst_tasks(burst_inventory, processing_dir, ard):
+
+        burst, date = task['burst'], task['date']
+        print(' INFO: Entering burst {} at date {}.'.format(burst, date))
+        if task['end']:
+            print(' INFO: Reached the end of the time-series.'
+                  ' Therefore no coherence calculation is done.')
+
+        # get path to file
+        master_file = S1Scene(task['master_scene']).get_path(
+            download_dir, data_mount)
+
+        # create out folder
+        out_dir = task['out_dir']
+        os.makedirs(out_dir, exist_ok=True)
+
+        # check if already processed
+        if os.path.isfile(opj(out_dir, '.processed')):
+            print(' INFO: Burst {} from {} already processed'.format(
+                  burst, date))
+            continue
+
+        # get path to slave file
+        slave_file = S1Scene(task['slave_scene']).get_path(
+            download_dir, data_mount) if task['slave_scene'] else None
+
+        # just write command into a textfile
+        if exec_file:
+
+            parallel_temp_dir=temp_dir+'/temp_'+burst+'_'+date
+            os.makedirs(parallel_temp_dir, exist_ok=True)
+
+            args = ('{};{};{};{};{};{};{};{};{};{};{};{};{}').format(
+                          master_file, task['subswath'],
+                          task['master_burst_nr'], task['master_id'],
+                          proc_file, out_dir, parallel_temp_dir,
+                          slave_file, task['slave_burst_nr'],
+                          task['slave_id'], task['coherence'], False, ncores)
+
+            exec_burst_to_ard=exec_file+'_burst_to_ard.txt'
+            with open(exec_burst_to_ard, 'a') as exe:
+                exe.write('{}\n'.format(args))
+
+        # run the command
+        else:
+            # run routine
+            burst_to_ard.burst_to_ard(
+                 master_file=master_file,
+                 swath=task['subswath'],
+                 master_burst_nr=task['master_burst_nr'],
+                 master_burst_id=task['master_id'],
+                 proc_file=proc_file,
+                 out_dir=out_dir,
+                 temp_dir=temp_dir,
+                 slave_file=slave_file,
+                 slave_burst_nr=task['slave_burst_nr'],
+                 slave_burst_id=task['slave_id'],
+                 coherence=task['coherence'],
+                 remove_slave_import=False)
+
+
 def burst_ards_to_timeseries(burst_inventory, processing_dir, temp_dir,
                              proc_file, exec_file=None, ncores=os.cpu_count()):
 
@@ -316,8 +456,11 @@ def burst_ards_to_timeseries(burst_inventory, processing_dir, temp_dir,
         ard_params = json.load(ard_file)['processing parameters']
         ard = ard_params['single ARD']
         ard_mt = ard_params['single ARD']
+        approximate = ard_params['time-series ARD'].get(
+            'approximate extent', False)
         
     # create extents
+    extent_list = []
     for burst in burst_inventory.bid.unique():      # ***
 
         # get the burst directory
@@ -351,7 +494,11 @@ def burst_ards_to_timeseries(burst_inventory, processing_dir, temp_dir,
         
         else:
             print(' INFO: Creating common extent mask for burst {}'.format(burst))
-            common_extent.mt_extent(list_of_bursts, extent, temp_dir, -0.0018)
+            extent_list.append((list_of_bursts, extent))
+
+    # the extents of all bursts are created in parallel
+    common_extent.mt_extents(extent_list, temp_dir, -0.0018, ncores,
+                             approximate)
       
     if ard['create ls mask'] or ard['apply ls mask']: 
         
@@ -388,7 +535,8 @@ def burst_ards_to_timeseries(burst_inventory, processing_dir, temp_dir,
                 print(' INFO: Creating common Layover/Shadow mask'
                     ' for burst {}'.format(burst))
                 common_ls_mask.mt_layover(list_of_layover, out_ls, temp_dir,
-                                          extent, ard_mt['apply ls mask'])
+                                          extent, ard_mt['apply ls mask'],
+                                          approximate, ncores)
         
     # create timeseries
     for burst in burst_inventory.bid.unique():
@@ -563,7 +711,8 @@ def timeseries_to_timescan(burst_inventory, processing_dir, temp_dir,
 
 
 def mosaic_timeseries(burst_inventory, processing_dir, temp_dir, 
-                      cut_to_aoi=False, exec_file=None, ncores=os.cpu_count()):
+                      cut_to_aoi=False, exec_file=None, ncores=os.cpu_count(),
+                      memory=None):
 
     print(' ------------------------------------')
     print(' INFO: Mosaicking Time-series layers.')
@@ -577,96 +726,46 @@ def mosaic_timeseries(burst_inventory, processing_dir, temp_dir,
     product_list = ['bs.HH', 'bs.VV', 'bs.HV', 'bs.VH',
                     'coh.VV', 'coh.VH', 'coh.HH', 'coh.HV', 
                     'pol.Entropy', 'pol.Anisotropy', 'pol.Alpha']
-    
-    # now we loop through each timestep and product
-    for product in product_list:  # ****
-        
-        bursts = burst_inventory.bid.unique()
-        nr_of_ts = len(glob.glob(opj(
-                processing_dir, 
-                bursts[0], 
-                'Timeseries', 
-                '*.{}.tif'.format(product)))
-        )
-    
-        if not nr_of_ts > 1:
-            continue
-        
-        outfiles = []
-        for i in range(1, nr_of_ts + 1):
 
-            filelist = glob.glob(opj(
-                    processing_dir, '*', 'Timeseries', '{:02d}.*{}.tif'
-                    .format(i, product)))
-            filelist = [file for file in filelist if 'Mosaic' not in file]
-            
+    # index all burst layers once and plan the mosaics of each time step
+    plan = planner.plan_timeseries(
+        planner.index_timeseries(processing_dir), ts_dir,
+        {product: opj(ts_dir, '{}.Timeseries.vrt'.format(product))
+         for product in product_list},
+        min_steps=2)
 
-            print(' INFO: Creating timeseries mosaic {:02d} for {}.'.format(
-                    i, product))
+    if not exec_file:
+        planner.run_timeseries(plan, temp_dir, cut_to_aoi, ncores, memory)
+        return
 
-            # create dates for timseries naming
-            datelist = []
-            for file in filelist:
-                if '.coh.' in file:
-                    datelist.append('{}_{}'.format(
-                        os.path.basename(file).split('.')[2],
-                        os.path.basename(file).split('.')[1]))
-                else:
-                    datelist.append(os.path.basename(file).split('.')[1])
-                
-            start, end = sorted(datelist)[0], sorted(datelist)[-1]
-            filelist = ' '.join(filelist)
-            
-            if start == end:
-                outfile = opj(ts_dir, '{:02d}.{}.{}.tif'.format(i, start, product))
-                
-            else:
-                outfile = opj(ts_dir, '{:02d}.{}-{}.{}.tif'.format(i, start, end, product))
-            
-            check_file = opj(
-                os.path.dirname(outfile),
-                '.{}.processed'.format(os.path.basename(outfile)[:-4])
-            )
-            
-            outfiles.append(outfile)
-            
-            if os.path.isfile(check_file):
-                print( 'INFO: Mosaic layer {} already'
-                       ' processed.'.format(outfile))
+    if cut_to_aoi == False:
+        cut_to_aoi = 'False'
+
+    for product in plan:
+        outfiles = []
+        for task in product['steps']:
+            outfiles.append(task['outfile'])
+            if os.path.isfile(task['check_file']):
+                print(' INFO: Mosaic layer {} already processed.'.format(
+                    os.path.basename(task['outfile'])))
                 continue
-            if exec_file:
-                filelist=filelist.split(" ")
-                if cut_to_aoi == False:
-                    cut_to_aoi = 'False'
-                parallel_temp_dir = temp_dir + '/temp_' + product + '_' + str(i) + '_mosaic_timeseries'
-                os.makedirs(parallel_temp_dir, exist_ok=True)
-                args = ('{};{};{};{};{}').format(
-                    filelist, outfile, parallel_temp_dir, cut_to_aoi, ncores)
 
-                # get path to graph
-                # rootpath = imp.find_module('ost')[1]
-                # python_exe = opj(rootpath, 'mosaic', 'mosaic.py')
-                exec_mosaic_timeseries = exec_file + '_mosaic_timeseries.txt'
-                with open(exec_mosaic_timeseries, 'a') as exe:
-                    exe.write('{}\n'.format(args))
-            else:
-                # the command
-                print(' INFO: Mosaicking layer {}.'.format(os.path.basename(outfile)))
-                mosaic.mosaic(filelist, outfile, temp_dir, cut_to_aoi)
+            parallel_temp_dir = opj(temp_dir, 'temp_{}_{}_mosaic_timeseries'
+                                    .format(product['product'], task['step']))
+            os.makedirs(parallel_temp_dir, exist_ok=True)
+            args = ('{};{};{};{};{}').format(
+                task['files'], task['outfile'], parallel_temp_dir,
+                cut_to_aoi, ncores)
 
-        # create vrt
-        if not exec_file:
-            # create final vrt
-            vrt_options = gdal.BuildVRTOptions(srcNodata=0, separate=True)
-            gdal.BuildVRT(opj(ts_dir, '{}.Timeseries.vrt'.format(product)),
-                          outfiles,
-                          options=vrt_options)
-        else:
-            # create vrt exec file
+            exec_mosaic_timeseries = exec_file + '_mosaic_timeseries.txt'
+            with open(exec_mosaic_timeseries, 'a') as exe:
+                exe.write('{}\n'.format(args))
 
-            exec_mosaic_ts_vrt = exec_file + '_mosaic_ts_vrt.txt'
-            with open(exec_mosaic_ts_vrt, 'a') as exe:
-                exe.write('{};{};{}\n'.format(ts_dir, product, outfiles))
+        # create vrt exec file
+        exec_mosaic_ts_vrt = exec_file + '_mosaic_ts_vrt.txt'
+        with open(exec_mosaic_ts_vrt, 'a') as exe:
+            exe.write('{};{};{}\n'.format(ts_dir, product['product'],
+                                          outfiles))
 
 
 def mosaic_timescan(burst_inventory, processing_dir, temp_dir, proc_file,
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+'''This module holds a persistent cache for burst metadata
+
+The burst records extracted from the annotation files of a Sentinel-1 SLC
+product are stored in a SQLite database, keyed by the scene identifier and
+a checksum of the annotation files. This way, a burst inventory only needs
+to parse the annotation files of products that have not been seen before.
+
+'''
+
+import os
+import hashlib
+import sqlite3
+
+from ost.helpers import safe
+
+
+def annotation_checksum(filepath):
+    '''Creates a checksum of the annotation files of a Sentinel-1 product
+
+    For zip archives, the checksum is calculated from the names and
+    CRCs stored in the central directory of the archive, so no annotation
+    file needs to be decompressed (or downloaded, for remote archives).
+    For SAFE folders, the content of the annotation files is hashed.
+
+    Args:
+        filepath (str): path to the zip archive or SAFE folder
+
+    Returns:
+        str: the hex digest of the checksum
+
+    '''
+
+    md5 = hashlib.md5()
+    with safe.open_safe(filepath) as product:
+        for anno_file in product.glob('annotation/s*.xml'):
+            crc = product.crc(anno_file)
+            if crc is not None:
+                md5.update('{};{}'.format(
+                    os.path.basename(anno_file), crc).encode())
+            else:
+                md5.update(os.path.basename(anno_file).encode())
+                md5.update(product.read(anno_file))
+
+    return md5.hexdigest()
+
+
+class BurstCache():
+    '''A SQLite based cache of the burst records of Sentinel-1 products
+
+    Burst records are tuples of (SceneID, Track, Date, SwathID, AnxTime,
+    BurstNr, WKT geometry), as returned by
+    Sentinel1_Scene._annotation_records.
+
+    Args:
+        cache_file (str): path to the SQLite database file
+
+    '''
+
+    def __init__(self, cache_file):
+
+        self.cache_file = cache_file
+        self.connection = sqlite3.connect(cache_file)
+        self.connection.executescript('''
+            CREATE TABLE IF NOT EXISTS scenes (
+                scene_id TEXT PRIMARY KEY,
+                checksum TEXT
+            );
+            CREATE TABLE IF NOT EXISTS bursts (
+                scene_id TEXT,
+                track INTEGER,
+                date TEXT,
+                swath TEXT,
+                anx_time INTEGER,
+                burst_nr INTEGER,
+                geometry TEXT,
+                PRIMARY KEY (scene_id, swath, burst_nr)
+            );
+        ''')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def get(self, scene_ids):
+        '''Retrieves the cached checksums and burst records of scenes
+
+        Args:
+            scene_ids (list): the scene identifiers
+
+        Returns:
+            dict: scene identifier as key, (checksum, records) as value
+                  for all scenes found in the cache
+
+        '''
+
+        scene_ids = list(scene_ids)
+        cached = {}
+
+        # chunk the query to stay below SQLite's variable limit
+        for i in range(0, len(scene_ids), 500):
+            chunk = scene_ids[i:i + 500]
+            marks = ','.join('?' * len(chunk))
+
+            for scene_id, checksum in self.connection.execute(
+                    'SELECT scene_id, checksum FROM scenes '
+                    'WHERE scene_id IN ({})'.format(marks), chunk):
+                cached[scene_id] = (checksum, [])
+
+            for row in self.connection.execute(
+                    'SELECT scene_id, track, date, swath, anx_time, '
+                    'burst_nr, geometry FROM bursts '
+                    'WHERE scene_id IN ({}) ORDER BY scene_id, rowid'
+                    .format(marks), chunk):
+                cached[row[0]][1].append(tuple(row))
+
+        return cached
+
+    def update(self, entries):
+        '''Stores the burst records of scenes, replacing older entries
+
+        Args:
+            entries (list): tuples of (scene_id, checksum, records), where
+                            the checksum can be None if the annotation
+                            files were retrieved remotely
+
+        '''
+
+        with self.connection:
+            for scene_id, checksum, records in entries:
+                self.connection.execute(
+                    'DELETE FROM bursts WHERE scene_id = ?', (scene_id, ))
+                self.connection.execute(
+                    'INSERT OR REPLACE INTO scenes VALUES (?, ?)',
+                    (scene_id, checksum))
+                self.connection.executemany(
+                    'INSERT OR REPLACE INTO bursts '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)', records)
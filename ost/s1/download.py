@@ -9,11 +9,15 @@ vertex as well as PEPS from CNES.
 import os
 from os.path import join as opj
 import glob
+import json
+import shutil
 import getpass
+import multiprocessing
 
 # import OST libs
 from ost.s1.s1scene import Sentinel1_Scene as S1Scene
 from ost.helpers import scihub, peps, asf, onda, asf_wget
+from ost.helpers import download_engine
 
 # script infos
 __author__ = 'Andreas Vollrath'
@@ -26,93 +30,238 @@ __email__ = ''
 __status__ = 'Production'
 
 
-def restore_download_dir(input_directory, download_dir):
+def _transfer(source, destination, link=False):
+    '''Hardlinks or moves a file atomically, copying across file systems'''
+
+    temp_file = '{}.tmp'.format(destination)
+    try:
+        if link:
+            os.link(source, temp_file)
+        else:
+            os.rename(source, destination)
+            return
+    except OSError:
+        shutil.copy2(source, temp_file)
+        if not link:
+            os.replace(temp_file, destination)
+            os.remove(source)
+            return
+
+    os.replace(temp_file, destination)
+
+
+def _restore_product(argument_list):
+    '''Worker that checks a product and puts it into the OST structure
+
+    Args:
+        argument_list (list): path to the zip file, the download directory,
+                              the full check and the hardlink flags
+
+    Returns:
+        tuple: the path to the zip file and its status (restored, exists,
+               corrupt or invalid)
+
+    '''
+
+    from ost.helpers import helpers as h
+
+    scene_in, download_dir, full_check, link = argument_list
+
+    # only files named by a Sentinel-1 scene identifier are restored
+    try:
+        scene = S1Scene(os.path.basename(scene_in)[:-4])
+    except ValueError:
+        return scene_in, 'invalid'
+
+    # create download path and file
+    filepath = scene._download_path(download_dir, True)
+    if os.path.exists('{}.downloaded'.format(filepath)):
+        return scene_in, 'exists'
+
+    # by default only the central directory and the sizes are checked,
+    # the full check decompresses all members
+    if full_check:
+        damaged = h.check_zipfile_crc(scene_in)
+    else:
+        damaged = h.check_zipfile_structure(scene_in)
+
+    if damaged:
+        return scene_in, 'corrupt'
+
+    _transfer(scene_in, filepath, link)
+    with open('{}.downloaded'.format(filepath), 'w') as file:
+        file.write('successfully restored \n')
+
+    return scene_in, 'restored'
+
+
+def restore_download_dir(input_directory, download_dir, full_check=False,
+                         link=False, ncores=os.cpu_count(),
+                         report_file=None):
     '''Function to create the OST download directory structure
 
     In case data is already downloaded to a single folder, this function can
     be used to create a OST compliant structure of the download directory.
+    The products are checked and moved (or hardlinked) in parallel.
 
     Args:
         input_directory: the directory, where the dwonloaded files are located
         download_dir: the high-level directory compliant with OST
+        full_check (bool): check the CRC of all members of the archives
+                           instead of their central directory and sizes only
+        link (bool): hardlink the files instead of moving them
+        ncores (int): number of parallel checks
+        report_file (str): path of a JSON file for the summary report
+
+    Returns:
+        dict: the zip files per status (restored, exists, corrupt, invalid)
 
     '''
-    
-    from ost.helpers import helpers as h
-    
-    for scene_in in glob.glob(opj(input_directory, '*zip')):
 
-        # get scene
-        scene = S1Scene(os.path.basename(scene_in)[:-4])
+    files = sorted(glob.glob(opj(input_directory, '*zip')))
+    print(' INFO: Checking and restoring {} products.'.format(len(files)))
 
-        # create download path and file
-        filepath = scene._download_path(download_dir, True)
-
-        # check zipfile
-        print(' INFO: Checking zip file {} for inconsistency.'.format(scene_in))
-        zip_test = h.check_zipfile(scene_in)
-        
-        if not zip_test:
-            print(' INFO: Passed')
-            # move file
-            os.rename(scene_in, filepath)
-        
-            # add downloaded (should be zip checked in future)
-            f=open(filepath+".downloaded","w+")
-            f.close()
-        else:
-            print(' INFO: File {} is corrupted and will not be moved.')
+    argument_list = [[file, download_dir, full_check, link] for file in files]
+    with multiprocessing.Pool(processes=ncores) as pool:
+        results = pool.map(_restore_product, argument_list, chunksize=1)
 
+    report = {'restored': [], 'exists': [], 'corrupt': [], 'invalid': []}
+    for scene_in, status in results:
+        report[status].append(scene_in)
 
-def download_sentinel1(inventory_df, download_dir, mirror=None, concurrent=2,
-                       uname=None, pword=None):
-    '''Main function to download Sentinel-1 data
+    print(' INFO: {} products restored, {} already in place.'.format(
+        len(report['restored']), len(report['exists'])))
+    if report['invalid']:
+        print(' WARNING: {} files are not Sentinel-1 products.'.format(
+            len(report['invalid'])))
+    if report['corrupt']:
+        print(' WARNING: {} files are corrupted and have not been moved:'
+              .format(len(report['corrupt'])))
+        for scene_in in report['corrupt']:
+            print('          {}'.format(scene_in))
 
-    This is an interactive function
+    if report_file:
+        with open(report_file, 'w') as file:
+            json.dump(report, file, indent=1)
 
-    '''
+    return report
 
-    if not mirror:
-        print(' Select the server from where you want to download:')
-        print(' (1) Copernicus Apihub (ESA, rolling archive)')
-        print(' (2) Alaska Satellite Facility (NASA, full archive)')
-        print(' (3) PEPS (CNES, 1 year rolling archive)')
-        print(' (4) ONDA DIAS (ONDA DIAS full archive for SLC - or GRD from 30 June 2019)')
-        print(' (5) Alaska Satellite Facility (using WGET - unstable - use only if 2 does not work)')
-        mirror = input(' Type 1, 2, 3, 4 or 5: ')
 
-    if not uname:
-        print(' Please provide username for the selected server')
-        uname = input(' Username:')
+# mirror adapters by the number used in download_sentinel1
+MIRRORS = {1: scihub.ScihubMirror, 2: asf.AsfMirror, 3: peps.PepsMirror,
+           4: onda.OndaMirror, 5: asf_wget.WgetMirror}
 
-    if not pword:
-        print(' Please provide password for the selected server')
-        pword = getpass.getpass(' Password:')
 
-    # check if uname and pwrod are correct
-    if int(mirror) == 1:
+def _check_connection(mirror, uname, pword):
+
+    if mirror == 1:
         error_code = scihub.check_connection(uname, pword)
-    elif int(mirror) == 2:
+    elif mirror == 2:
         error_code = asf.check_connection(uname, pword)
-
-        if concurrent > 10:
-            print(' INFO: Maximum allowed parallel downloads \
-                  from Earthdata are 10. Setting concurrent accordingly.')
-            concurrent = 10
-    
-    elif int(mirror) == 3:
+    elif mirror == 3:
         error_code = peps.check_connection(uname, pword)
-    elif int(mirror) == 4:
+    elif mirror == 4:
         error_code = onda.check_connection(uname, pword)
-    elif int(mirror) == 5:
+    elif mirror == 5:
         error_code = asf_wget.check_connection(uname, pword)
 
-        
     if error_code == 401:
         raise ValueError(' ERROR: Username/Password are incorrect')
     elif error_code != 200:
         raise ValueError(' ERROR: Some connection error. Error code {}.'.format(error_code))
-    
+
+
+def _ask_credentials(mirror, uname, pword):
+
+    # credentials can be given per mirror as dictionaries
+    if isinstance(uname, dict):
+        uname = uname.get(mirror)
+    if isinstance(pword, dict):
+        pword = pword.get(mirror)
+
+    if not uname:
+        print(' Please provide username for the selected server')
+        uname = input(' Username:')
+
+    if not pword:
+        print(' Please provide password for the selected server')
+        pword = getpass.getpass(' Password:')
+
+    return uname, pword
+
+
+def _select_mirrors(mirror=None):
+
+    if not mirror:
+        print(' Select the server from where you want to download:')
+        print(' (1) Copernicus Apihub (ESA, rolling archive)')
+        print(' (2) Alaska Satellite Facility (NASA, full archive)')
+        print(' (3) PEPS (CNES, 1 year rolling archive)')
+        print(' (4) ONDA DIAS (ONDA DIAS full archive for SLC - or GRD from 30 June 2019)')
+        print(' (5) Alaska Satellite Facility (using WGET - unstable - use only if 2 does not work)')
+        print(' Several servers can be combined, e.g. 1,2,3')
+        mirror = input(' Type 1, 2, 3, 4 or 5: ')
+
+    if isinstance(mirror, (list, tuple)):
+        return [int(nr) for nr in mirror]
+
+    return [int(nr) for nr in str(mirror).split(',')]
+
+
+def ask_mirror_and_credentials(mirror=None, uname=None, pword=None):
+    '''Asks for the mirror(s) and credentials once for repeated downloads
+
+    Returns:
+        tuple: the list of mirror numbers and dictionaries of the usernames
+               and passwords per mirror, as accepted by download_sentinel1
+
+    '''
+
+    mirrors = _select_mirrors(mirror)
+    unames, pwords = {}, {}
+    for nr in mirrors:
+        unames[nr], pwords[nr] = _ask_credentials(nr, uname, pword)
+
+    return mirrors, unames, pwords
+
+
+def download_sentinel1(inventory_df, download_dir, mirror=None, concurrent=2,
+                       uname=None, pword=None):
+    '''Main function to download Sentinel-1 data
+
+    This is an interactive function. If more than one mirror is selected
+    (e.g. '1,2,3' or [1, 2, 3]), the availability of each scene is checked
+    on all mirrors and each scene is downloaded from the fastest available
+    one. In this case, uname and pword can be dictionaries with the mirror
+    number as key.
+
+    '''
+
+    mirrors = _select_mirrors(mirror)
+
+    # download from the fastest available mirror
+    if len(mirrors) > 1:
+        adapters = []
+        for nr in mirrors:
+            print(' INFO: Credentials for mirror {}.'.format(nr))
+            mirror_uname, mirror_pword = _ask_credentials(nr, uname, pword)
+            _check_connection(nr, mirror_uname, mirror_pword)
+            adapters.append(MIRRORS[nr](mirror_uname, mirror_pword))
+
+        download_engine.multi_mirror_download(
+            inventory_df, download_dir, adapters, concurrent)
+        return
+
+    mirror = mirrors[0]
+    uname, pword = _ask_credentials(mirror, uname, pword)
+
+    # check if uname and pwrod are correct
+    _check_connection(mirror, uname, pword)
+    if mirror == 2 and concurrent > 10:
+        print(' INFO: Maximum allowed parallel downloads \
+              from Earthdata are 10. Setting concurrent accordingly.')
+        concurrent = 10
+
     # download in parallel
     if int(mirror) == 1:
         scihub.batch_download(inventory_df, download_dir,
@@ -128,4 +277,4 @@ def download_sentinel1(inventory_df, download_dir, mirror=None, concurrent=2,
                             uname, pword, concurrent)
     elif int(mirror) == 5:    # ASF WGET
         asf_wget.batch_download(inventory_df, download_dir,
-                                uname, pword, concurrent)
\ No newline at end of file
+                                uname, pword, concurrent)
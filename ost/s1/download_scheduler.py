@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+'''This module schedules downloads within a disk budget
+
+The products of an inventory are downloaded in processing order (by
+acquisition date and track), in batches that fit into the free space of
+the download directory or a fixed budget. Optionally, the raw products
+are deleted as soon as all ARD products that depend on them are
+processed, so long time-series can be processed on a fixed scratch
+volume.
+
+'''
+
+import os
+import time
+import shutil
+
+from ost import Sentinel1_Scene as S1Scene
+
+# typical product sizes (in GB) if the inventory does not provide them
+DEFAULT_SIZES = {'SLC': 4.5, 'GRD': 1.0}
+
+_UNITS = {'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3, 'TB': 1024 ** 4}
+
+
+def product_size(size, product_type='SLC'):
+    '''Converts the size of an inventory entry into bytes
+
+    Args:
+        size (str): the size column of the inventory (e.g. '4.37 GB')
+        product_type (str): product type for the default size
+
+    Returns:
+        int: the size in bytes
+
+    '''
+
+    try:
+        value, unit = str(size).split()
+        return int(float(value) * _UNITS[unit.upper()])
+    except (ValueError, KeyError):
+        return int(DEFAULT_SIZES.get(product_type, 4.5) * _UNITS['GB'])
+
+
+class DownloadScheduler():
+    '''Downloads an inventory in processing order within a disk budget
+
+    Args:
+        download_dir (str): the download directory of the project
+        budget (int): maximum size (in bytes) of the inventory products
+                      kept in the download directory (None uses the
+                      free disk space)
+        reserve (int): disk space (in bytes) that is kept free, e.g. for
+                       the temporary files of the processing
+        evict (bool): delete the raw products once all dependent ARD
+                      products are processed
+        poll (int): seconds between the checks for freed space
+
+    '''
+
+    def __init__(self, download_dir, budget=None,
+                 reserve=20 * 1024 ** 3, evict=False, poll=30):
+
+        self.download_dir = download_dir
+        self.budget = budget
+        self.reserve = reserve
+        self.evict_products = evict
+        self.poll = poll
+
+        # scene identifier as key, output directories of the ARD as values
+        self.dependents = {}
+        self.sizes = {}
+
+    def add_dependents(self, scene_ids, out_dir):
+        '''Registers an ARD product that needs the given products
+
+        Args:
+            scene_ids (list): identifiers of the products
+            out_dir (str): output directory of the ARD product, which
+                           holds the .processed marker once it is finished
+
+        '''
+
+        for scene_id in scene_ids:
+            self.dependents.setdefault(scene_id, []).append(out_dir)
+
+    def _processed(self, scene_id):
+
+        out_dirs = self.dependents.get(scene_id)
+        return bool(out_dirs) and all(
+            os.path.isfile(os.path.join(out_dir, '.processed'))
+            for out_dir in out_dirs)
+
+    def _local_file(self, scene_id):
+
+        # partial downloads have no .downloaded marker
+        filepath = S1Scene(scene_id)._download_path(self.download_dir)
+        if os.path.exists('{}.downloaded'.format(filepath)):
+            return filepath
+
+        return None
+
+    def evict(self):
+        '''Deletes the downloaded products whose ARD products are processed
+
+        Returns:
+            int: the number of freed bytes
+
+        '''
+
+        if not self.evict_products:
+            return 0
+
+        freed = 0
+        for scene_id in self.dependents:
+            filepath = self._local_file(scene_id)
+            if filepath and self._processed(scene_id):
+                freed += os.path.getsize(filepath)
+                for file in (filepath, '{}.downloaded'.format(filepath)):
+                    if os.path.exists(file):
+                        os.remove(file)
+
+        if freed:
+            print(' INFO: Deleted processed products, freeing {:.1f} GB.'
+                  .format(freed / _UNITS['GB']))
+
+        return freed
+
+    def _free_space(self):
+
+        free = shutil.disk_usage(self.download_dir).free - self.reserve
+        if self.budget is not None:
+            used = sum(self.sizes[scene_id] for scene_id in self.sizes
+                       if self._local_file(scene_id))
+            free = min(free, self.budget - used)
+
+        return free
+
+    def run(self, inventory_df, download, busy=None):
+        '''Downloads the inventory in batches that fit into the budget
+
+        Args:
+            inventory_df (GeoDataFrame): an OST compliant inventory
+            download (function): downloads a part of the inventory
+            busy (function): returns True as long as the processing is
+                             running, i.e. space can still be freed
+
+        Returns:
+            list: identifiers of the scenes that have not been downloaded
+                  (failed ones first, then those that did not fit)
+
+        '''
+
+        # only products of ARDs that still need to be processed
+        if self.dependents:
+            inventory_df = inventory_df[inventory_df.identifier.apply(
+                lambda scene_id: scene_id in self.dependents and
+                not self._processed(scene_id))]
+
+        # in processing order
+        inventory_df = inventory_df.sort_values(
+            ['acquisitiondate', 'relativeorbit', 'identifier'])
+
+        for _, row in inventory_df.iterrows():
+            self.sizes[row.identifier] = product_size(
+                row.get('size'), S1Scene(row.identifier).product_type)
+
+        pending = [scene_id for scene_id in inventory_df.identifier
+                   if not self._local_file(scene_id)]
+        failed = []
+
+        while pending:
+
+            self.evict()
+            free, batch = self._free_space(), []
+            for scene_id in pending:
+                if self.sizes[scene_id] > free:
+                    break
+                free -= self.sizes[scene_id]
+                batch.append(scene_id)
+
+            if not batch:
+                if busy and busy():
+                    time.sleep(self.poll)
+                    continue
+
+                print(' WARNING: Not enough disk space for the remaining {} '
+                      'products.'.format(len(pending)))
+                break
+
+            print(' INFO: Downloading {} of {} remaining products.'.format(
+                len(batch), len(pending)))
+            download(inventory_df[inventory_df.identifier.isin(batch)])
+
+            # failed downloads are not retried, but reported
+            failed += [scene_id for scene_id in batch
+                       if not self._local_file(scene_id)]
+            pending = pending[len(batch):]
+
+        if failed:
+            print(' WARNING: {} products have not been downloaded.'.format(
+                len(failed)))
+
+        return failed + pending
@@ -53,8 +53,6 @@ import json
 import glob
 import itertools
 
-import gdal
-
 # import ost libs
 from ost import Sentinel1_Scene
 from ost.s1 import grd_to_ard
@@ -64,6 +62,7 @@ from ost.multitemporal import common_ls_mask
 from ost.multitemporal import ard_to_ts
 from ost.multitemporal import timescan
 from ost.mosaic import mosaic
+from ost.mosaic import planner
 
 
 def _create_processing_dict(inventory_df):
@@ -105,40 +104,64 @@ def _create_processing_dict(inventory_df):
     return dict_scenes
 
 
-def grd_to_ard_batch(inventory_df, download_dir, processing_dir,
-                     temp_dir, proc_file, subset=None,
-                     data_mount='/eodata', exec_file=None):
+def grd_tasks(inventory_df, processing_dir):
+    '''Creates the GRD ARD processing tasks of an inventory
+
+    Each task covers all frames of one acquisition.
+
+    Args:
+        inventory_df (GeoDataFrame): an OST compliant Sentinel-1 inventory
+        processing_dir (str): the processing directory of the project
+
+    Returns:
+        list: dictionaries with the scene identifiers, the output
+              directory and the file id of each acquisition
+
+    '''
 
     # where all frames are grouped into acquisitions
     processing_dict = _create_processing_dict(inventory_df)
 
+    tasks = []
     for track, allScenes in processing_dict.items():
         for list_of_scenes in processing_dict[track]:
 
-                # get acquisition date
-                acquisition_date = Sentinel1_Scene(list_of_scenes[0]).start_date
+            # get acquisition date
+            acquisition_date = Sentinel1_Scene(list_of_scenes[0]).start_date
+            tasks.append(dict(
+                track=track, date=acquisition_date, scenes=list_of_scenes,
                 # create a subdirectory baed on acq. date
-                out_dir = opj(processing_dir, track, acquisition_date)
-                os.makedirs(out_dir, exist_ok=True)
+                out_dir=opj(processing_dir, track, acquisition_date),
+                file_id='{}_{}'.format(acquisition_date, track)))
+
+    return tasks
 
-                # check if already processed
-                if os.path.isfile(opj(out_dir, '.processed')):
-                    print(' INFO: Acquisition from {} of track {}'
-                          ' already processed'.format(acquisition_date, track))
-                else:
-                    # get the paths to the file
-                    scene_paths = ([Sentinel1_Scene(i).get_path(download_dir)
-                                   for i in list_of_scenes])
 
-                    file_id = '{}_{}'.format(acquisition_date, track)
+def grd_to_ard_batch(inventory_df, download_dir, processing_dir,
+                     temp_dir, proc_file, subset=None,
+                     data_mount='/eodata', exec_file=None):
+
+    for task in grd_tasks(inventory_df, processing_dir):
+
+        out_dir = task['out_dir']
+        os.makedirs(out_dir, exist_ok=True)
 
-                    # apply the grd_to_ard function
-                    grd_to_ard.grd_to_ard(scene_paths,
-                                          out_dir,
-                                          file_id,
-                                          temp_dir,
-                                          proc_file,
-                                          subset=subset)
+        # check if already processed
+        if os.path.isfile(opj(out_dir, '.processed')):
+            print(' INFO: Acquisition from {} of track {}'
+                  ' already processed'.format(task['date'], task['track']))
+        else:
+            # get the paths to the file
+            scene_paths = ([Sentinel1_Scene(i).get_path(download_dir)
+                           for i in task['scenes']])
+
+            # apply the grd_to_ard function
+            grd_to_ard.grd_to_ard(scene_paths,
+                                  out_dir,
+                                  task['file_id'],
+                                  temp_dir,
+                                  proc_file,
+                                  subset=subset)
 
 
 def ards_to_timeseries(inventory_df, processing_dir, temp_dir,
@@ -148,7 +171,10 @@ def ards_to_timeseries(inventory_df, processing_dir, temp_dir,
     with open(proc_file, 'r') as ard_file:
         ard_params = json.load(ard_file)['processing parameters']
         ard = ard_params['single ARD']
+        approximate = ard_params['time-series ARD'].get(
+            'approximate extent', False)
 
+    extent_list = []
     for track in inventory_df.relativeorbit.unique():
 
         # get the burst directory
@@ -168,7 +194,11 @@ def ards_to_timeseries(inventory_df, processing_dir, temp_dir,
             continue
 
         print(' INFO: Creating common extent mask for track {}'.format(track))
-        common_extent.mt_extent(list_of_scenes, extent, temp_dir, -0.0018)
+        extent_list.append((list_of_scenes, extent))
+
+    # the extents of all tracks are created in parallel
+    common_extent.mt_extents(extent_list, temp_dir, -0.0018,
+                             approximate=approximate)
 
     if ard['create ls mask'] or ard['apply ls mask']:
 
@@ -186,7 +216,8 @@ def ards_to_timeseries(inventory_df, processing_dir, temp_dir,
 
             print(' INFO: Creating common Layover/Shadow mask for track {}'.format(track))
             common_ls_mask.mt_layover(list_of_layover, out_ls, temp_dir,
-                                      extent, ard['apply ls mask'])
+                                      extent, ard['apply ls mask'],
+                                      approximate)
 
 
     for track in inventory_df.relativeorbit.unique():
@@ -299,7 +330,7 @@ def timeseries_to_timescan(inventory_df, processing_dir, proc_file,
 
 
 def mosaic_timeseries(inventory_df, processing_dir, temp_dir, cut_to_aoi=False,
-                      exec_file=None):
+                      ncores=os.cpu_count(), memory=None):
 
     print(' -----------------------------------')
     print(' INFO: Mosaicking Time-series layers')
@@ -309,63 +340,14 @@ def mosaic_timeseries(inventory_df, processing_dir, temp_dir, cut_to_aoi=False,
     ts_dir = opj(processing_dir, 'Mosaic', 'Timeseries')
     os.makedirs(ts_dir, exist_ok=True)
 
-    # loop through polarisations
-    for p in ['VV', 'VH', 'HH', 'HV']:
-
-        tracks = inventory_df.relativeorbit.unique()
-        nr_of_ts = len(glob.glob(opj(
-            processing_dir, tracks[0], 'Timeseries', '*.{}.tif'.format(p))))
-
-        if not nr_of_ts >= 1:
-            continue
+    # index all track layers once and plan the mosaics of each time step
+    plan = planner.plan_timeseries(
+        planner.index_timeseries(processing_dir), ts_dir,
+        {'bs.{}'.format(p): opj(ts_dir, 'Timeseries.{}.vrt'.format(p))
+         for p in ['VV', 'VH', 'HH', 'HV']},
+        step_format='{}')
 
-        outfiles = []
-        for i in range(1, nr_of_ts + 1):
-
-            filelist = glob.glob(opj(
-                processing_dir, '*', 'Timeseries',
-                '{}.*.{}.tif'.format(i, p)))
-            filelist = [file for file in filelist if 'Mosaic' not in file]
-
-            # create
-            datelist = []
-            for file in filelist:
-                datelist.append(os.path.basename(file).split('.')[1])
-
-            filelist = ' '.join(filelist)
-            start, end = sorted(datelist)[0], sorted(datelist)[-1]
-
-            if start == end:
-                outfile = opj(ts_dir, '{}.{}.bs.{}.tif'.format(i, start, p))
-            else:
-                outfile = opj(ts_dir, '{}.{}-{}.bs.{}.tif'.format(i, start, end, p))
-
-            check_file = opj(
-                os.path.dirname(outfile),
-                '.{}.processed'.format(os.path.basename(outfile)[:-4])
-            )
-               # logfile = opj(ts_dir, '{}.{}-{}.bs.{}.errLog'.format(i, start, end, p))
-
-            outfiles.append(outfile)
-
-            if os.path.isfile(check_file):
-                print(' INFO: Mosaic layer {} already'
-                      ' processed.'.format(os.path.basename(outfile)))
-                continue
-
-            print(' INFO: Mosaicking layer {}.'.format(os.path.basename(outfile)))
-            mosaic.mosaic(filelist, outfile, temp_dir, cut_to_aoi)
-
-        if exec_file:
-            print(' gdalbuildvrt ....command, outfiles')
-            continue
-
-        # create vrt
-        vrt_options = gdal.BuildVRTOptions(srcNodata=0, separate=True)
-        gdal.BuildVRT(opj(ts_dir, 'Timeseries.{}.vrt'.format(p)),
-                      outfiles,
-                      options=vrt_options
-        )
+    planner.run_timeseries(plan, temp_dir, cut_to_aoi, ncores, memory)
 
 
 def mosaic_timescan(inventory_df, processing_dir, temp_dir, proc_file,
@@ -71,7 +71,7 @@ import shutil
 import time
 import rasterio
 import numpy as np
-import gdal
+from rasterio.windows import Window, intersect
 
 from os.path import join as opj
 from ost.snap_common import common
@@ -335,79 +335,42 @@ def _grd_remove_border(infile):
     # print(' INFO: Removing the GRD Border Noise.')
     currtime = time.time()
 
-    # read raster file and get number of columns adn rows
-    raster = gdal.Open(infile, gdal.GA_Update)
-    cols = raster.RasterXSize
-    rows = raster.RasterYSize
-
-    # create 3000xrows array for the left part of the image
-    array_left = np.array(raster.GetRasterBand(1).ReadAsArray(0,
-                                                              0, 3000, rows))
-
-    for x in range(3000):
-        # condition if more than 50 pixels within the line have values
-        # less than 500, delete the line
-        # if np.sum(np.where((array_left[:,x] < 200)
-        # & (array_left[:,x] > 0) , 1, 0)) <= 50:
-        if np.mean(array_left[:, x]) <= 100:
-            array_left[:, x].fill(0)
-        else:
-            z = x + 150
-            if z > 3000:
-                z = 3000
-            for y in range(x, z, 1):
-                array_left[:, y].fill(0)
-
-            cols_left = y
-            break
-
-    try:
-        cols_left
-    except NameError:
-        cols_left = 3000
-
-    # write array_left to disk
-    # print(' INFO: Total amount of columns: {}'.format(cols_left))
-    # print(' INFO: Number of colums set to 0 on the left side: '
-    #     ' {}'.format(cols_left))
-    # raster.GetRasterBand(1).WriteArray(array_left[:, :+cols_left], 0, 0, 1)
-    raster.GetRasterBand(1).WriteArray(array_left[:, :+cols_left], 0, 0)
-
-    array_left = None
-
-    # create 2d array for the right part of the image (3000 columns and rows)
-    cols_last = cols - 3000
-    array_right = np.array(raster.GetRasterBand(1).ReadAsArray(cols_last,
-                                                               0, 3000, rows))
-
-    # loop through the array_right columns in opposite direction
-    for x in range(2999, 0, -1):
-
-        if np.mean(array_right[:, x]) <= 100:
-            array_right[:, x].fill(0)
-        else:
-            z = x - 150
-            if z < 0:
-                z = 0
-            for y in range(x, z, -1):
-                array_right[:, y].fill(0)
-
-            cols_right = y
-            break
-
-    try:
-        cols_right
-    except NameError:
-        cols_right = 0
-
-    #
-    col_right_start = cols - 3000 + cols_right
-    # print(' INFO: Number of columns set to 0 on the'
-    #     ' right side: {}'.format(3000 - cols_right))
-    # print(' INFO: Amount of columns kept: {}'.format(col_right_start))
-    raster.GetRasterBand(1).WriteArray(array_right[:, cols_right:],
-                                       col_right_start, 0)
-    array_right = None
+    # get the mean of the outer 3000 columns on each side
+    with rasterio.open(infile) as src:
+        cols, rows = src.width, src.height
+        strip = min(3000, cols)
+        means_left = src.read(1, window=Window(0, 0, strip, rows)).mean(
+            axis=0)
+        means_right = src.read(1, window=Window(cols - strip, 0, strip,
+                                                rows)).mean(axis=0)
+
+    # the first valid column from the outside and another 150 columns
+    # are set to 0 (all columns, if none is valid)
+    valid = np.flatnonzero(means_left > 100)
+    cols_left = min(valid[0] + 150, strip) - 1 if valid.size else strip
+
+    valid = np.flatnonzero(means_right[1:] > 100) + 1
+    cols_right = max(valid[-1] - 150, 0) + 1 if valid.size else 1
+    col_right_start = cols - strip + cols_right
+
+    def _remove(array, window):
+        start = max(col_right_start - window.col_off, 0)
+        array[..., :max(cols_left - window.col_off, 0)] = 0
+        array[..., start:] = 0
+        return array
+
+    # only the blocks of the border columns are updated
+    with rasterio.open(infile) as src:
+        windows = [
+            window.intersection(border)
+            for window in ras._block_windows(src)
+            for border in (Window(0, 0, cols_left, rows),
+                           Window(col_right_start, 0,
+                                  cols - col_right_start, rows))
+            if border.width > 0 and intersect(window, border)
+        ]
+
+    ras.update_raster(infile, _remove, windows, bands=[1])
     h.timer(currtime)
 
 
@@ -1069,6 +1032,10 @@ def grd_to_ard(filelist,
     shutil.move('{}.dim'.format(geocoded), '{}.dim'.format(out_final))
     shutil.move('{}.data'.format(geocoded), '{}.data'.format(out_final))
 
+    # overviews for the thumbnails and previews
+    for file in glob.glob(opj('{}.data'.format(out_final), '*.img')):
+        ras.build_overviews(file)
+
     # write processed file to keep track of files already processed
     with open(opj(output_dir, '.processed'), 'w') as file:
         file.write('passed all tests \n')
@@ -1134,6 +1101,9 @@ def ard_to_rgb(infile, outfile, driver='GTiff', to_db=True):
                                    (3, ratio_array)]:
                         dst.write(arr[0, ], indexes=k, window=window)
 
+    if driver == 'GTiff':
+        ras.build_overviews(outfile)
+
 
 def ard_to_thumbnail(infile, outfile, driver='JPEG', shrink_factor=25,
                      to_db=True):
@@ -1175,8 +1145,11 @@ def ard_to_thumbnail(infile, outfile, driver='JPEG', shrink_factor=25,
 
             # read arrays and turn to dB
 
-            co_array = co.read(out_shape=out_shape, resampling=5)
-            cr_array = cr.read(out_shape=out_shape, resampling=5)
+            # read from the closest overviews of the ARD bands
+            co_array = ras.read_preview(co_pol, out_shape=out_shape[1:],
+                                        resampling=5)
+            cr_array = ras.read_preview(cross_pol, out_shape=out_shape[1:],
+                                        resampling=5)
 
             if to_db:
                 co_array = ras.convert_to_db(co_array)
@@ -0,0 +1,305 @@
+# -*- coding: utf-8 -*-
+'''This module overlaps the download and the ARD processing of a project
+
+Instead of downloading the full inventory before the processing starts,
+each finished download is reported to a processing pipeline. A burst is
+processed as soon as the products of its master and slave dates are
+available, a GRD acquisition as soon as all of its frames are. This way,
+the network I/O of the downloads and the CPU work of SNAP run at the
+same time.
+
+'''
+
+import os
+from os.path import join as opj
+import json
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from ost import Sentinel1_Scene as S1Scene
+from ost.helpers import download_engine
+from ost.s1 import burst, burst_to_ard, grd_batch, grd_to_ard
+
+
+class ProcessingPipeline():
+    '''Runs processing tasks once all products they need are available
+
+    Args:
+        worker (function): module level function that processes the
+                           argument list of a task
+        workers (int): number of tasks processed in parallel
+
+    '''
+
+    def __init__(self, worker, workers=1):
+
+        self.worker = worker
+        self.workers = workers
+
+        self._lock = threading.Lock()
+        self._ready = set()
+        self._waiting = {}
+        self._tasks = []
+        self._futures = {}
+        self._executor = ProcessPoolExecutor(max_workers=workers)
+
+    def _submit(self, index):
+
+        self._futures[index] = self._executor.submit(
+            self.worker, self._tasks[index][1])
+
+    def add(self, scene_ids, argument_list):
+        '''Adds a task
+
+        Args:
+            scene_ids (list): identifiers of the products the task needs
+            argument_list (list): the argument list for the worker
+
+        '''
+
+        with self._lock:
+            missing = set(scene_ids) - self._ready
+            self._tasks.append((missing, argument_list))
+            index = len(self._tasks) - 1
+
+            if not missing:
+                self._submit(index)
+            for scene_id in missing:
+                self._waiting.setdefault(scene_id, []).append(index)
+
+    def scene_ready(self, scene_id):
+        '''Marks a product as available and starts the tasks it completes'''
+
+        with self._lock:
+            self._ready.add(scene_id)
+            for index in self._waiting.pop(scene_id, []):
+                missing = self._tasks[index][0]
+                missing.discard(scene_id)
+                if not missing:
+                    self._submit(index)
+
+    def busy(self):
+        '''Checks if any task is still running'''
+
+        with self._lock:
+            return any(not future.done() for future in self._futures.values())
+
+    def listener(self, job, result):
+        '''Download listener that reports finished downloads'''
+
+        if result and job.scene_id:
+            self.scene_ready(job.scene_id)
+
+    def join(self):
+        '''Waits for all started tasks
+
+        Returns:
+            list: the argument lists of tasks that failed or could not be
+                  started because products are missing
+
+        '''
+
+        failed = []
+        try:
+            for index, (missing, argument_list) in enumerate(self._tasks):
+                if index not in self._futures:
+                    failed.append(argument_list)
+                    continue
+
+                try:
+                    self._futures[index].result()
+                except Exception as error:
+                    print(' ERROR: Processing failed ({}).'.format(error))
+                    failed.append(argument_list)
+        finally:
+            self._executor.shutdown(wait=True)
+
+        return failed
+
+
+def _burst_worker(argument_list):
+    '''Processes a single burst task (see burst.burst_tasks)'''
+
+    task, download_dir, data_mount, proc_file, temp_dir, ncores = \
+        argument_list
+
+    master_file = S1Scene(task['master_scene']).get_path(
+        download_dir, data_mount)
+    slave_file = S1Scene(task['slave_scene']).get_path(
+        download_dir, data_mount) if task['slave_scene'] else None
+
+    # bursts are processed in parallel, so each one gets its own temp dir
+    temp_dir = opj(temp_dir, 'temp_{}_{}'.format(task['burst'], task['date']))
+    os.makedirs(temp_dir, exist_ok=True)
+    os.makedirs(task['out_dir'], exist_ok=True)
+
+    print(' INFO: Entering burst {} at date {}.'.format(
+        task['burst'], task['date']))
+    burst_to_ard.burst_to_ard(
+        master_file=master_file,
+        swath=task['subswath'],
+        master_burst_nr=task['master_burst_nr'],
+        master_burst_id=task['master_id'],
+        proc_file=proc_file,
+        out_dir=task['out_dir'],
+        temp_dir=temp_dir,
+        slave_file=slave_file,
+        slave_burst_nr=task['slave_burst_nr'],
+        slave_burst_id=task['slave_id'],
+        coherence=task['coherence'],
+        remove_slave_import=False,
+        ncores=ncores)
+
+
+def _grd_worker(argument_list):
+    '''Processes a single GRD acquisition task (see grd_batch.grd_tasks)'''
+
+    task, download_dir, data_mount, proc_file, temp_dir, subset = \
+        argument_list
+
+    scene_paths = [S1Scene(scene_id).get_path(download_dir, data_mount)
+                   for scene_id in task['scenes']]
+
+    temp_dir = opj(temp_dir, 'temp_{}'.format(task['file_id']))
+    os.makedirs(temp_dir, exist_ok=True)
+    os.makedirs(task['out_dir'], exist_ok=True)
+
+    grd_to_ard.grd_to_ard(scene_paths, task['out_dir'], task['file_id'],
+                          temp_dir, proc_file, subset=subset)
+
+
+def run(tasks, worker, inventory_df, download, download_dir,
+        data_mount='/eodata', workers=1, scheduler=None):
+    '''Downloads the products and processes the tasks as they are ready
+
+    Args:
+        tasks (list): tuples of the scene identifiers and the argument list
+                      of each task
+        worker (function): module level function that processes a task
+        inventory_df (GeoDataFrame): the inventory of the products
+        download (function): function that downloads (a part of) the
+                             inventory
+        download_dir (str): the download directory of the project
+        data_mount (str): the DIAS data mount
+        workers (int): number of tasks processed in parallel
+        scheduler (DownloadScheduler): downloads the inventory within
+                                       a disk budget
+
+    Returns:
+        list: the argument lists of the tasks that have not been processed
+
+    '''
+
+    pipeline = ProcessingPipeline(worker, workers)
+    for scene_ids, argument_list in tasks:
+        pipeline.add(scene_ids, argument_list)
+
+    # products that are already downloaded or on the mount
+    for scene_id in {scene_id for scene_ids, _ in tasks
+                     for scene_id in scene_ids}:
+        if S1Scene(scene_id).get_path(download_dir, data_mount):
+            pipeline.scene_ready(scene_id)
+
+    download_engine.add_listener(pipeline.listener)
+    try:
+        if scheduler:
+            for scene_ids, argument_list in tasks:
+                scheduler.add_dependents(scene_ids,
+                                         argument_list[0]['out_dir'])
+            scheduler.run(inventory_df, download, busy=pipeline.busy)
+        else:
+            download(inventory_df)
+    finally:
+        download_engine.remove_listener(pipeline.listener)
+        failed = pipeline.join()
+
+    if scheduler:
+        scheduler.evict()
+
+    if failed:
+        print(' WARNING: {} tasks have not been processed.'.format(
+            len(failed)))
+
+    return failed
+
+
+def bursts_to_ard(burst_inventory, inventory_df, download, download_dir,
+                  processing_dir, temp_dir, proc_file, data_mount='/eodata',
+                  workers=1, ncores=os.cpu_count(), scheduler=None):
+    '''Downloads and processes the bursts of a burst inventory
+
+    Args:
+        burst_inventory (GeoDataFrame): an OST compliant burst inventory
+        inventory_df (GeoDataFrame): the inventory of the products
+        download (function): function that downloads (a part of) the
+                             inventory
+        download_dir (str): the download directory of the project
+        processing_dir (str): the processing directory of the project
+        temp_dir (str): the directory for temporary files
+        proc_file (str): the processing parameters file
+        data_mount (str): the DIAS data mount
+        workers (int): number of bursts processed in parallel
+        ncores (int): number of cores used by each SNAP process
+        scheduler (DownloadScheduler): downloads the inventory within
+                                       a disk budget
+
+    Returns:
+        list: the argument lists of the tasks that have not been processed
+
+    '''
+
+
+    with open(proc_file, 'r') as ard_file:
+        ard = json.load(ard_file)['processing parameters']['single ARD']
+
+    tasks = []
+    for task in burst.burst_tasks(burst_inventory, processing_dir, ard):
+        if os.path.isfile(opj(task['out_dir'], '.processed')):
+            continue
+
+        scene_ids = [task['master_scene']]
+        if task['slave_scene']:
+            scene_ids.append(task['slave_scene'])
+
+        tasks.append((scene_ids, [task, download_dir, data_mount, proc_file,
+                                  temp_dir, ncores]))
+
+    return run(tasks, _burst_worker, inventory_df, download, download_dir,
+               data_mount, workers, scheduler)
+
+
+def grds_to_ard(inventory_df, download, download_dir, processing_dir,
+                temp_dir, proc_file, subset=None, data_mount='/eodata',
+                workers=1, scheduler=None):
+    '''Downloads and processes the acquisitions of a GRD inventory
+
+    Args:
+        inventory_df (GeoDataFrame): an OST compliant Sentinel-1 inventory
+        download (function): function that downloads (a part of) the
+                             inventory
+        download_dir (str): the download directory of the project
+        processing_dir (str): the processing directory of the project
+        temp_dir (str): the directory for temporary files
+        proc_file (str): the processing parameters file
+        subset (str): WKT of the subset
+        data_mount (str): the DIAS data mount
+        workers (int): number of acquisitions processed in parallel
+        scheduler (DownloadScheduler): downloads the inventory within
+                                       a disk budget
+
+    Returns:
+        list: the argument lists of the tasks that have not been processed
+
+    '''
+
+
+    tasks = []
+    for task in grd_batch.grd_tasks(inventory_df, processing_dir):
+        if os.path.isfile(opj(task['out_dir'], '.processed')):
+            continue
+
+        tasks.append((task['scenes'], [task, download_dir, data_mount,
+                                       proc_file, temp_dir, subset]))
+
+    return run(tasks, _grd_worker, inventory_df, download, download_dir,
+               data_mount, workers, scheduler)
@@ -194,7 +194,8 @@ def _handle_equator_crossing(inventory_df):
     return inventory_df
 
 
-def _exclude_marginal_tracks(aoi_gdf, inventory_df, area_reduce=0.1):
+def _exclude_marginal_tracks(aoi_gdf, inventory_df, area_reduce=0.1,
+                             aoi_coverage=None):
     '''
     This function takes the AOI and the footprint inventory
     and checks if any of the tracks are unnecessary, i.e.
@@ -207,14 +208,18 @@ def _exclude_marginal_tracks(aoi_gdf, inventory_df, area_reduce=0.1):
         aoi_gdf (gdf): the aoi as an GeoDataFrame
         inventory_df (gdf): an OST compliant Sentinel-1 inventory GeoDataFrame
         area_reduce (float): reduction of AOI by square degrees
+        aoi_coverage (AoiCoverage): prepared AOI (created if not given)
 
     Returns:
         inventory_df (gdf): the manipulated inventory GeodataFrame
 
     '''
 
+    if aoi_coverage is None:
+        aoi_coverage = vec.AoiCoverage(aoi_gdf)
+
     # get Area of AOI
-    aoi_area = aoi_gdf.area.sum()
+    aoi_area = aoi_coverage.area
 
     # create a list of tracks for that date (sometimes more than one)
     tracklist = inventory_df['relativeorbit'].unique()
@@ -223,7 +228,7 @@ def _exclude_marginal_tracks(aoi_gdf, inventory_df, area_reduce=0.1):
 
         trackunion = inventory_df.geometry[
             inventory_df['relativeorbit'] != track].unary_union
-        intersect_track = aoi_gdf.geometry.intersection(trackunion).area.sum()
+        intersect_track = aoi_coverage.intersection_area(trackunion)
 
         if intersect_track >= aoi_area - area_reduce:
             print(' INFO: excluding track {}'.format(track))
@@ -242,7 +247,7 @@ def _exclude_marginal_tracks(aoi_gdf, inventory_df, area_reduce=0.1):
     return inventory_df
 
 
-def _remove_incomplete_tracks(aoi_gdf, inventory_df):
+def _remove_incomplete_tracks(aoi_gdf, inventory_df, aoi_coverage=None):
     '''Removes incomplete tracks with respect to the AOI
 
     Sentinel-1 follows an operational acquisition scheme where .
@@ -256,12 +261,16 @@ def _remove_incomplete_tracks(aoi_gdf, inventory_df):
     Args:
         aoi_gdf (gdf): the aoi as an GeoDataFrame
         inventory_df (gdf): an OST compliant Sentinel-1 inventory GeoDataFrame
+        aoi_coverage (AoiCoverage): prepared AOI (created if not given)
 
     Returns:
         inventory_df (gdf): the manipulated inventory GeodataFrame
 
     '''
 
+    if aoi_coverage is None:
+        aoi_coverage = vec.AoiCoverage(aoi_gdf)
+
     # define final output gdf
     out_frame = gpd.GeoDataFrame(columns=inventory_df.columns)
 
@@ -273,7 +282,7 @@ def _remove_incomplete_tracks(aoi_gdf, inventory_df):
         # get area of AOI intersect for all acq.s of this track
         trackunion = inventory_df['geometry'][
             inventory_df['relativeorbit'] == track].unary_union
-        intersect_track = aoi_gdf.geometry.intersection(trackunion).area.sum()
+        intersect_track = aoi_coverage.intersection_area(trackunion)
 
         # loop through dates
         for date in sorted(inventory_df['acquisitiondate'][
@@ -285,8 +294,7 @@ def _remove_incomplete_tracks(aoi_gdf, inventory_df):
 
             # get area of AOI intersect for all acq.s of this track
             date_union = gdf_date.geometry.unary_union
-            intersect_date = aoi_gdf.geometry.intersection(
-                date_union).area.sum()
+            intersect_date = aoi_coverage.intersection_area(date_union)
 
             if intersect_track <= intersect_date + 0.15:
                 out_frame = out_frame.append(gdf_date)
@@ -347,14 +355,17 @@ def _handle_non_continous_swath(inventory_df):
     return inventory_df
 
 
-def _forward_search(aoi_gdf, inventory_df, area_reduce=0):
+def _forward_search(aoi_gdf, inventory_df, area_reduce=0, aoi_coverage=None):
     '''
     This functions loops through the acquisition dates and
     identifies the time interval needed to create full coverages.
     '''
 
+    if aoi_coverage is None:
+        aoi_coverage = vec.AoiCoverage(aoi_gdf)
+
     # get AOI area
-    aoi_area = aoi_gdf.area.sum()
+    aoi_area = aoi_coverage.area
 
     # initialize some stuff for subsequent for-loop
     intersect_area, i = 0, 0
@@ -401,8 +412,7 @@ def _forward_search(aoi_gdf, inventory_df, area_reduce=0):
                 gdf_union = unary_union(polys)
 
             # get intersection with aoi and calculate area
-            inter = aoi_gdf.geometry.intersection(gdf_union)
-            intersect_area = inter.area.sum()
+            intersect_area = aoi_coverage.intersection_area(gdf_union)
 
             # for the datelist, we reset some stuff for next mosaic
             if intersect_area >= aoi_area - area_reduce:
@@ -413,7 +423,8 @@ def _forward_search(aoi_gdf, inventory_df, area_reduce=0):
     return datelist, gpd.GeoDataFrame(out_frame, geometry='geometry')
 
 
-def _backward_search(aoi_gdf, inventory_df, datelist, area_reduce=0):
+def _backward_search(aoi_gdf, inventory_df, datelist, area_reduce=0,
+                     aoi_coverage=None):
     '''
     This function takes the footprint dataframe and the datelist
     created by the _forward_search function to sort out
@@ -423,8 +434,11 @@ def _backward_search(aoi_gdf, inventory_df, datelist, area_reduce=0):
     different swaths.
     '''
 
+    if aoi_coverage is None:
+        aoi_coverage = vec.AoiCoverage(aoi_gdf)
+
     # get AOI area
-    aoi_area = aoi_gdf.area.sum()
+    aoi_area = aoi_coverage.area
 
     # create empty dataFrame for output
     temp_df = gpd.GeoDataFrame(columns=inventory_df.columns)
@@ -480,8 +494,7 @@ def _backward_search(aoi_gdf, inventory_df, datelist, area_reduce=0):
                         gdf_union = unary_union(polys)
 
                     # get intersection with aoi and calulate area
-                    inter = aoi_gdf.geometry.intersection(gdf_union)
-                    intersect_area = inter.area.sum()
+                    intersect_area = aoi_coverage.intersection_area(gdf_union)
 
                     # we break the loop if we found enough
                     if intersect_area >= aoi_area - area_reduce:
@@ -507,13 +520,16 @@ def search_refinement(aoi, inventory_df, inventory_dir,
                       exclude_marginal=True,
                       full_aoi_crossing=True,
                       mosaic_refine=True,
-                      area_reduce=0.05, complete_coverage=True):
+                      area_reduce=0.05, complete_coverage=True,
+                      aoi_tile_size=1.0):
     '''A function to refine the Sentinel-1 search by certain criteria
 
     Args:
         aoi (WKT str):
         inventory_df (GeoDataFrame):
         inventory_dir (str or path):
+        aoi_tile_size (float): size of AOI tiles (in degree) used for
+                               the spatial index of coverage checks
 
     Returns:
         refined inventory (dictionary):
@@ -522,7 +538,10 @@ def search_refinement(aoi, inventory_df, inventory_dir,
     '''
     # creat AOI GeoDataframe and calulate area
     aoi_gdf = vec.wkt_to_gdf(aoi)
-    aoi_area = aoi_gdf.area.sum()
+
+    # prepare the AOI once for all subsequent coverage checks
+    aoi_coverage = vec.AoiCoverage(aoi_gdf, tile_size=aoi_tile_size)
+    aoi_area = aoi_coverage.area
     # get all polarisations apparent in the inventory
     pols = inventory_df['polarisationmode'].unique()
 
@@ -548,8 +567,8 @@ def search_refinement(aoi, inventory_df, inventory_dir,
             len(inv_df_sorted), orb, pol))
 
         # calculate intersected area
-        inter = aoi_gdf.geometry.intersection(inv_df_sorted.unary_union)
-        intersect_area = inter.area.sum()
+        intersect_area = aoi_coverage.intersection_area(
+            inv_df_sorted.unary_union)
 
         # we do a first check if the scenes do not fully cover the AOI
         if (intersect_area <= aoi_area - area_reduce) and complete_coverage:
@@ -571,19 +590,20 @@ def search_refinement(aoi, inventory_df, inventory_dir,
             print(nr_of_tracks)
             if exclude_marginal is True and nr_of_tracks > 1:
                 inventory_refined = _exclude_marginal_tracks(
-                    aoi_gdf, inventory_refined, area_reduce)
+                    aoi_gdf, inventory_refined, area_reduce, aoi_coverage)
 
             if full_aoi_crossing is True:
                 inventory_refined = _remove_incomplete_tracks(
-                    aoi_gdf, inventory_refined)
+                    aoi_gdf, inventory_refined, aoi_coverage)
 
             inventory_refined = _handle_non_continous_swath(inventory_refined)
 
             if mosaic_refine is True:
                 datelist, inventory_refined = _forward_search(
-                    aoi_gdf, inventory_refined, area_reduce)
+                    aoi_gdf, inventory_refined, area_reduce, aoi_coverage)
                 inventory_refined = _backward_search(
-                    aoi_gdf, inventory_refined, datelist, area_reduce)
+                    aoi_gdf, inventory_refined, datelist, area_reduce,
+                    aoi_coverage)
 
             if len(inventory_refined) != 0:
                 vec.inventory_to_shp(
@@ -5,12 +5,13 @@ import os
 from os.path import join as opj
 import sys
 import importlib
+import copy
+import functools
 import json
 import glob
+import re
 import urllib
 from urllib.error import URLError
-import zipfile
-import fnmatch
 import xml.dom.minidom
 import xml.etree.ElementTree as ET
 
@@ -20,7 +21,7 @@ import geopandas as gpd
 import requests
 from shapely.wkt import loads
 
-from ost.helpers import scihub, peps, onda, raster as ras
+from ost.helpers import scihub, peps, onda, safe, raster as ras
 from ost.s1.grd_to_ard import grd_to_ard, ard_to_rgb, ard_to_thumbnail
 
 __author__ = "Andreas Vollrath"
@@ -28,68 +29,145 @@ __version__ = 1.0
 __license__ = 'MIT'
 
 
+BURST_COLUMNS = ['SceneID', 'Track', 'Date', 'SwathID', 'AnxTime',
+                 'BurstNr', 'geometry']
+
+
+def burst_records_to_gdf(records, crs={'init': 'epsg:4326'}):
+    '''Creates a burst GeoDataFrame from a list of plain burst records
+
+    Args:
+        records (list): tuples of (SceneID, Track, Date, SwathID,
+                        AnxTime, BurstNr, WKT geometry)
+        crs (dict): the crs of the GeoDataFrame
+
+    Returns:
+        GeoDataFrame: one row per burst
+
+    '''
+
+    df = pd.DataFrame.from_records(list(records), columns=BURST_COLUMNS)
+    df['geometry'] = [loads(wkt) for wkt in df['geometry']]
+    return gpd.GeoDataFrame(df, geometry='geometry', crs=crs)
+
+
+# attributes derived from the scene identifier
+_ID_ATTRIBUTES = ('scene_id', 'mission_id', 'mode_beam', 'product_type',
+                  'resolution_class', 'proc_level', 'pol_mode', 'start_date',
+                  'start_time', 'stop_date', 'stop_time', 'abs_orbit',
+                  'data_take_id', 'unique_id', 'year', 'month', 'day',
+                  'onda_class', 'orbit_offset', 'satellite', 'rel_orbit',
+                  'acq_mode', 'p_type')
+
+_ACQ_MODES = {'IW': "Interferometric Wide Swath", 'SM': "Stripmap",
+              'EW': "Extra-Wide swath", 'WV': "Wave"}
+
+# e.g. S1A_IW_GRDH_1SDV_20141003T040550_20141003T040619_002660_002F64_EC04
+_SCENE_ID = re.compile(
+    r'^S1[AB]_(IW|EW|WV|SM|S[1-6])_(GRD|SLC|OCN|RAW)[FHM_]_[0-2][SA]'
+    r'[SDHV][HV_]_\d{8}T\d{6}_\d{8}T\d{6}_\d{6}_[0-9A-F]{6}_[0-9A-F]{4}$')
+
+_PRODUCT_TYPES = {'GRD': "Ground Range Detected (GRD)",
+                  'SLC': "Single-Look Complex (SLC)",
+                  'OCN': "Ocean", 'RAW': "Raw Data (RAW)"}
+
+
+def _parse_scene_id(scene_id):
+    '''Slices a Sentinel-1 scene identifier into its components
+
+    Args:
+        scene_id (str): the Sentinel-1 scene identifier
+
+    Returns:
+        tuple: the values of the attributes listed in _ID_ATTRIBUTES
+
+    Raises:
+        ValueError: if scene_id is not a Sentinel-1 scene identifier
+
+    '''
+
+    # validated before the cache, so it only holds valid identifiers
+    if not isinstance(scene_id, str) or not _SCENE_ID.match(scene_id):
+        raise ValueError(
+            '{} is not a Sentinel-1 scene identifier.'.format(scene_id))
+
+    return _slice_scene_id(scene_id)
+
+
+@functools.lru_cache(maxsize=65536)
+def _slice_scene_id(scene_id):
+
+    mission_id = scene_id[0:3]
+    mode_beam = scene_id[4:6]
+    product_type = scene_id[7:10]
+    abs_orbit = scene_id[49:55]
+
+    # Calculate the relative orbit out of absolute orbit
+    # (from Peter Meadows (ESA) @
+    # http://forum.step.esa.int/t/sentinel-1-relative-orbit-from-filename/7042)
+    if mission_id == 'S1A':
+        orbit_offset, satellite = 73, "Sentinel-1A"
+    else:
+        orbit_offset, satellite = 27, "Sentinel-1B"
+
+    rel_orbit = (((int(abs_orbit) - int(orbit_offset)) % 175) + 1)
+
+    return (scene_id, mission_id, mode_beam, product_type,
+            scene_id[10], scene_id[12], scene_id[14:16],
+            scene_id[17:25], scene_id[26:32], scene_id[33:41],
+            scene_id[42:48], abs_orbit, scene_id[57:62], scene_id[63:],
+            scene_id[17:21], scene_id[21:23], scene_id[23:25],
+            scene_id[4:14], orbit_offset, satellite, rel_orbit,
+            _ACQ_MODES.get(mode_beam), _PRODUCT_TYPES.get(product_type))
+
+
+@functools.lru_cache(maxsize=None)
+def _ard_template(product_type, ard_type):
+    '''Loads (once) the ARD parameter template of a product type'''
+
+    # get path to ost package
+    rootpath = importlib.util.find_spec('ost').submodule_search_locations[0]
+    rootpath = opj(rootpath, 'graphs', 'ard_json')
+
+    template_file = opj(rootpath, '{}.{}.json'.format(
+            product_type.lower(), ard_type.replace(' ', '_').lower()))
+
+    with open(template_file, 'r') as ard_file:
+        return json.load(ard_file)['processing parameters']
+
+
 class Sentinel1_Scene():
 
+    __slots__ = _ID_ATTRIBUTES + ('ard_type', '_ard_parameters', 'ard_dimap',
+                                  'ard_rgb', 'rgb_thumbnail', 'proc_file',
+                                  'center_lat')
+
     def __init__(self, scene_id, ard_type='OST Standard'):
-        self.scene_id = scene_id
-        self.mission_id = scene_id[0:3]
-        self.mode_beam = scene_id[4:6]
-        self.product_type = scene_id[7:10]
-        self.resolution_class = scene_id[10]
-        self.proc_level = scene_id[12]
-        self.pol_mode = scene_id[14:16]
-        self.start_date = scene_id[17:25]
-        self.start_time = scene_id[26:32]
-        self.stop_date = scene_id[33:41]
-        self.stop_time = scene_id[42:48]
-        self.abs_orbit = scene_id[49:55]
-        self.data_take_id = scene_id[57:62]
-        self.unique_id = scene_id[63:]
-        self.year = scene_id[17:21]
-        self.month = scene_id[21:23]
-        self.day = scene_id[23:25]
-        self.onda_class = scene_id[4:14]
-        # Calculate the relative orbit out of absolute orbit
-        # (from Peter Meadows (ESA) @
-        # http://forum.step.esa.int/t/sentinel-1-relative-orbit-from-filename/7042)
-        if self.mission_id == 'S1A':
-            self.orbit_offset = 73
-            self.satellite = "Sentinel-1A"
-        elif self.mission_id == 'S1B':
-            self.orbit_offset = 27
-            self.satellite = "Sentinel-1B"
-
-        self.rel_orbit = (((int(self.abs_orbit)
-                            - int(self.orbit_offset)) % 175) + 1)
-
-        # get acquisition mode
-        if self.mode_beam == 'IW':
-            self.acq_mode = "Interferometric Wide Swath"
-        elif self.mode_beam == 'SM':
-            self.acq_mode = "Stripmap"
-        elif self.mode_beam == 'EW':
-            self.acq_mode = "Extra-Wide swath"
-        elif self.mode_beam == 'WV':
-            self.acq_mode = "Wave"
-
-        # get acquisition mode
-        if self.product_type == 'GRD':
-            self.p_type = "Ground Range Detected (GRD)"
-        elif self.product_type == 'SLC':
-            self.p_type = "Single-Look Complex (SLC)"
-        elif self.product_type == 'OCN':
-            self.p_type = "Ocean"
-        elif self.product_type == 'RAW':
-            self.p_type = "Raw Data (RAW)"
+
+        for attribute, value in zip(_ID_ATTRIBUTES, _parse_scene_id(scene_id)):
+            setattr(self, attribute, value)
 
         # set initial product paths to None
         self.ard_dimap = None
         self.ard_rgb = None
         self.rgb_thumbnail = None
+        self.proc_file = None
+
+        # ARD parameters are loaded from the template once they are needed
+        self.ard_type = ard_type
+        self._ard_parameters = None
+
+    @property
+    def ard_parameters(self):
+
+        if self._ard_parameters is None:
+            self.get_ard_parameters(self.ard_type)
 
-        # set initial ARD parameters to ard_type
-        self.ard_parameters = {}
-        self.get_ard_parameters(ard_type)
+        return self._ard_parameters
+
+    @ard_parameters.setter
+    def ard_parameters(self, ard_parameters):
+        self._ard_parameters = ard_parameters
 
     def info(self):
 
@@ -235,6 +313,33 @@ class Sentinel1_Scene():
 
         return path
 
+    def open_safe(self, download_dir=None, data_mount='/eodata', url=None,
+                  session=None, cache_dir=None):
+        '''Opens the product for reading single files of the SAFE structure
+
+        Local downloads and DIAS mounts are preferred. Otherwise the
+        zip archive is read from the url by HTTP range requests, so only
+        the bytes of the requested files are transferred.
+
+        Args:
+            download_dir (str): the download directory of the project
+            data_mount (str): the DIAS data mount
+            url (str): url of the zip archive (e.g. from a mirror adapter)
+            session (Session): an authenticated session for the url
+            cache_dir (str): directory for a persistent block cache
+
+        Returns:
+            SafeAccess: the access object of the product, or None if the
+                        product is not available
+
+        '''
+
+        path = self.get_path(download_dir, data_mount) or url
+        if not path:
+            return None
+
+        return safe.open_safe(path, session, cache_dir)
+
     # scihub related
     def scihub_uuid(self, opener):
 
@@ -395,28 +500,25 @@ class Sentinel1_Scene():
 
         return url_list
 
-    def _burst_database(self, et_root):
+    def _burst_records(self, et_root):
         '''
         This functions expects an xml string from a Sentinel-1 SLC
         annotation file and extracts relevant information for burst
-        identification as a GeoPandas GeoDataFrame.
+        identification as a list of plain records, i.e. tuples of
+        (SceneID, Track, Date, SwathID, AnxTime, BurstNr, WKT geometry).
 
         Much of the code is taken from RapidSAR
         package (once upon a time on github).
         '''
 
-        column_names = ['SceneID', 'Track', 'Date', 'SwathID', 'AnxTime',
-                        'BurstNr', 'geometry']
-        gdf = gpd.GeoDataFrame(columns=column_names)
-
         track = self.rel_orbit
         acq_date = self.start_date
 
         # pol = root.find('adsHeader').find('polarisation').text
         swath = et_root.find('adsHeader').find('swath').text
-        lines_per_burst = np.int(et_root.find('swathTiming').find(
+        lines_per_burst = int(et_root.find('swathTiming').find(
             'linesPerBurst').text)
-        pixels_per_burst = np.int(et_root.find('swathTiming').find(
+        pixels_per_burst = int(et_root.find('swathTiming').find(
             'samplesPerBurst').text)
         burstlist = et_root.find('swathTiming').find('burstList')
         geolocation_grid = et_root.find('geolocationGrid')[0]
@@ -434,6 +536,7 @@ class Sentinel1_Scene():
                     [geo_point.find('latitude').text,
                      geo_point.find('longitude').text])
 
+        records = []
         for i, b in enumerate(burstlist):
             firstline = str(i*lines_per_burst)
             lastline = str((i+1)*lines_per_burst)
@@ -443,7 +546,7 @@ class Sentinel1_Scene():
             if azi_anx_time > orbit_time:
                 azi_anx_time = np.mod(azi_anx_time, orbit_time)
 
-            azi_anx_time = np.int32(np.round(azi_anx_time*10))
+            azi_anx_time = int(np.round(azi_anx_time*10))
 #           burstid = 'T{}_{}_{}'.format(track, swath, burstid)
 #           first and lastline sometimes shifts by 1 for some reason?
             try:
@@ -485,23 +588,43 @@ class Sentinel1_Scene():
                 np.around(float(corners[0, 1]), 3),
                 np.around(float(corners[0, 0]), 3))
 
-            geo_dict = {'SceneID': self.scene_id, 'Track': track,
-                        'Date': acq_date, 'SwathID': swath,
-                        'AnxTime': azi_anx_time, 'BurstNr': i+1,
-                        'geometry': loads(wkt)}
+            records.append((self.scene_id, track, acq_date, swath,
+                            azi_anx_time, i+1, wkt))
 
-            gdf = gdf.append(geo_dict, ignore_index=True)
+        return records
 
-        return gdf
+    def _burst_database(self, et_root):
+        '''
+        This functions expects an xml string from a Sentinel-1 SLC
+        annotation file and extracts relevant information for burst
+        identification as a GeoPandas GeoDataFrame.
+        '''
 
-    def _scihub_annotation_get(self, uname=None, pword=None):
+        return burst_records_to_gdf(self._burst_records(et_root))
 
-        # define column names fro BUrst DF
-        column_names = ['SceneID', 'Track', 'Date', 'SwathID',
-                        'AnxTime', 'BurstNr', 'geometry']
+    def _annotation_records(self, filepath):
+        '''Extracts the burst records from all annotation files of
+        a product (SAFE folder, zip archive or url of a zip archive)
+        '''
 
-        gdf_final = gpd.GeoDataFrame(columns=column_names)
+        records = []
+        with safe.open_safe(filepath) as product:
+            for anno_file in product.glob('annotation/s*.xml'):
+                with product.open(anno_file) as xml_string:
+                    records.extend(self._burst_records(ET.parse(xml_string)))
 
+        # polarisations share the same bursts, so we keep the first only
+        anx_times, unique_records = set(), []
+        for record in records:
+            if record[4] not in anx_times:
+                anx_times.add(record[4])
+                unique_records.append(record)
+
+        return unique_records
+
+    def _scihub_annotation_get(self, uname=None, pword=None):
+
+        records = []
         base_url = 'https://scihub.copernicus.eu/apihub/'
 
         # get connected to scihub
@@ -530,53 +653,20 @@ class Sentinel1_Scene():
                 et_root = ET.fromstring(response)
 
                 # parse the xml page from the response
-                gdf = self._burst_database(et_root)
-
-                gdf_final = gdf_final.append(gdf)
+                records.extend(self._burst_records(et_root))
 
+        gdf_final = burst_records_to_gdf(records)
         return gdf_final.drop_duplicates(['AnxTime'], keep='first')
 
     def _zip_annotation_get(self, download_dir, data_mount='/eodata'):
 
-        column_names = ['SceneID', 'Track', 'Date', 'SwathID', 'AnxTime',
-                        'BurstNr', 'geometry']
-
-        # crs for empty dataframe
-        crs = {'init': 'epsg:4326'}
-        gdf_final = gpd.GeoDataFrame(columns=column_names, crs=crs)
-
         file = self.get_path(download_dir, data_mount)
-
-        # extract info from archive
-        archive = zipfile.ZipFile(file, 'r')
-        namelist = archive.namelist()
-        xml_files = fnmatch.filter(namelist, "*/annotation/s*.xml")
-
-        # loop through xml annotation files
-        for xml_file in xml_files:
-            xml_string = archive.open(xml_file)
-
-            gdf = self._burst_database(ET.parse(xml_string))
-            gdf_final = gdf_final.append(gdf)
-
-        return gdf_final.drop_duplicates(['AnxTime'], keep='first')
+        return burst_records_to_gdf(self._annotation_records(file))
 
     def _safe_annotation_get(self, download_dir, data_mount='/eodata'):
 
-        column_names = ['SceneID', 'Track', 'Date', 'SwathID',
-                        'AnxTime', 'BurstNr', 'geometry']
-        gdf_final = gpd.GeoDataFrame(columns=column_names)
-
-        for anno_file in glob.glob(
-                '{}/annotation/*xml'.format(
-                    self.get_path(download_dir=download_dir,
-                                  data_mount=data_mount))):
-
-            # parse the xml page from the response
-            gdf = self._burst_database(ET.parse(anno_file))
-            gdf_final = gdf_final.append(gdf)
-
-        return gdf_final.drop_duplicates(['AnxTime'], keep='first')
+        file = self.get_path(download_dir=download_dir, data_mount=data_mount)
+        return burst_records_to_gdf(self._annotation_records(file))
 
     # onda dias uuid extractor
     def ondadias_uuid(self,opener):
@@ -695,16 +785,9 @@ class Sentinel1_Scene():
     # processing related functions
     def get_ard_parameters(self, ard_type='OST Standard'):
 
-        # get path to ost package
-        rootpath = importlib.util.find_spec('ost').submodule_search_locations[0]
-        rootpath = opj(rootpath, 'graphs', 'ard_json')
-
-        template_file = opj(rootpath, '{}.{}.json'.format(
-                self.product_type.lower(),
-                ard_type.replace(' ', '_').lower()))
-
-        with open(template_file, 'r') as ard_file:
-            self.ard_parameters = json.load(ard_file)['processing parameters']
+        self.ard_type = ard_type
+        self.ard_parameters = copy.deepcopy(
+            _ard_template(self.product_type, ard_type))
 
 
     def set_external_dem(self, dem_file):
@@ -808,13 +891,8 @@ class Sentinel1_Scene():
     # other functions
     def _get_center_lat(self, scene_path=None):
 
-        if scene_path[-4:] == '.zip':
-            zip_archive = zipfile.ZipFile(scene_path)
-            manifest = zip_archive.read('{}.SAFE/manifest.safe'
-                                                .format(self.scene_id))
-        elif scene_path[-5:] == '.SAFE':
-            with open(opj(scene_path, 'manifest.safe'), 'rb') as file:
-                manifest = file.read()
+        with safe.open_safe(scene_path) as product:
+            manifest = product.read('manifest.safe')
 
         root = ET.fromstring(manifest)
         for child in root:
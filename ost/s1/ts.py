@@ -63,12 +63,11 @@ def create_ts_animation(ts_dir, temp_dir, outfile, shrink_factor):
             arr = np.zeros((int(out_meta['height']),
                             int(out_meta['width']),
                             int(3)))
-            # read vv array
-            arr[:, :, 0] = vv_pol.read(out_shape=out_shape, resampling=5)
-
-        with rasterio.open(file_vh) as vh_pol:
-            # read vh array
-            arr[:, :, 1] = vh_pol.read(out_shape=out_shape, resampling=5)
+        # read vv and vh arrays from their closest overviews
+        arr[:, :, 0] = ras.read_preview(
+            file_vv, out_shape=out_shape[1:], resampling=5)[0]
+        arr[:, :, 1] = ras.read_preview(
+            file_vh, out_shape=out_shape[1:], resampling=5)[0]
 
         # create ratio
         arr[:, :, 2] = np.subtract(arr[:, :, 0], arr[:, :, 1])
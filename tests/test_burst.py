@@ -0,0 +1,105 @@
+import os
+import zipfile
+
+import pandas as pd
+
+from ost import Sentinel1_Scene as S1Scene
+from ost.helpers import scihub
+from ost.s1 import burst, burst_cache
+from ost.s1.burst import cluster_anx_time
+from ost.s1.s1scene import burst_records_to_gdf
+
+LOCAL = 'S1A_IW_SLC__1SDV_20191119T053342_20191119T053410_029992_036C59_F309'
+REMOTE = 'S1A_IW_SLC__1SDV_20191201T053341_20191201T053409_030167_037272_5A4B'
+WKT = 'POLYGON ((0 0, 1 0, 1 1, 0 1, 0 0))'
+
+
+def test_cluster_anx_time():
+
+    bursts = pd.DataFrame({
+        'Direction': ['ASCENDING'] * 6 + ['DESCENDING'],
+        'Track': [88] * 7,
+        'SwathID': ['IW1'] * 5 + ['IW2'] * 2,
+        'AnxTime': [1001, 1000, 1001, 1028, 1029, 1000, 1001]
+    })
+
+    assert cluster_anx_time(bursts).tolist() == [
+        1001, 1001, 1001, 1028, 1028, 1000, 1001]
+
+    # the order of the bursts does not change the result
+    shuffled = bursts.iloc[::-1].reset_index(drop=True)
+    assert cluster_anx_time(shuffled).tolist() == [
+        1001, 1000, 1028, 1028, 1001, 1001, 1001]
+
+    assert cluster_anx_time(
+        bursts, reference_bids=['A88_IW1_1029']).tolist() == [
+        1001, 1001, 1001, 1029, 1029, 1000, 1001]
+
+
+def _write_product(download_dir, content):
+
+    filepath = S1Scene(LOCAL)._download_path(download_dir, True)
+    with zipfile.ZipFile(filepath, 'w') as archive:
+        archive.writestr('{}.SAFE/annotation/s1a-iw1-slc-vv-001.xml'.format(
+            LOCAL), content)
+    with open('{}.downloaded'.format(filepath), 'w') as file:
+        file.write('successfully downloaded \n')
+
+    return filepath
+
+
+def test_burst_cache(tmp_path, monkeypatch):
+
+    calls = []
+
+    def _records(scene_id):
+        return [(scene_id, 117, '20191119', 'IW1', 1001, 1, WKT)]
+
+    def _annotation_records(self, filepath):
+        calls.append(self.scene_id)
+        return _records(self.scene_id)
+
+    def _scihub_annotation_get(self, uname=None, pword=None):
+        calls.append(self.scene_id)
+        return burst_records_to_gdf(_records(self.scene_id))
+
+    monkeypatch.setattr(S1Scene, '_annotation_records', _annotation_records)
+    monkeypatch.setattr(S1Scene, '_scihub_annotation_get',
+                        _scihub_annotation_get)
+    monkeypatch.setattr(S1Scene, 'scihub_online_status',
+                        lambda self, opener: True)
+    monkeypatch.setattr(scihub, 'connect', lambda **kwargs: None)
+
+    download_dir, cache_file = str(tmp_path), str(tmp_path / 'cache.sqlite')
+    filepath = _write_product(download_dir, b'<product>iw1</product>')
+    inventory_df = pd.DataFrame({'identifier': [LOCAL, REMOTE],
+                                 'orbitdirection': ['ASCENDING'] * 2})
+
+    def _inventory():
+        del calls[:]
+        return burst.burst_inventory(
+            inventory_df, str(tmp_path / 'bursts.shp'), download_dir,
+            data_mount=None, uname='user', pword='pass', ncores=1,
+            cache_file=cache_file)
+
+    # a miss parses both scenes, remote scenes are stored without checksum
+    assert len(_inventory()) == 2
+    assert sorted(calls) == [LOCAL, REMOTE]
+    with burst_cache.BurstCache(cache_file) as cache:
+        cached = cache.get([LOCAL, REMOTE])
+    assert cached[LOCAL][0] == burst_cache.annotation_checksum(filepath)
+    assert cached[REMOTE][0] is None
+    assert cached[REMOTE][1] == _records(REMOTE)
+
+    # a hit does not parse anything
+    assert len(_inventory()) == 2
+    assert calls == []
+
+    # a changed annotation file invalidates the entry of the scene
+    os.remove(filepath)
+    _write_product(download_dir, b'<product>iw1 reprocessed</product>')
+    assert len(_inventory()) == 2
+    assert calls == [LOCAL]
+    with burst_cache.BurstCache(cache_file) as cache:
+        assert cache.get([LOCAL])[LOCAL][0] == \
+            burst_cache.annotation_checksum(filepath)
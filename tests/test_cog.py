@@ -0,0 +1,53 @@
+import numpy as np
+import fiona
+import rasterio
+from rasterio.transform import from_origin
+from shapely.geometry import box, mapping
+
+from ost.helpers import cog
+from ost.helpers import raster as ras
+
+PROFILE = {'dtype': 'float32', 'count': 1, 'crs': 'EPSG:4326',
+           'transform': from_origin(0.0, 1.0, 0.001, 0.001),
+           'width': 1000, 'height': 1000, 'nodata': 0}
+
+
+def test_write_windows(tmp_path):
+
+    outfile = str(tmp_path / 'out.tif')
+    windows = list(ras._tile_windows(1000, 1000, 300))
+    cog.write_windows(
+        outfile, PROFILE,
+        lambda window: np.full((1, int(window.height), int(window.width)),
+                               window.row_off + 1, dtype='float32'),
+        windows, ncores=4, blocksize=256)
+
+    with rasterio.open(outfile) as src:
+        assert src.profile['tiled'] and src.block_shapes[0] == (256, 256)
+        assert src.compression is not None
+        assert src.overviews(1)
+        assert src.read(1)[950, 10] == 901
+    assert not (tmp_path / '.out.tif.tmp.tif').exists()
+
+
+def test_mask_by_shape(tmp_path):
+
+    infile = str(tmp_path / 'in.tif')
+    with rasterio.open(infile, 'w', driver='GTiff', **PROFILE) as dst:
+        dst.write(np.ones((1, 1000, 1000), dtype='float32'))
+
+    shapefile = str(tmp_path / 'aoi.gpkg')
+    schema = {'geometry': 'Polygon', 'properties': {}}
+    with fiona.open(shapefile, 'w', driver='GPKG', schema=schema,
+                    crs='EPSG:4326') as file:
+        file.write({'geometry': mapping(box(0.2, 0.2, 0.7, 0.5)),
+                    'properties': {}})
+
+    outfile = str(tmp_path / 'out.tif')
+    ras.mask_by_shape(infile, outfile, shapefile, rescale=False, ndv=0,
+                      ncores=2)
+
+    with rasterio.open(outfile) as src:
+        assert (src.width, src.height) == (500, 300)
+        assert src.descriptions[0] == 'in'
+        assert np.all(src.read(1) == 1)
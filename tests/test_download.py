@@ -0,0 +1,48 @@
+import os
+import zipfile
+
+from ost import Sentinel1_Scene as S1Scene
+from ost.s1 import download
+
+SCENES = ['S1A_IW_GRDH_1SDV_201911{}T053342_201911{}T053410_029992_036C59_F309'
+          .format(day, day) for day in (19, 20)]
+
+
+def test_restore_download_dir(tmp_path):
+
+    input_dir, download_dir = tmp_path / 'input', tmp_path / 'download'
+    input_dir.mkdir()
+
+    for scene_id in SCENES:
+        with zipfile.ZipFile(str(input_dir / '{}.zip'.format(scene_id)),
+                             'w') as archive:
+            archive.writestr('{}.SAFE/manifest.safe'.format(scene_id),
+                             os.urandom(100000))
+
+    # a truncated download
+    corrupt = str(input_dir / '{}.zip'.format(SCENES[1]))
+    with open(corrupt, 'r+b') as file:
+        file.truncate(50000)
+    (input_dir / 'notes.zip').write_bytes(b'')
+
+    # a valid archive, but not a Sentinel-1 product
+    backup = str(input_dir / 'my_backup_archive_2020.zip')
+    with zipfile.ZipFile(backup, 'w') as archive:
+        archive.writestr('notes.txt', os.urandom(1000))
+
+    report = download.restore_download_dir(
+        str(input_dir), str(download_dir), link=True, ncores=2,
+        report_file=str(tmp_path / 'report.json'))
+
+    assert report['corrupt'] == [corrupt]
+    assert report['invalid'] == [backup, str(input_dir / 'notes.zip')]
+    assert os.path.isfile(backup)
+    assert len(list(download_dir.glob('**/*.zip'))) == 1
+    filepath = S1Scene(SCENES[0])._download_path(str(download_dir))
+    assert os.path.exists(filepath + '.downloaded')
+    assert os.path.samefile(
+        filepath, str(input_dir / '{}.zip'.format(SCENES[0])))
+
+    report = download.restore_download_dir(
+        str(input_dir), str(download_dir), full_check=True, ncores=2)
+    assert report['exists'] == [str(input_dir / '{}.zip'.format(SCENES[0]))]
@@ -0,0 +1,415 @@
+import io
+import os
+import json
+import time
+import struct
+import functools
+import hashlib
+import threading
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import tqdm
+
+from ost.helpers import download_engine, helpers as h
+
+
+def _zip_bytes():
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        archive.writestr('product.SAFE/manifest.safe', os.urandom(300000))
+        archive.writestr('product.SAFE/measurement/s1.tiff', os.urandom(300000))
+    return buffer.getvalue()
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    content = _zip_bytes()
+    ranges = []
+    paths = []
+    corrupt = False
+
+    def do_GET(self):
+        self.paths.append(self.path)
+        if self.path.startswith('/fail'):
+            self.send_response(503)
+            self.end_headers()
+            return
+        if self.path.startswith('/denied'):
+            self.send_response(401)
+            self.end_headers()
+            return
+
+        start = 0
+        if 'Range' in self.headers:
+            start, end = self.headers['Range'].split('=')[1].split('-')
+            start, end = int(start), int(end or len(self.content) - 1)
+            self.ranges.append(start)
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes {}-{}/{}'.format(
+                start, end, len(self.content)))
+        else:
+            end = len(self.content) - 1
+            self.send_response(200)
+
+        content = bytearray(self.content)
+        if self.corrupt:
+            _Handler.corrupt = False
+            content[-200000] ^= 0xff
+
+        self.send_header('Content-Length', str(end + 1 - start))
+        self.end_headers()
+        self.wfile.write(content[start:end + 1])
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:{}'.format(httpd.server_port)
+    httpd.shutdown()
+
+
+def test_download_and_resume(server, tmp_path):
+
+    engine = download_engine.DownloadEngine(
+        download_engine.Mirror(), concurrent=2, progress=False)
+    jobs = [download_engine.DownloadJob(
+        '{}/{}.zip'.format(server, i), str(tmp_path / '{}.zip'.format(i)))
+        for i in range(3)]
+
+    # a partially downloaded product
+    with open(jobs[0].filename, 'wb') as file:
+        file.write(_Handler.content[:1000])
+
+    _Handler.ranges = []
+    assert engine.download(jobs) == []
+    assert _Handler.ranges == [1000]
+    for job in jobs:
+        with open(job.filename, 'rb') as file:
+            assert file.read() == _Handler.content
+        assert os.path.exists('{}.downloaded'.format(job.filename))
+
+
+def test_segmented_download(server, tmp_path):
+
+    engine = download_engine.DownloadEngine(
+        download_engine.Mirror(), progress=False, segments=4,
+        min_segment_size=50000)
+    size, half = len(_Handler.content), len(_Handler.content) // 2
+
+    job = download_engine.DownloadJob(
+        '{}/0.zip'.format(server), str(tmp_path / '0.zip'))
+    _Handler.ranges = []
+    assert engine.download([job]) == []
+    assert sorted(_Handler.ranges) == [0] + [size * i // 4 for i in range(4)]
+
+    # resume an interrupted segmented download from its journal
+    resumed = download_engine.DownloadJob(
+        '{}/1.zip'.format(server), str(tmp_path / '1.zip'))
+    with open(resumed.filename, 'wb') as file:
+        file.write(_Handler.content[:half + 1000])
+        file.truncate(size)
+    with open(resumed.journal, 'w') as file:
+        json.dump({'size': size, 'segments': [
+            [0, half - 1, half], [half, size - 1, 1000]]}, file)
+
+    _Handler.ranges = []
+    assert engine.download([resumed]) == []
+    assert _Handler.ranges == [half + 1000]
+    assert not os.path.exists(resumed.journal)
+
+    for job in (job, resumed):
+        with open(job.filename, 'rb') as file:
+            assert file.read() == _Handler.content
+
+
+class _ChecksumMirror(download_engine.Mirror):
+
+    def checksum(self, session, job):
+        return hashlib.md5(_Handler.content).hexdigest()
+
+
+def test_refetch_damaged_member(server, tmp_path):
+
+    engine = download_engine.DownloadEngine(_ChecksumMirror(), progress=False)
+    job = download_engine.DownloadJob(
+        '{}/0.zip'.format(server), str(tmp_path / '0.zip'))
+
+    _Handler.ranges, _Handler.corrupt = [], True
+    assert engine.download([job]) == []
+
+    # only the damaged second member is downloaded again
+    assert len(_Handler.ranges) == 1 and _Handler.ranges[0] > 300000
+    with open(job.filename, 'rb') as file:
+        assert file.read() == _Handler.content
+
+
+def test_refetch_without_checksum(server, tmp_path):
+
+    engine = download_engine.DownloadEngine(
+        download_engine.Mirror(), progress=False, full_check=True)
+    job = download_engine.DownloadJob(
+        '{}/0.zip'.format(server), str(tmp_path / '0.zip'))
+
+    # with the full check, the damaged member is found by its CRC
+    _Handler.ranges, _Handler.corrupt = [], True
+    assert engine.download([job]) == []
+    assert len(_Handler.ranges) == 1 and _Handler.ranges[0] > 300000
+    with open(job.filename, 'rb') as file:
+        assert file.read() == _Handler.content
+
+
+def test_zipfile_structure(tmp_path):
+
+    filename = str(tmp_path / 'product.zip')
+    with open(filename, 'wb') as file:
+        file.write(_zip_bytes())
+    assert h.check_zipfile_structure(filename) is None
+    with zipfile.ZipFile(filename) as archive:
+        second = sorted(info.header_offset for info in archive.infolist())[1]
+
+    # the local header of the first member claims a longer extra field,
+    # so its data would run into the second member
+    with open(filename, 'r+b') as file:
+        file.seek(28)
+        file.write(struct.pack('<H', 1000))
+    assert h.check_zipfile_structure(filename) == [(0, second - 1)]
+
+
+class _NamedMirror(download_engine.Mirror):
+
+    def __init__(self, name, segments=1):
+        super().__init__()
+        self.name, self.segments = name, segments
+
+
+def test_failover_and_multi_source_segments(server, tmp_path):
+
+    engine = download_engine.DownloadEngine(
+        progress=False, min_segment_size=50000)
+    first, second = _NamedMirror('first', 4), _NamedMirror('second', 4)
+
+    # the first mirror fails, the download continues from the second one
+    sources = [(first, '{}/fail.zip'.format(server)),
+               (second, '{}/ok.zip'.format(server))]
+    job = download_engine.DownloadJob(
+        sources[0][1], str(tmp_path / '0.zip'), mirror=first, sources=sources)
+    assert engine.download([job]) == []
+    assert job.mirror is second
+
+    # segments are spread over all mirrors that serve the same product
+    sources = [(first, '{}/a.zip'.format(server)),
+               (second, '{}/b.zip'.format(server))]
+    job = download_engine.DownloadJob(
+        sources[0][1], str(tmp_path / '1.zip'), mirror=first, sources=sources)
+    _Handler.paths = []
+    assert engine.download([job]) == []
+    assert set(_Handler.paths) == {'/a.zip', '/b.zip'}
+
+    for i in range(2):
+        with open(str(tmp_path / '{}.zip'.format(i)), 'rb') as file:
+            assert file.read() == _Handler.content
+
+
+def test_authentication_failure_in_batch(server, tmp_path):
+
+    engine = download_engine.DownloadEngine(
+        download_engine.Mirror(), concurrent=2, progress=False)
+    jobs = [download_engine.DownloadJob(
+        '{}/{}.zip'.format(server, name), str(tmp_path / '{}.zip'.format(i)))
+        for i, name in enumerate(['denied', 'ok', 'ok'])]
+
+    # the failed job is reported, the others are still downloaded
+    assert engine.download(jobs) == jobs[:1]
+    for job in jobs[1:]:
+        assert os.path.exists('{}.downloaded'.format(job.filename))
+
+
+class _TapeMirror(download_engine.Mirror):
+
+    # one order at a time, products come online after two status checks
+    order_quota = 1
+
+    def __init__(self):
+        super().__init__()
+        self.checks = {}
+        self.orders = []
+
+    def online(self, session, job):
+        if job.scene_id == 'online':
+            return True
+        if job.scene_id not in self.checks:
+            return False
+        self.checks[job.scene_id] += 1
+        return self.checks[job.scene_id] > 2
+
+    def order(self, session, job):
+        assert len(self.checks) - len(
+            [c for c in self.checks.values() if c > 2]) < self.order_quota
+        self.orders.append(job.scene_id)
+        self.checks[job.scene_id] = 0
+        return True
+
+
+def test_order_manager(server, tmp_path):
+
+    from ost.helpers import order_manager
+
+    mirror = _TapeMirror()
+    jobs = [download_engine.DownloadJob(
+        '{}/{}.zip'.format(server, name), str(tmp_path / '{}.zip'.format(name)),
+        name, mirror=mirror) for name in ('online', 'tape1', 'tape2')]
+
+    state_file = str(tmp_path / 'orders.json')
+    manager = order_manager.OrderManager(
+        download_engine.DownloadEngine(mirror, progress=False), mirror,
+        state_file, poll_interval=0.01, max_poll_interval=0.04)
+
+    assert manager.run(jobs) == []
+    assert mirror.orders == ['tape1', 'tape2']
+    for job in jobs:
+        assert os.path.exists(job.filename + '.downloaded')
+
+    with open(state_file) as file:
+        state = json.load(file)
+    assert {entry['status'] for entry in state.values()} == {'downloaded'}
+    assert state['tape1']['attempts'] == 2
+
+
+class _ArchiveMirror(_TapeMirror):
+
+    # two orders per hour, however many are outstanding
+    order_quota = 2
+    order_window = 3600
+
+
+def test_order_window(server, tmp_path):
+
+    from ost.helpers import order_manager
+
+    mirror = _ArchiveMirror()
+    jobs = [download_engine.DownloadJob(
+        '{}/{}.zip'.format(server, name), str(tmp_path / '{}.zip'.format(name)),
+        name, mirror=mirror) for name in ('tape1', 'tape2', 'tape3')]
+
+    # an order of an earlier run within the window counts as well
+    state_file = str(tmp_path / 'orders.json')
+    with open(state_file, 'w') as file:
+        json.dump({'earlier': {'status': 'downloaded',
+                               'ordered': time.time() - 60}}, file)
+
+    manager = order_manager.OrderManager(
+        download_engine.DownloadEngine(mirror, progress=False), mirror,
+        state_file, poll_interval=0.01, max_poll_interval=0.04, max_wait=0.5)
+
+    assert manager.run(jobs) == jobs[1:]
+    assert mirror.orders == ['tape1']
+
+
+class _LtaMirror(_TapeMirror):
+
+    # the products are only available after they have been ordered
+    name = 'lta'
+    ordering = True
+
+    def __init__(self, server):
+        super().__init__()
+        self.server = server
+
+    def url(self, scene, inventory_row=None):
+        return '{}/{}.zip'.format(self.server, scene.scene_id)
+
+    def probe(self, scene, inventory_row=None):
+        return None
+
+
+def test_multi_mirror_orders(server, tmp_path, monkeypatch):
+
+    import pandas as pd
+    from ost.helpers import order_manager
+
+    monkeypatch.setattr(order_manager, 'OrderManager', functools.partial(
+        order_manager.OrderManager, poll_interval=0.01,
+        max_poll_interval=0.04))
+
+    online, offline = (
+        'S1A_IW_GRDH_1SDV_20191119T053342_20191119T053410_029992_036C59_F309',
+        'S1A_IW_GRDH_1SDV_20191201T053341_20191201T053409_030167_037272_5A4B')
+
+    class _OnlineMirror(_NamedMirror):
+        def probe(self, scene, inventory_row=None):
+            if scene.scene_id == online:
+                return '{}/{}.zip'.format(server, scene.scene_id)
+
+    lta = _LtaMirror(server)
+    inventory_df = pd.DataFrame({'identifier': [online, offline]})
+
+    # the offline scene is ordered instead of being reported unavailable
+    assert download_engine.multi_mirror_download(
+        inventory_df, str(tmp_path), [_OnlineMirror('online'), lta]) == []
+    assert lta.orders == [offline]
+    assert os.path.exists(str(tmp_path / '.lta_orders.json'))
+
+
+def test_telemetry(server, tmp_path):
+
+    from ost.helpers import telemetry
+
+    jobs = [download_engine.DownloadJob(
+        '{}/{}.zip'.format(server, name), str(tmp_path / '{}.zip'.format(name)),
+        name) for name in ('good', 'fail')]
+    jobs[1].url = '{}/fail/1.zip'.format(server)
+
+    log_file = str(tmp_path / 'telemetry.jsonl')
+    with telemetry.DownloadTelemetry(log_file) as metrics:
+        download_engine.DownloadEngine(
+            download_engine.Mirror(), retries=2, progress=False).download(jobs)
+
+    records = {record['scene_id']: record
+               for record in telemetry.read_log(log_file)}
+    assert records['good']['result'] == 'success'
+    assert records['good']['bytes'] == len(_Handler.content)
+    assert records['good']['ttfb'] is not None
+    assert records['fail']['retries'] == 1
+
+    mirror = metrics.metrics()['generic']
+    assert (mirror['downloads'], mirror['failures']) == (1, 1)
+    assert 'ost_download_bytes_total{mirror="generic"} ' in \
+        metrics.prometheus()
+
+    # the bytes of segments are counted for the mirror that served them
+    first, second = _NamedMirror('first', 4), _NamedMirror('second', 4)
+    sources = [(first, '{}/a.zip'.format(server)),
+               (second, '{}/b.zip'.format(server))]
+    job = download_engine.DownloadJob(
+        sources[0][1], str(tmp_path / 'multi.zip'), 'multi', mirror=first,
+        sources=sources)
+    with telemetry.DownloadTelemetry() as metrics:
+        download_engine.DownloadEngine(
+            progress=False, min_segment_size=50000).download([job])
+
+    served = metrics.products[0]['mirror_bytes']
+    assert set(served) == {'first', 'second'}
+    assert sum(served.values()) == len(_Handler.content)
+    assert metrics.metrics()['second']['bytes'] == served['second'] > 0
+
+
+def test_progress_total_on_retry(server, tmp_path):
+
+    engine = download_engine.DownloadEngine(
+        download_engine.Mirror(), progress=False, segments=4,
+        min_segment_size=50000)
+    engine._pbar = tqdm.tqdm(total=0, disable=True)
+
+    # a retry resumes from the journal of the first attempt
+    job = download_engine.DownloadJob(
+        '{}/0.zip'.format(server), str(tmp_path / '0.zip'))
+    for _ in range(2):
+        assert engine.segmented_download(job)
+        assert engine._pbar.total == len(_Handler.content)
@@ -0,0 +1,159 @@
+import numpy as np
+import geopandas as gpd
+import rasterio
+from rasterio.transform import from_origin
+from rasterio.windows import Window
+from shapely.geometry import box
+
+from ost.helpers import raster as ras
+from ost.multitemporal import common_extent, common_ls_mask
+
+
+def _stack(path, bands):
+
+    with rasterio.open(
+            path, 'w', driver='GTiff', width=bands.shape[2],
+            height=bands.shape[1], count=bands.shape[0], dtype='float32',
+            crs='EPSG:4326', transform=from_origin(0.0, 1.0, 0.01, 0.01)
+    ) as dst:
+        dst.write(bands)
+
+    return str(path)
+
+
+def test_valid_mask(tmp_path):
+
+    bands = np.full((3, 100, 80), -12.5, dtype='float32')
+    bands[0, :10] = 0
+    bands[2, :, 70:] = 0
+    bands[1, 50:60, 20:30] = np.nan
+    stack = _stack(tmp_path / 'stack.tif', bands)
+
+    mask, transform, crs = common_extent.valid_mask(stack, ncores=3)
+    assert mask.shape == (100, 80) and crs == 'EPSG:4326'
+    assert mask.sum() == 90 * 70
+    assert not mask[:10].any() and not mask[:, 70:].any()
+
+    polygons = ras.polygonize_array(mask, transform)
+    assert len(polygons) == 1
+    assert np.allclose(polygons[0].bounds, (0.0, 0.0, 0.7, 0.9))
+
+
+def test_approximate_valid_mask(tmp_path):
+
+    # dates with slightly different, irregular footprints
+    rows, cols = np.mgrid[0:400, 0:300]
+    bands = np.full((4, 400, 300), -12.5, dtype='float32')
+    for date in range(4):
+        outside = (rows - 200) ** 2 + (cols - 150 - date * 3) ** 2 > 140 ** 2
+        bands[date][outside] = 0
+    stack = _stack(tmp_path / 'stack.tif', bands)
+
+    exact, _, _ = common_extent.valid_mask(stack)
+    approximate, _, _ = common_extent.valid_mask(stack, approximate=True)
+
+    assert exact.sum() > 0
+    assert np.array_equal(exact, approximate)
+
+
+def test_ls_union(tmp_path):
+
+    # layover and shadow flags of two dates
+    bands = np.zeros((2, 100, 80), dtype='float32')
+    bands[0, 20:50, 10:40] = 1
+    bands[1, 30:60, 10:40] = 2
+    bands[1, 90:, :] = 1
+    stack = _stack(tmp_path / 'stack.tif', bands)
+
+    shapefile = str(tmp_path / 'extent.gpkg')
+    gpd.GeoDataFrame(geometry=[box(0.05, 0.2, 0.6, 0.9)],
+                     crs='EPSG:4326').to_file(shapefile)
+
+    for approximate in (False, True):
+        mask, inside, transform, _ = common_ls_mask.ls_union(
+            stack, shapefile, ncores=2, approximate=approximate)
+
+        # cropped to the extent, the flags outside are dropped
+        assert mask.shape == inside.shape == (70, 55)
+        assert mask.sum() == 40 * 30
+        assert np.allclose((transform.c, transform.f), (0.05, 0.9))
+
+    polygons = ras.polygonize_array(inside & ~mask, transform)
+    assert len(polygons) == 1 and len(polygons[0].interiors) == 1
+
+    # the same through a temporary raster, tile by tile
+    outfile = str(tmp_path / 'extent.masked.shp')
+    ras.polygonize_mask(inside & ~mask, transform, 'EPSG:4326', outfile,
+                        str(tmp_path))
+    gdf = gpd.read_file(outfile)
+    assert len(gdf) == 1 and gdf.geometry[0].equals(polygons[0])
+    assert not (tmp_path / 'extent.masked.tif').exists()
+
+
+def test_polygonize_raster(tmp_path):
+
+    # a ring and a small blob across the seams of 32 pixel tiles
+    rows, cols = np.mgrid[0:100, 0:80]
+    radius = np.hypot(rows - 50, cols - 40)
+    array = ((radius > 10) & (radius < 30)) | (np.hypot(rows - 5, cols - 64) < 4)
+    infile = str(tmp_path / 'mask.tif')
+    with rasterio.open(
+            infile, 'w', driver='GTiff', width=80, height=100, count=1,
+            dtype='uint8', crs='EPSG:3857',
+            transform=from_origin(0.0, 1.0, 0.01, 0.01)) as dst:
+        dst.write(array.astype('uint8'), 1)
+
+    outfile = str(tmp_path / 'mask.gpkg')
+    ras.polygonize_raster(infile, outfile, tile_size=32)
+    gdf = gpd.read_file(outfile)
+
+    # polygons are merged across the seams
+    reference = ras.polygonize_array(array, from_origin(0.0, 1.0, 0.01, 0.01))
+    assert len(gdf) == len(reference) == 2
+    assert np.isclose(gdf.area.sum(), array.sum() * 0.0001)
+    assert sorted(len(geometry.interiors) for geometry in gdf.geometry) \
+        == [0, 1]
+
+    # the simplification keeps the area, but far fewer vertices
+    ras.polygonize_raster(infile, outfile, tile_size=32, simplify=1,
+                          min_area=60)
+    simplified = gpd.read_file(outfile)
+    assert len(simplified) == 1
+    assert abs(simplified.area.sum() / gdf.area.max() - 1) < 0.05
+    assert len(simplified.geometry[0].exterior.coords) < \
+        len(gdf.geometry[gdf.area.argmax()].exterior.coords) / 2
+
+
+def test_approximate_sub_cell_features(tmp_path):
+
+    # features smaller than a cell, away from the cell centres
+    bands = np.zeros((2, 256, 256), dtype='float32')
+    bands[0, 33:38, 33:38] = 1
+    bands[1, 194:197, 100:110] = 2
+    stack = _stack(tmp_path / 'ls.tif', bands)
+
+    exact, _, _ = common_extent.reduce_mask(stack, lambda array: array > 0,
+                                            'or')
+    approximate, _, _ = common_extent.reduce_mask(
+        stack, lambda array: array > 0, 'or', approximate=True)
+    assert exact.sum() == 55
+    assert np.array_equal(exact, approximate)
+
+    # only a window is reduced, its cells do not align with the raster's
+    window = Window(30, 20, 150, 180)
+    cropped, transform, _ = common_extent.reduce_mask(
+        stack, lambda array: array > 0, 'or', approximate=True,
+        window=window)
+    assert np.array_equal(cropped, exact[20:200, 30:180])
+    assert np.allclose((transform.c, transform.f), (0.3, 0.8))
+
+    # small holes of no data within the valid area
+    bands = np.full((2, 256, 256), -12.5, dtype='float32')
+    bands[0, 33:35, 33:35] = 0
+    bands[1, 150, 200] = 0
+    stack = _stack(tmp_path / 'stack.tif', bands)
+
+    exact, _, _ = common_extent.valid_mask(stack)
+    approximate, _, _ = common_extent.valid_mask(stack, approximate=True)
+    assert (~exact).sum() == 5
+    assert np.array_equal(exact, approximate)
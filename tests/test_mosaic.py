@@ -0,0 +1,122 @@
+import os
+
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+
+from ost.mosaic import native, planner
+
+
+def _write(path, left, value, width=100, height=80):
+
+    data = np.full((1, height, width), value, dtype='float32')
+    with rasterio.open(
+            path, 'w', driver='GTiff', width=width, height=height, count=1,
+            dtype='float32', crs='EPSG:4326', nodata=0,
+            transform=from_origin(left, 1.0, 0.01, 0.01)) as dst:
+        dst.write(data)
+
+    return str(path)
+
+
+def test_native_mosaic(tmp_path):
+
+    # two images with a 40 pixel overlap and different radiometry
+    files = [_write(tmp_path / 'a.tif', 0.0, 10.0),
+             _write(tmp_path / 'b.tif', 0.6, 20.0)]
+
+    geometry = native.MosaicGeometry(files, tile_size=32)
+    assert (geometry.width, geometry.height) == (160, 80)
+    assert len(geometry.overlaps) == 1
+
+    gains, offsets = native.harmonize(geometry)
+    assert np.allclose(10.0 * gains[0, 0] + offsets[0, 0],
+                       20.0 * gains[1, 0] + offsets[1, 0])
+
+    outfile = str(tmp_path / 'mosaic.tif')
+    native.mosaic(files, outfile, ncores=4, tile_size=32, feather=8)
+    with rasterio.open(outfile) as src:
+        mosaic = src.read(1)
+        assert mosaic.shape == (80, 160)
+
+    # harmonized images give a seamless mosaic without nodata
+    assert np.allclose(mosaic, mosaic[0, 0], atol=1e-4)
+
+    # without harmonization, the seam is blended by the feathering
+    native.mosaic(files, outfile, ncores=2, tile_size=32, feather=8,
+                  harmonization=False)
+    with rasterio.open(outfile) as src:
+        row = src.read(1)[40]
+    assert row[0] == 10 and row[-1] == 20
+    assert np.all(np.diff(row) >= 0) and 10 < row[80] < 20
+
+    # cut to the aoi while writing
+    native.mosaic(files, outfile, cut_to_aoi='POLYGON((0.1 0.3, 1.5 0.3, '
+                  '1.5 0.9, 0.1 0.9, 0.1 0.3))', tile_size=32, feather=8)
+    with rasterio.open(outfile) as src:
+        assert (src.width, src.height) == (140, 60)
+        assert np.all(src.read(1) != 0)
+
+
+def test_weight_cache(tmp_path):
+
+    cache = native.WeightCache()
+    for date, values in enumerate([(10.0, 20.0), (30.0, 50.0)]):
+        files = [_write(tmp_path / '{}a.tif'.format(date), 0.0, values[0]),
+                 _write(tmp_path / '{}b.tif'.format(date), 0.6, values[1])]
+        outfile = str(tmp_path / '{}.tif'.format(date))
+        native.mosaic(files, outfile, tile_size=32, feather=8,
+                      harmonization=False, cache=cache)
+        native.mosaic(files, outfile + '.ref', tile_size=32, feather=8,
+                      harmonization=False, cache=None)
+
+        with rasterio.open(outfile) as src, \
+                rasterio.open(outfile + '.ref') as ref:
+            assert np.allclose(src.read(1), ref.read(1), atol=0.1)
+
+    # both dates share the geometry, interior tiles are stored as scalars
+    assert len(cache._entries) == 1
+    weights = list(cache._entries.values())[0]
+    assert any(np.isscalar(value) for value in weights.values())
+    assert any(getattr(value, 'dtype', None) == np.uint8
+               for value in weights.values())
+
+
+def test_timeseries_plan(tmp_path):
+
+    for burst in ['A_IW1_1', 'A_IW2_1']:
+        ts_dir = tmp_path / burst / 'Timeseries'
+        ts_dir.mkdir(parents=True)
+        for name in ['01.20191107.bs.VV.tif', '02.20191119.bs.VV.tif',
+                     '01.20191119.20191107.coh.VV.tif']:
+            (ts_dir / name).touch()
+
+    # existing mosaics are not indexed
+    (tmp_path / 'Mosaic' / 'Timeseries').mkdir(parents=True)
+    (tmp_path / 'Mosaic' / 'Timeseries' / '01.20191107.bs.VV.tif').touch()
+
+    index = planner.index_timeseries(str(tmp_path))
+    assert sorted(index) == [('bs.VV', 1), ('bs.VV', 2), ('coh.VV', 1)]
+    assert len(index[('bs.VV', 1)]) == 2
+
+    ts_dir = str(tmp_path / 'Mosaic' / 'Timeseries')
+    plan = planner.plan_timeseries(
+        index, ts_dir, {'bs.VV': 'bs.vrt', 'coh.VV': 'coh.vrt',
+                        'bs.VH': 'vh.vrt'}, min_steps=2)
+
+    assert [product['product'] for product in plan] == ['bs.VV']
+    assert [os.path.basename(task['outfile'])
+            for task in plan[0]['steps']] == ['01.20191107.bs.VV.tif',
+                                              '02.20191119.bs.VV.tif']
+
+    # the exec workflow writes the same mosaics line by line
+    exec_file = str(tmp_path / 'exec_mosaic_timeseries.txt')
+    with open(exec_file, 'w') as exe:
+        for task in plan[0]['steps']:
+            exe.write('{};{};{};{};{}\n'.format(
+                task['files'], task['outfile'], str(tmp_path), 'False', 4))
+
+    exec_plan = planner.plan_from_exec(exec_file)
+    assert [product['product'] for product in exec_plan] == ['bs.VV']
+    assert exec_plan[0]['vrt'] is None
+    assert exec_plan[0]['steps'] == plan[0]['steps']
@@ -0,0 +1,88 @@
+import os
+
+import pandas as pd
+
+from ost import Sentinel1_Scene as S1Scene
+from ost.helpers import download_engine
+from ost.s1 import pipeline, download_scheduler
+
+A, B, C = ['S1A_IW_SLC__1SDV_201911{}T053342_201911{}T053410_029992_036C59_F309'
+           .format(day, day) for day in (19, 20, 21)]
+
+
+def _worker(argument_list):
+    out_file, = argument_list
+    with open(out_file, 'w') as file:
+        file.write('processed')
+
+
+def test_processing_pipeline(tmp_path):
+
+    tasks = [([A, B], [str(tmp_path / 'AB')]),
+             ([B], [str(tmp_path / 'B')]),
+             ([C], [str(tmp_path / 'C')])]
+
+    def download(inventory_df):
+        # downloads report to the pipeline while they are running
+        for scene_id in (B, A):
+            job = download_engine.DownloadJob('', '', scene_id)
+            download_engine._notify(job, True)
+            if scene_id == B:
+                assert not os.path.exists(str(tmp_path / 'AB'))
+
+    failed = pipeline.run(tasks, _worker, None, download, str(tmp_path),
+                          data_mount=None, workers=2)
+
+    assert failed == [[str(tmp_path / 'C')]]
+    assert os.path.exists(str(tmp_path / 'AB'))
+    assert os.path.exists(str(tmp_path / 'B'))
+    assert download_engine._listeners == []
+
+
+def test_download_scheduler(tmp_path):
+
+    inventory_df = pd.DataFrame({
+        'identifier': [C, A, B], 'acquisitiondate': ['2019-11-21',
+                                                     '2019-11-19',
+                                                     '2019-11-20'],
+        'relativeorbit': ['1', '1', '1'], 'size': ['1 KB', '1 KB', 'n/a']})
+
+    scheduler = download_scheduler.DownloadScheduler(
+        str(tmp_path), budget=2048, reserve=0, evict=True)
+    for scene_id in (A, B, C):
+        scheduler.add_dependents([scene_id], str(tmp_path / scene_id[17:25]))
+
+    batches, fail = [], None
+
+    def download(download_df):
+        batches.append(sorted(download_df.identifier))
+        for scene_id in download_df.identifier:
+            filepath = S1Scene(scene_id)._download_path(str(tmp_path), True)
+            with open(filepath, 'wb') as file:
+                file.write(bytes(1024))
+            if scene_id == fail:
+                continue
+            open('{}.downloaded'.format(filepath), 'w').close()
+
+            # processed right away
+            out_dir = tmp_path / scene_id[17:25]
+            out_dir.mkdir()
+            (out_dir / '.processed').touch()
+
+    # B has no size, its default size exceeds the budget and C comes later
+    assert scheduler.run(inventory_df, download) == [B, C]
+    assert batches == [[A]]
+
+    # the download of B fails, its partial file is not taken as local
+    inventory_df['size'] = '1 KB'
+    fail = B
+    assert scheduler.run(inventory_df, download) == [B]
+    assert batches == [[A], [B, C]]
+
+    fail = None
+    assert scheduler.run(inventory_df, download) == []
+    assert batches == [[A], [B, C], [B]]
+
+    scheduler.evict()
+    assert not os.listdir(os.path.dirname(
+        S1Scene(C)._download_path(str(tmp_path))))
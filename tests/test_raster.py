@@ -0,0 +1,74 @@
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+
+from ost.helpers import raster as ras
+from ost.s1 import grd_to_ard
+
+
+def _write(path, array, **kwargs):
+
+    with rasterio.open(
+            path, 'w', width=array.shape[2], height=array.shape[1],
+            count=array.shape[0], dtype=array.dtype, crs='EPSG:4326',
+            transform=from_origin(0.0, 1.0, 0.01, 0.01), **kwargs) as dst:
+        dst.write(array)
+
+    return str(path)
+
+
+def test_replace_value(tmp_path):
+
+    array = np.random.uniform(-1, 1, (3, 300, 200)).astype('float32')
+    infile = _write(tmp_path / 'in.tif', array, driver='GTiff', tiled=True,
+                    blockxsize=64, blockysize=64)
+
+    with rasterio.open(infile) as src:
+        windows = list(ras._block_windows(src, pixels=128 * 128))
+    assert all(window.col_off % 64 == 0 and window.row_off % 64 == 0
+               for window in windows)
+    assert sum(window.width * window.height for window in windows) == 60000
+
+    ras.replace_value(infile, 0, -99, ncores=3)
+    with rasterio.open(infile) as src:
+        assert np.array_equal(src.read(), np.where(array <= 0, -99, array))
+
+
+def test_grd_remove_border(tmp_path):
+
+    # low intensities along the near and far range border
+    array = np.full((1, 50, 6500), 500, dtype='float32')
+    array[:, :, :200] = 50
+    array[:, :, 6300:] = 50
+    infile = _write(tmp_path / 'Intensity_VV.img', array, driver='ENVI')
+
+    grd_to_ard._grd_remove_border(infile)
+
+    # the border and another 150 columns are removed
+    with rasterio.open(infile) as src:
+        result = src.read(1)
+    assert not result[:, :349].any() and np.all(result[:, 349:6150] == 500)
+    assert not result[:, 6150:].any()
+
+
+def test_read_preview(tmp_path):
+
+    array = np.random.uniform(0, 1, (1, 1200, 1000)).astype('float32')
+    infile = _write(tmp_path / 'Sigma0_VV.img', array, driver='ENVI')
+    with open(str(tmp_path / 'Sigma0_VV.hdr')) as file:
+        header = file.read()
+
+    ras.build_overviews(infile)
+    with rasterio.open(infile) as src:
+        assert src.overviews(1) == [2]
+
+    # the overviews are external, the header is left as it is
+    assert (tmp_path / 'Sigma0_VV.img.ovr').exists()
+    with open(str(tmp_path / 'Sigma0_VV.hdr')) as file:
+        assert file.read() == header
+
+    preview = ras.read_preview(infile, shrink_factor=25)
+    assert preview.shape == (1, 48, 40)
+    assert np.isclose(preview.mean(), array.mean(), atol=0.01)
+    assert np.isclose(preview[0, 0, 0], array[0, :25, :25].mean(),
+                      atol=0.05)
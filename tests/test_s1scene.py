@@ -1,6 +1,17 @@
+import pytest
+
 from ost.s1.s1scene import Sentinel1_Scene as S1Scene
 
 
 def test_s1_scene_metadata(s1_id):
     scene = S1Scene(scene_id=s1_id)
     assert scene.scene_id == s1_id
+
+
+def test_s1_scene_invalid_id():
+
+    for scene_id in ['my_backup_archive_2020',
+                     'S2A_MSIL1C_20191119T100301_N0208_R122_T33UUP_'
+                     '20191119T120334']:
+        with pytest.raises(ValueError):
+            S1Scene(scene_id)
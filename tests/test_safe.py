@@ -0,0 +1,109 @@
+import io
+import zipfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from ost.helpers import safe
+from ost.s1 import burst_cache
+
+SCENE = 'S1A_IW_SLC__1SDV_20191119T053342_20191119T053410_029992_036C59_F309'
+MEMBERS = {
+    'manifest.safe': b'<manifest/>',
+    'annotation/s1a-iw1-slc-vv-001.xml': b'<product>iw1</product>',
+    'annotation/calibration/calibration-s1a-iw1-slc-vv-001.xml': b'<cal/>',
+    'measurement/s1a-iw1-slc-vv-001.tiff': bytes(16 * 1024 * 1024)
+}
+
+
+def _zip_bytes():
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as archive:
+        for member, content in MEMBERS.items():
+            archive.writestr('{}.SAFE/{}'.format(SCENE, member), content)
+    return buffer.getvalue()
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    content = _zip_bytes()
+    served = []
+    ignore_range = False
+
+    def do_GET(self):
+        start, end = self.headers['Range'].split('=')[1].split('-')
+        start, end = int(start), int(end)
+
+        # a proxy that only passes the size probe through
+        if self.ignore_range and end > 0:
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(self.content)))
+            self.end_headers()
+            self.wfile.write(self.content)
+            return
+
+        self.served.append(end + 1 - start)
+        self.send_response(206)
+        self.send_header('Content-Range', 'bytes {}-{}/{}'.format(
+            start, end, len(self.content)))
+        self.send_header('Content-Length', str(end + 1 - start))
+        self.end_headers()
+        self.wfile.write(self.content[start:end + 1])
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:{}'.format(httpd.server_port)
+    httpd.shutdown()
+
+
+def test_open_safe(server, tmp_path):
+
+    zip_file = tmp_path / '{}.zip'.format(SCENE)
+    zip_file.write_bytes(_Handler.content)
+    with zipfile.ZipFile(str(zip_file)) as archive:
+        archive.extractall(str(tmp_path))
+    safe_dir = str(tmp_path / '{}.SAFE'.format(SCENE))
+    url = '{}/{}.zip'.format(server, SCENE)
+
+    for path in (safe_dir, str(zip_file), url):
+        with safe.open_safe(path, cache_dir=str(tmp_path / 'cache')) as product:
+            assert sorted(product.namelist()) == sorted(MEMBERS)
+            assert product.glob('annotation/s*.xml') == [
+                'annotation/s1a-iw1-slc-vv-001.xml']
+            assert product.read('manifest.safe') == b'<manifest/>'
+
+    # the measurement data was not transferred
+    assert sum(_Handler.served) < 4 * 1024 * 1024
+
+    assert burst_cache.annotation_checksum(url) == \
+        burst_cache.annotation_checksum(str(zip_file))
+
+    with safe.open_safe(url) as product:
+        assert product.gdal_path('manifest.safe') == (
+            '/vsizip//vsicurl/{}/{}.SAFE/manifest.safe'.format(url, SCENE))
+
+
+def test_range_ignored(server, tmp_path):
+
+    url = '{}/{}.zip'.format(server, SCENE)
+    cache_dir = tmp_path / 'cache'
+    _Handler.ignore_range = True
+    try:
+        remote = safe.HttpRangeFile(url, block_size=1024,
+                                    cache_dir=str(cache_dir))
+        remote.seek(2048)
+        with pytest.raises(IOError):
+            remote.read(100)
+    finally:
+        _Handler.ignore_range = False
+
+    # nothing has been cached
+    assert not any(path.is_file() for path in cache_dir.rglob('*'))
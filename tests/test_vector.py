@@ -0,0 +1,31 @@
+import geopandas as gpd
+import pytest
+
+from shapely.geometry import box
+
+from ost.helpers.vector import AoiCoverage
+
+
+@pytest.mark.parametrize('tile_size', [None, 0.3])
+def test_aoi_coverage(tile_size):
+
+    aoi = AoiCoverage(box(0, 0, 1, 1).wkt, tile_size=tile_size)
+    footprints = [box(0.5, 0, 2, 1), box(-1, -1, 2, 2), box(3, 3, 4, 4)]
+
+    assert aoi.intersects(footprints).tolist() == [True, True, False]
+    assert aoi.intersection_area(footprints) == pytest.approx([0.5, 1, 0])
+    assert aoi.covers(footprints).tolist() == [False, True, False]
+    assert aoi.covers(footprints[0], area_reduce=0.5)
+
+
+@pytest.mark.parametrize('tile_size', [None, 0.3])
+def test_aoi_coverage_collections(tile_size):
+
+    aoi = AoiCoverage(box(0, 0, 1, 1).wkt, tile_size=tile_size)
+    footprints = [box(0.5, 0, 2, 1), box(-1, -1, 2, 2), box(3, 3, 4, 4)]
+
+    # lists and GeoSeries give one value per footprint
+    for collection in (footprints, gpd.GeoSeries(footprints)):
+        assert aoi.intersects(collection).tolist() == [True, True, False]
+        assert aoi.intersection_area(collection) == pytest.approx(
+            [0.5, 1, 0])